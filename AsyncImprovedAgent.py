@@ -0,0 +1,202 @@
+import asyncio
+import collections
+import threading
+import chess
+import chess.engine
+import numpy as np
+from reconchess import *
+from typing import List, Tuple, Optional
+from belief import BeliefSet, board_from_row, board_key, hash_rows
+from engines import searchmoves
+from eval_cache import reached_depth
+from voting import VOTE_LINES
+from ImprovedAgent import ImprovedAgent
+
+
+class Speculation:
+    """One speculative engine search of a hypothesis that may still be eliminated."""
+
+    def __init__(self, board: chess.Board, limit: chess.engine.Limit, root_moves: Optional[List[chess.Move]]):
+        self.board = board
+        self.limit = limit
+        self.root_moves = root_moves
+        self.started = False  # set once an engine picked it up; from then on it runs to completion
+        self.future = None    # concurrent.futures.Future of the asyncio task
+
+    def covers(self, limit: chess.engine.Limit) -> bool:
+        """Whether this search's limit is at least as generous as limit in depth, time and nodes."""
+        return all(ours is None or (theirs is not None and ours >= theirs)
+                   for ours, theirs in ((self.limit.depth, limit.depth), (self.limit.time, limit.time),
+                                        (self.limit.nodes, limit.nodes)))
+
+    def could_answer(self, limit: chess.engine.Limit) -> bool:
+        """Whether the finished search may stand in for limit: it covers it, or may reach its depth in less time."""
+        return self.covers(limit) or (limit.depth is not None and self.limit.depth is not None and
+                                      self.limit.depth >= limit.depth)
+
+    def answers(self, limit: chess.engine.Limit, result) -> bool:
+        """Whether result, this search's outcome, is as thorough as a search with limit would be."""
+        if self.covers(limit):
+            return True
+        return self.could_answer(limit) and reached_depth(result, self.limit.depth) >= limit.depth
+
+
+class AsyncImprovedAgent(ImprovedAgent):
+    """ImprovedAgent that hides engine latency behind belief maintenance.
+
+    As soon as the sense is planned, the likeliest hypotheses are sent to the engines from an asyncio loop
+    on a background thread, while the sense result is applied to the belief on the calling thread.
+    Searches for hypotheses the sense result eliminates are cancelled before an engine picks them up, and
+    the move vote reuses the searches that survive instead of repeating them.
+    """
+
+    def __init__(self, engine_pool_size: Optional[int] = None, speculative_boards: int = 16):
+        super().__init__(engine_pool_size)
+        self.speculative_boards = speculative_boards  # Hypotheses searched ahead of choose_move; 0 disables it
+        self.speculations = {}               # row hash -> Speculation for the current turn
+        self.speculation_stats = collections.Counter()
+        self._turn = None                    # (move_actions, seconds_left) while choose_sense runs
+        self._loop = None
+        self._loop_thread = None
+        self._engine_slots = None            # asyncio.Semaphore, one slot per pooled engine
+
+
+    def handle_game_start(self, color: Color, board: chess.Board, opponent_name: str):
+        super().handle_game_start(color, board, opponent_name)
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name='speculation', daemon=True)
+        self._loop_thread.start()
+        self._engine_slots = asyncio.run_coroutine_threadsafe(self._make_slots(), self._loop).result()
+
+
+    def choose_sense(self, sense_actions: List[int], move_actions: List[chess.Move], seconds_left: float) -> Optional[int]:
+        self._turn = (move_actions, seconds_left)
+        try:
+            return super().choose_sense(sense_actions, move_actions, seconds_left)
+        finally:
+            self._turn = None
+
+
+    def handle_sense_result(self, sense_result: List[Tuple[int, Optional[chess.Piece]]]):
+        super().handle_sense_result(sense_result)
+        # Drop the searches of hypotheses the sense result (or the tail pruning after it) eliminated
+        if self.speculations:
+            kept = set(self.possible_boards.hashes().tolist())
+            for key in [key for key in self.speculations if key not in kept]:
+                self._discard(self.speculations.pop(key))
+
+
+    def choose_move(self, move_actions: List[chess.Move], seconds_left: float) -> Optional[chess.Move]:
+        try:
+            return super().choose_move(move_actions, seconds_left)
+        finally:
+            self.cancel_speculation()
+
+
+    def handle_game_end(self, winner_color: Optional[Color], win_reason: Optional[WinReason],
+                        game_history: GameHistory):
+        self.cancel_speculation()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+            self._loop = None
+        if self.speculation_stats:
+            print(f"[END] Speculative searches: {dict(self.speculation_stats)}")
+        super().handle_game_end(winner_color, win_reason, game_history)
+
+    #UTIL
+    def sensing_beliefs(self):
+        beliefs = super().sensing_beliefs()
+        if self._turn is not None:
+            self.speculate(beliefs, *self._turn)
+        return beliefs
+
+    def speculate(self, beliefs: BeliefSet, move_actions: List[chess.Move], seconds_left: float):
+        """Start engine searches for the likeliest of beliefs without waiting for them."""
+        if not self.speculative_boards or self._loop is None or not beliefs:
+            return
+        candidates = beliefs.top_k(self.speculative_boards)
+        if len(candidates) > self.speculative_boards:
+            candidates = candidates.sample(self.speculative_boards)
+        if candidates.weights is not None:
+            candidates = candidates.select(np.argsort(-candidates.weights, kind='stable'))
+
+        # Size the searches as choose_move will, assuming the sense leaves a full hypothesis budget
+        plan = self.move_scheduler.plan(min(len(beliefs), self.max_hypotheses), seconds_left, self.move_num,
+                                        self.engine_pool.size)
+        limit = self.evaluation_limit(plan.time_per_board, plan.depth)
+        for key, row in zip(hash_rows(candidates.rows).tolist(), candidates.rows):
+            if key in self.speculations:
+                continue
+            board = board_from_row(row)
+            if board.turn != self.color:
+                continue
+            speculation = Speculation(board, limit, searchmoves(board, move_actions))
+            speculation.future = asyncio.run_coroutine_threadsafe(self._search(speculation), self._loop)
+            self.speculations[key] = speculation
+            self._note('started')
+
+    def analyse_for_vote(self, boards: List[chess.Board], limit: chess.engine.Limit,
+                         move_actions: List[chess.Move]) -> list:
+        """Reuse speculative searches that already hold an engine; search the rest as usual."""
+        results = [None] * len(boards)
+        missing = []
+        keys = hash_rows(np.array([board_key(board) for board in boards], dtype=np.uint64)).tolist()
+        for index, key in enumerate(keys):
+            speculation = self.speculations.pop(key, None)
+            # The speculation was planned before the sense, for more hypotheses and so less time per board
+            if speculation is not None and speculation.could_answer(limit) and \
+                    speculation.root_moves == searchmoves(boards[index], move_actions):
+                # Waiting only pays off once an engine is on it; a queued search just competes with the vote
+                if speculation.started or speculation.future.done():
+                    result = self._result(speculation)
+                    if result is not None and speculation.answers(limit, result):
+                        results[index] = result
+                        self._note('reused')
+                        continue
+                    self._note('wasted')
+                else:
+                    self._discard(speculation)
+            elif speculation is not None:
+                self._discard(speculation)
+            missing.append(index)
+
+        if missing:
+            for index, result in zip(missing, super().analyse_for_vote([boards[index] for index in missing],
+                                                                       limit, move_actions)):
+                results[index] = result
+        return results
+
+    def cancel_speculation(self):
+        """Cancel every outstanding speculative search, e.g. once the move is chosen."""
+        for speculation in self.speculations.values():
+            self._discard(speculation)
+        self.speculations.clear()
+
+    def _discard(self, speculation: Speculation):
+        if speculation.started or not speculation.future.cancel():
+            self._note('wasted')  # the engine already spent the time
+        else:
+            self._note('cancelled')
+
+    @staticmethod
+    def _result(speculation: Speculation):
+        try:
+            return speculation.future.result()
+        except Exception:
+            return None
+
+    def _note(self, outcome: str):
+        self.speculation_stats[outcome] += 1
+        self.metrics.count('speculation.' + outcome)
+
+    async def _make_slots(self):
+        return asyncio.Semaphore(self.engine_pool.size)
+
+    async def _search(self, speculation: Speculation):
+        # Hold at most one search per pooled engine so cancelled hypotheses never reach one
+        async with self._engine_slots:
+            speculation.started = True
+            return await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.engine_pool.analyse(speculation.board, speculation.limit, speculation.root_moves,
+                                                       multipv=VOTE_LINES))
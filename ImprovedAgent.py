@@ -1,36 +1,29 @@
-import os
-import platform
 import random
+import time
 import chess
 import collections
+import numpy as np
 import chess.engine
 from reconchess import *
 from typing import List, Tuple, Optional
-
-def is_edge_square(square):
-    #non edge
-    row, col = square // 8, square % 8
-    return row in (0, 7) or col in (0, 7)
-
-def openEngine():
-    if platform.system() == 'Windows':
-        stockfish_path = './stockfish.exe'
-    elif platform.system() == 'Linux':
-        stockfish_path = '/opt/stockfish/stockfish'
-    elif platform.system() == 'Darwin':
-        stockfish_path = './stockfish-macos'
-    else:
-        raise EnvironmentError("Unsupported OS for Stockfish")
-
-    engine = chess.engine.SimpleEngine.popen_uci(stockfish_path, setpgrp=True, timeout=None)
-    engine.configure({"Threads": 2, "Hash": 128})
-
-    return engine
-
+from belief import BeliefSet, board_key, plane_index, rows_for_memory, sense_consistent
+from heatmap import PieceHeatmap
+from sense_planner import score_sense_squares
+from sense_tables import INTERIOR_SQUARES, window_mass
+from threats import threat_heatmap
+from engines import EnginePool, searchmoves
+from eval_cache import EvalCache
+from voting import VOTE_LINES, AnytimeVote
+from scheduler import MoveScheduler
+from expansion import ExpansionStats, LazyExpansion, child_key
+from move_model import move_priors
+from ponder import Ponder
+from sharding import ShardPool, ShardedExpansion, default_shard_processes
+from metrics import Metrics, instrumented
 
 class ImprovedAgent(Player):
-    def __init__(self):
-        self.possible_boards = set()
+    def __init__(self, engine_pool_size: Optional[int] = None):
+        self.possible_boards = BeliefSet()
         self.color = None
         self.opponent_king_position = None
         self.start = False
@@ -38,43 +31,97 @@ class ImprovedAgent(Player):
         self.my_piece_captured_square = None
         self.last_sense_result = None
         self.check_sensing_enabled = True
-        self.engine = None
+        self.sense_objective = 'states'      # 'states' (expected remaining states) or 'entropy' (expected remaining bits)
+        self.engine_pool = None
+        self.engine_pool_size = engine_pool_size  # None picks a size from the core count
+        self.eval_cache = EvalCache()        # Engine results reused across turns and hypotheses
+        self.eval_limit_policy = 'depth_and_time'  # 'depth', 'time' or 'depth_and_time' (whichever comes first)
+        self.eval_depth = 8                  # Depth 8 should find most mates in 4
+        self.move_scheduler = MoveScheduler(full_depth=self.eval_depth)  # Sizes the move phase from the game clock
+        self.deepening_step = 2              # Extra depth for the re-search pass when the budget allows; 0 disables it
+        self.current_vote = None             # The running AnytimeVote; call interrupt() on it to stop early
+        self.max_expansion = 50000           # Hard cap on children kept per opponent move (reservoir-sampled); None for no cap
+        self.belief_memory_mb = 64           # Memory budget for the belief set, also enforced at expansion time; None for no budget
+        self.last_expansion = ExpansionStats()
+        self.belief_drops = collections.Counter()  # Hypotheses dropped by expansion resampling and tail pruning
+        self.lazy_expansion = True           # Defer opponent-move expansion until the sense result is known
+        self.pending_expansion = None        # LazyExpansion waiting for handle_sense_result
+        self.sense_sample_size = 20000       # Children sampled from a pending expansion to plan the sense
+        self.move_model = move_priors        # Prior over opponent moves weighting each child; None keeps beliefs uniform
+        # The cap is lossy: the move prior may rank the true board below the cut. The dropped tail is kept
+        # and re-expanded before the belief falls back to the start position
+        self.max_hypotheses = 2000           # Heaviest hypotheses kept after each sense result; None for no cap
+        self.hypothesis_mass = 0.9999        # Probability mass kept when pruning the low-probability tail
+        self.pruned_tail = None              # Hypotheses dropped by the last prune, None when it dropped nothing
+        self.pruned_tail_move = None         # Our move result since that prune, not yet applied to pruned_tail
+        self.pondering = True                # Expand and pre-search the belief while the opponent thinks
+        self.ponder_boards = 32              # Likeliest children searched per opponent turn
+        self.ponder_depth = self.eval_depth  # Depth of the pondered searches; the vote reuses them up to this depth
+        self.ponder = None                   # The running Ponder, between our move and the opponent's
+        self.ponder_stats = collections.Counter()
+        self.shard_processes = None          # Sharded expansion workers; None uses one per core, 1 disables
+        self.shard_pool = None
+        self.metrics = Metrics.from_env()    # Per-turn timers and counters, appended to the JSONL file named by RBC_METRICS
         
         # Enhanced state tracking
-        self.opponent_piece_likelihood = {}  # Track likelihood of opponent pieces at squares
+        self.piece_heatmap = None            # Per-square, per-piece-type counts of opponent pieces
+        self.opponent_piece_likelihood = np.zeros(64)  # Likelihood of any opponent piece at each square
         self.my_pieces_in_danger = set()     # Track our pieces that might be under attack
 
 
     def handle_game_start(self, color: Color, board: chess.Board, opponent_name: str):
         self.color = color
-        self.possible_boards = {board.fen()}
+        self.possible_boards = self.initial_beliefs([board])
         self.opponent_king_position = board.king(not self.color)
         
         # Initialize opponent piece likelihood (initially all opponent pieces are in their starting positions)
-        self.opponent_piece_likelihood = {}
-        for square in range(64):
-            piece = board.piece_at(square)
-            if piece and piece.color != self.color:
-                self.opponent_piece_likelihood[square] = 1.0
+        self.piece_heatmap = PieceHeatmap(not self.color)
+        self.update_opponent_piece_likelihood()
         
         
         if color:  # If playing as white
             self.start = True
 
-        self.engine = openEngine()
+        self.engine_pool = EnginePool(self.engine_pool_size, cache=self.eval_cache, metrics=self.metrics)
+        # Expansion runs while the engines are idle (pondering expands before it searches), so it gets every core
+        processes = self.shard_processes or default_shard_processes()
+        if processes > 1:
+            self.shard_pool = ShardPool(processes)
+            self.shard_pool.warm_up()
 
 
+    @instrumented
     def handle_opponent_move_result(self, captured_my_piece: bool, capture_square: Optional[int]):
+        self.metrics.start_turn(self.move_num)
+        self.metrics.set('opponent_move.in', len(self.possible_boards))
+        self.metrics.set('opponent_move.captured', captured_my_piece)
         
         # Skip if it's the first move and we're playing as white
         if self.start:
             self.start = False
             return
             
+        # The expansion pondered for a quiet move is only of use if the opponent did not capture
+        pondered = self.stop_pondering()
+        if captured_my_piece:
+            pondered = None
+        self.metrics.set('ponder.expansion_ready', pondered is not None)
+        
         if not self.possible_boards:
             return
         
-        if captured_my_piece:
+        if self.lazy_expansion:
+            # Keep "parents + pending opponent move"; children are generated together with the sense result
+            self.my_piece_captured_square = capture_square if captured_my_piece else None
+            if captured_my_piece:
+                self.my_pieces_in_danger.add(capture_square)
+            self.pending_expansion = pondered or self.new_expansion(capture_square if captured_my_piece else None)
+            return
+        
+        if pondered is not None:
+            new_possible_boards = pondered.materialize()
+            self.my_piece_captured_square = None
+        elif captured_my_piece:
             new_possible_boards = self.gen_next_positions_with_capture(capture_square)
             self.my_piece_captured_square = capture_square
             
@@ -84,6 +131,8 @@ class ImprovedAgent(Player):
             new_possible_boards = self.generate_next_positions()
             self.my_piece_captured_square = None
         
+        self.record_expansion()
+        
         # If we've eliminated all possible boards, keep the old ones
         if not new_possible_boards:
             return
@@ -91,12 +140,15 @@ class ImprovedAgent(Player):
         before_count = len(self.possible_boards)
         self.possible_boards = new_possible_boards
         after_count = len(self.possible_boards)
+        self.metrics.set('opponent_move.out', after_count)
         
-        # Update opponent piece likelihood based on possible boards
+        # Update opponent piece likelihood based on possible boards; the tail is pruned once the sense result is in
+        self.possible_boards = self.possible_boards.normalized()
         self.update_opponent_piece_likelihood()
         
 
 
+    @instrumented
     def choose_sense(self, sense_actions: List[int], move_actions: List[chess.Move], seconds_left: float) -> Optional[int]:
         """Oracle-like sensing strategy: prioritize detecting checks, then minimize expected states."""
         
@@ -117,77 +169,38 @@ class ImprovedAgent(Player):
 
         
         # If no possible boards, choose randomly
-        if not self.possible_boards:
+        beliefs = self.sensing_beliefs()
+        if not beliefs:
             return random.choice(sense_actions)
         
         # Filter out edge squares for better sensing (unless very few options)
-        valid_squares = [square for square in sense_actions if not is_edge_square(square)]
+        valid_squares = [square for square in sense_actions if square in INTERIOR_SQUARES]
         if len(valid_squares) < 10:  # If too few valid squares, use all sense actions
             valid_squares = sense_actions
             
     
         # Check if we need to detect possible checks (like Oracle bot)
         if self.check_sensing_enabled:
-            potential_check_squares, check_probability = self.find_potential_check_squares()
-            if check_probability > 0.1 and potential_check_squares:  # If >10% chance of check
-                # Pick a square that covers the most potential checks
-                best_square = None
-                best_coverage = 0
-                
-                for sense_square in valid_squares:
-                    coverage = 0
-                    # Consider the 3x3 grid around each sense square
-                    for rank_offset in range(-1, 2):
-                        for file_offset in range(-1, 2):
-                            rank = chess.square_rank(sense_square) + rank_offset
-                            file = chess.square_file(sense_square) + file_offset
-                            
-                            if 0 <= rank < 8 and 0 <= file < 8:
-                                covered_square = chess.square(file, rank)
-                                if covered_square in potential_check_squares:
-                                    coverage += 1
-                    
-                    if coverage > best_coverage:
-                        best_coverage = coverage
-                        best_square = sense_square
-                
-                if best_square is not None and best_coverage > 0:
-                    return best_square
+            threat_heat, check_probability = self.find_potential_check_squares(beliefs)
+            if check_probability > 0.1:  # If >10% chance of check
+                # Pick the square whose window covers the most threat probability (the earliest on ties)
+                coverage = window_mass(valid_squares, threat_heat)
+                if len(coverage) and coverage.max() > 0:
+                    return valid_squares[int(np.argmax(coverage))]
         
         # If no checks to detect or check detection disabled, minimize expected states (like Oracle)
-        min_expected_states = float('inf')
-        best_sense_square = None
+        # Every candidate square is scored in a single pass over the belief set
+        expected_states, expected_entropy = score_sense_squares(beliefs.rows, valid_squares, beliefs.weights)
+        scores = expected_entropy if self.sense_objective == 'entropy' else expected_states
         
-        # Limit evaluation to a subset of squares for performance
-        squares_to_evaluate = valid_squares
-        if len(squares_to_evaluate) > 25:  # Sample 15 squares if there are too many
-            squares_to_evaluate = random.sample(squares_to_evaluate, 15)
-            
-            # Ensure squares with high opponent piece likelihood are included
-            high_likelihood_squares = sorted(
-                [(square, likelihood) for square, likelihood in self.opponent_piece_likelihood.items()],
-                key=lambda x: x[1], reverse=True
-            )[:5]
-            
-            for square, _ in high_likelihood_squares:
-                if square in valid_squares and square not in squares_to_evaluate:
-                    squares_to_evaluate.append(square)
-                    
-        # Evaluate expected states after sensing
-        for sense_square in squares_to_evaluate:
-            expected_states = self.get_expected_states_after_sensing(sense_square)
-            
-            if expected_states < min_expected_states:
-                min_expected_states = expected_states
-                best_sense_square = sense_square
-        
-        if best_sense_square is not None:
-            return best_sense_square
+        if len(scores):
+            return valid_squares[int(np.argmin(scores))]
         
         # Fallback to random sensing if all else fails
         return random.choice(valid_squares)
 
 
+    @instrumented
     def handle_sense_result(self, sense_result: List[Tuple[int, Optional[chess.Piece]]]):
         
         self.last_sense_result = sense_result
@@ -195,51 +208,58 @@ class ImprovedAgent(Player):
         if not self.possible_boards:
             return
         
-        consistent_boards = set()
-        
         # Update the opponent king position if sensed
         for square, piece in sense_result:
             if piece and piece.piece_type == chess.KING and piece.color != self.color:
                 self.opponent_king_position = square
                 break
         
-        # Check each possible board against the sense result
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            is_consistent = True
-            
-            # Check that each sensed piece matches our possible board
-            for square, piece in sense_result:
-                if piece is None:  # Empty square
-                    if board.piece_at(square) is not None:
-                        is_consistent = False
-                        break
-                else:  # Square has a piece
-                    board_piece = board.piece_at(square)
-                    if board_piece is None or board_piece.piece_type != piece.piece_type or board_piece.color != piece.color:
-                        is_consistent = False
-                        break
-            
-            if is_consistent:
-                consistent_boards.add(fen)
-        
+        if self.pending_expansion is not None:
+            pending, self.pending_expansion = self.pending_expansion, None
+            self.last_expansion = ExpansionStats()
+            children = pending.filter_sense(sense_result, stats=self.last_expansion)
+            self.record_expansion()
+            if self.metrics.enabled:
+                self.metrics.set('sense.in', len(pending.parents))
+                self.metrics.set('sense.children', len(children))
+                for name, value in self.last_expansion.as_dict().items():
+                    self.metrics.set('expansion.' + name, value)
+            if children or pending.has_children():
+                if not children:
+                    # Every child contradicts the sense result: retry from what the last prune dropped,
+                    # then fall back like the eager path does
+                    children = self.recover_pruned(sense_result) or self.initial_beliefs([chess.Board()])
+                self.set_beliefs(children)
+                self.metrics.set('sense.out', len(self.possible_boards))
+                return
+            # The opponent had no moves on any board: keep the old ones and filter them instead
+        
+        # Check every possible board against the sense result in one vectorized pass
         before_count = len(self.possible_boards)
-        self.possible_boards = consistent_boards
-        after_count = len(self.possible_boards)
+        consistent = sense_consistent(self.possible_boards.rows, sense_result)
+        eliminated = self.possible_boards.select(~consistent)
+        survivors = self.possible_boards.select(consistent)
+        after_count = len(survivors)
+        self.metrics.set('sense.in', before_count)
+        self.metrics.set('sense.children', after_count)
         
         
         # If we've eliminated all possible boards, we're in trouble
         if after_count == 0:
-            # Create a default board as fallback
-            default_board = chess.Board()
-            self.possible_boards = {default_board.fen()}
+            # Retry from what the last prune dropped, else create a default board as fallback
+            survivors = self.recover_pruned(sense_result) or self.initial_beliefs([chess.Board()])
+            eliminated = None
         
-        # Update opponent piece likelihood after filtering
-        self.update_opponent_piece_likelihood()
+        # Prune, renormalise and update opponent piece likelihood after filtering
+        self.set_beliefs(survivors, removed=eliminated)
+        self.metrics.set('sense.out', len(self.possible_boards))
 
 
+    @instrumented
     def choose_move(self, move_actions: List[chess.Move], seconds_left: float) -> Optional[chess.Move]:
         """Oracle-like move selection with prioritized mate-in-4 search."""
+        started = time.monotonic()
+        self.metrics.set('clock.seconds_left', seconds_left)
 
         if (self.color and self.move_num==0):
             return chess.Move(chess.E2,chess.E4)
@@ -250,37 +270,50 @@ class ImprovedAgent(Player):
             return random.choice(move_actions) if move_actions else None
 
         
-        # Limit the number of boards to consider to prevent slowdown
-        boards_to_evaluate = list(self.possible_boards)
+        # Size the move phase from the remaining clock; each pooled engine takes its share
+        plan = self.move_scheduler.plan(board_count, seconds_left, self.move_num, self.engine_pool.size)
+        maxBoardCount = plan.boards
+        minBoardSample = max(1, int(maxBoardCount*0.60)) if maxBoardCount else 0
 
-        maxBoardCount = 100
-        minBoardSample = int(maxBoardCount*0.60)
+        weights = self.possible_boards.weights
+
+        def draw(indices, count):
+            # In proportion to hypothesis weight, so equal votes per sampled board estimate the weighted vote
+            if weights is None or count >= len(indices):
+                return random.sample(list(indices), count)
+            probabilities = weights[indices] / weights[indices].sum()
+            count = min(count, int(np.count_nonzero(probabilities)))
+            return list(np.random.choice(indices, size=count, replace=False, p=probabilities))
 
         if board_count > maxBoardCount:
             # Bias sampling toward boards where the opponent king's position is known
-            known_king_boards = []
-            unknown_king_boards = []
-
-            for fen in boards_to_evaluate:
-                board = chess.Board(fen)
-                king_sq = board.king(not self.color)
-                if king_sq is not None:
-                    known_king_boards.append(fen)
-                else:
-                    unknown_king_boards.append(fen)
+            has_king = self.possible_boards.rows[:, plane_index(chess.KING, not self.color)] != 0
+            known_king_boards = np.flatnonzero(has_king)
+            unknown_king_boards = np.flatnonzero(~has_king)
 
             # Sample biased: prioritize 60% known king boards and 40% unknown
             sample_known = min(minBoardSample, len(known_king_boards))
             sample_unknown = maxBoardCount - sample_known
-            boards_to_evaluate = random.sample(known_king_boards, sample_known) + \
-                                random.sample(unknown_king_boards, min(sample_unknown, len(unknown_king_boards)))
+            sampled = draw(known_king_boards, sample_known) + \
+                      draw(unknown_king_boards, min(sample_unknown, len(unknown_king_boards)))
+        else:
+            sampled = list(range(board_count))
 
-            board_count = len(boards_to_evaluate)
+        # Most probable hypotheses first, so an interrupted vote has already seen them
+        if weights is not None:
+            priority = weights[sampled]
+        else:
+            priority = self.piece_heatmap.log_likelihood(self.possible_boards.rows[sampled])
+        sampled = [sampled[position] for position in np.argsort(-priority, kind='stable')]
+        boards_to_evaluate = [self.possible_boards.board(index) for index in sampled]
+        self.metrics.set('move.boards', board_count)
+        self.metrics.set('move.sampled', len(sampled))
+        self.metrics.set('move.sampling_ratio', len(sampled) / board_count)
+        board_count = len(boards_to_evaluate)
 
         
         # First, check if we can directly capture the opponent's king
-        for fen in boards_to_evaluate:
-            board = chess.Board(fen)
+        for board in boards_to_evaluate:
             if board.turn != self.color:
                 continue
                 
@@ -293,111 +326,90 @@ class ImprovedAgent(Player):
                     if attacking_move in move_actions:
                         return attacking_move
 
-        # NEW: Look for mate in 4 across possible boards
-        mate_moves = collections.Counter()
-        boards_with_mate_potential = 0
-        
-        # First check for mate in 4 across our possible boards
-        for i, fen in enumerate(boards_to_evaluate):
-            board = chess.Board(fen)
-            try:
-                if board.turn == self.color:
-                    # Search specifically for mate
-                    mate_result = self.engine.analyse(
-                        board, 
-                        chess.engine.Limit(depth=8),  # Depth 8 should find most mates in 4
-                        multipv=1,
-                        info=chess.engine.INFO_SCORE
-                    )
-                    
-                    # Check if the position has a forced mate
-                    if 'score' in mate_result[0]:
-                        score = mate_result[0]['score']
-                        if score.is_mate() and score.mate() > 0 and score.mate() <= 4:
-                            boards_with_mate_potential += 1
-                            
-                            # Get the first move of the mating sequence
-                            if 'pv' in mate_result[0] and mate_result[0]['pv']:
-                                mate_move = mate_result[0]['pv'][0]
-                                if mate_move in move_actions:
-                                    # Weight by the mate distance - shorter mates get higher weight
-                                    weight = 5 - score.mate()  # mate in 1 gets weight 4, mate in 4 gets weight 1
-                                    mate_moves[mate_move] += weight * 10  # give mate moves higher priority
-            except chess.engine.EngineTerminatedError:
-                try:
-                    self.engine.quit()  # make sure it's fully shut down
-                except:
-                    pass
-
-                # TODO open egnine
-                self.engine = openEngine()
-            except Exception as e:
-                continue
+        # One multipv search per board feeds both the mate-in-4 weighting and the vote. The vote is
+        # anytime: it stops at the deadline, on interrupt(), or once the leader can no longer be caught,
+        # and spends any budget left after the first pass re-searching the same boards deeper
+        our_boards = [board for board in boards_to_evaluate if board.turn == self.color]
+        depths = [plan.depth] + ([plan.depth + self.deepening_step] if self.deepening_step else [])
         
-        # If we found mate in 4 for a significant portion of boards, choose the best mate move
-        if mate_moves and boards_with_mate_potential >= max(1, board_count * 0.1):  # At least 10% of boards
-            best_mate_move = mate_moves.most_common(1)[0][0]
-            return best_mate_move
-
-        # Otherwise, use Stockfish to evaluate moves across all possible boards
-        move_counter = collections.Counter()
-        time_per_board = max(0.001, min(0.05, 5.0 / board_count))  # Adjust time based on board count
-        
-        # For Oracle-like behavior, we count the most frequently recommended move
-        # across all possible board states
-        for i, fen in enumerate(boards_to_evaluate):
-            board = chess.Board(fen)
-            try:
-                if board.turn == self.color:
-                    # Get the top 3 moves from Stockfish for each board
-                    result = self.engine.analyse(board, chess.engine.Limit(time=time_per_board), multipv=3)
-                    for pv in result:
-                        if 'pv' in pv and pv['pv']:
-                            best_move = pv['pv'][0]
-                            # Check if this move is legal in our current position
-                            if best_move in move_actions:
-                                # Weight by position in multipv (first suggestion gets more weight)
-                                weight = 4 - pv.get('multipv', 3)  # multipv 1 gets weight 3, multipv 3 gets weight 1
-                                move_counter[best_move] += weight
-            except chess.engine.EngineTerminatedError:
-                try:
-                    self.engine.quit()  # make sure it's fully shut down
-                except:
-                    pass
-
-                self.engine = openEngine()
-            except Exception as e:
-                continue
+        def analyse_batch(batch, depth):
+            time_per_board = plan.time_per_board * (1 if depth == plan.depth else 2)
+            return self.analyse_for_vote(batch, self.evaluation_limit(time_per_board, depth), move_actions)
+        
+        def decided(vote, remaining):
+            return self.move_scheduler.vote_is_decided(vote.move_counter, vote.evaluated, remaining, VOTE_LINES)
+        
+        self.current_vote = AnytimeVote(move_actions)
+        chosen_move = self.current_vote.run(our_boards, analyse_batch, depths, plan.batch_size,
+                                            deadline=started + plan.budget, decided=decided)
+        self.metrics.set('move.budget_s', plan.budget)
+        self.metrics.set('vote.evaluated', self.current_vote.evaluated)
+        self.metrics.set('vote.depth_reached', self.current_vote.depth_reached)
 
-        if not move_counter:
+        if chosen_move is None:
             if not move_actions:
                 return None
             return random.choice(move_actions)
 
-        # Choose the move with the most votes (Oracle-like behavior)
-        chosen_move, count = move_counter.most_common(1)[0]
+        # A well-supported mate in 4 wins, otherwise the most frequently recommended move (Oracle-like behavior)
         return chosen_move
 
 
+    @instrumented
     def handle_move_result(self, requested_move: Optional[chess.Move], taken_move: Optional[chess.Move],
                            captured_opponent_piece: bool, capture_square: Optional[int]):
         
         if not self.possible_boards:
             return
         
-        new_possible_boards = set()
+        move_result = (requested_move, taken_move, captured_opponent_piece, capture_square)
+        before_count = len(self.possible_boards)
+        self.possible_boards = self.apply_move_result(self.possible_boards, *move_result)
+        after_count = len(self.possible_boards)
+        self.metrics.set('move_result.in', before_count)
+        self.metrics.set('move_result.out', after_count)
+        
+        if after_count == 0 and self.pruned_tail is not None:
+            # The true board was pruned away at the sense; it may still be in the dropped tail
+            self.possible_boards = self.apply_move_result(self.pruned_tail, *move_result)
+            self.pruned_tail = None
+            self.belief_drops['recovered'] += len(self.possible_boards)
+            after_count = len(self.possible_boards)
+        elif self.pruned_tail is not None:
+            self.pruned_tail_move = move_result
+        
+        # If we've eliminated all possible boards, we're in trouble
+        if after_count == 0:
+            # Create a default board and apply the move if possible
+            board = chess.Board()
+            if board.turn != self.color:
+                board.push(chess.Move.null())  # Skip to our turn
+            if taken_move is not None and taken_move in board.legal_moves:
+                board.push(taken_move)
+            self.possible_boards = self.initial_beliefs([board])
+            
+        self.move_num += 1
         
-        # If we captured the opponent's king, remember that square for future sensing
-        if captured_opponent_piece and capture_square is not None:
-            for fen in self.possible_boards:
-                board = chess.Board(fen)
-                piece = board.piece_at(capture_square)
-                if piece and piece.piece_type == chess.KING and piece.color != self.color:
-                    break
+        # Renormalise and update opponent piece likelihood; the belief only shrinks here, so it is not pruned
+        self.set_beliefs(self.possible_boards, prune=False)
+        
+        # Our turn is over: make sure every engine still answers before the next one
+        if self.engine_pool:
+            self.engine_pool.health_check()
+            if self.metrics.enabled:
+                self.metrics.set('engine.restarts', self.engine_pool.supervisor.restarts)
+        self.start_pondering()
+
+
+    def apply_move_result(self, beliefs: BeliefSet, requested_move: Optional[chess.Move],
+                          taken_move: Optional[chess.Move], captured_opponent_piece: bool,
+                          capture_square: Optional[int]) -> BeliefSet:
+        """The hypotheses consistent with our move result, each advanced by the move actually taken."""
+        new_possible_boards = {}  # key -> weight; our move is known, so each board keeps its weight
+        weights = beliefs.probabilities()
         
         # Filter boards based on move result
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
+        for board, weight in zip(beliefs, weights):
             
             # Skip boards where it's not our turn
             if board.turn != self.color:
@@ -407,7 +419,8 @@ class ImprovedAgent(Player):
             if taken_move is None:
                 # Keep boards where the requested move is not legal
                 if requested_move not in board.legal_moves:
-                    new_possible_boards.add(fen)
+                    key = board_key(board)
+                    new_possible_boards[key] = new_possible_boards.get(key, 0.0) + weight
                 continue
                     
             # Check if the move is consistent with the capture information
@@ -421,238 +434,188 @@ class ImprovedAgent(Player):
                 )
                 
                 if is_consistent:
-                    new_board = board.copy()
-                    new_board.push(taken_move)
-                    new_possible_boards.add(new_board.fen())
-        
-        before_count = len(self.possible_boards)
-        self.possible_boards = new_possible_boards
-        after_count = len(self.possible_boards)
-        
-        # If we've eliminated all possible boards, we're in trouble
-        if after_count == 0:
-            # Create a default board and apply the move if possible
-            board = chess.Board()
-            if board.turn != self.color:
-                board.push(chess.Move.null())  # Skip to our turn
-            if taken_move is not None and taken_move in board.legal_moves:
-                board.push(taken_move)
-            self.possible_boards = {board.fen()}
-            
-        self.move_num += 1
+                    key = child_key(board, taken_move)
+                    new_possible_boards[key] = new_possible_boards.get(key, 0.0) + weight
         
-        # Update opponent piece likelihood
-        self.update_opponent_piece_likelihood()
+        return BeliefSet.from_keys(new_possible_boards.keys(), new_possible_boards.values() if self.move_model else None)
 
 
     def handle_game_end(self, winner_color: Optional[Color], win_reason: Optional[WinReason],
                         game_history: GameHistory):
         result = "White wins" if winner_color == chess.WHITE else "Black wins" if winner_color == chess.BLACK else "Draw"
         print(f"[END] Game Over: {result}. Reason: {win_reason}")
-        if self.engine:
-            try:
-                self.engine.quit()
-            except chess.engine.EngineTerminatedError:
-                pass
+        self.stop_pondering()
+        if self.ponder_stats:
+            print(f"[END] Pondering: {dict(self.ponder_stats)}")
+        if self.belief_drops:
+            print(f"[END] Belief hypotheses dropped: {dict(self.belief_drops)}")
+        if self.engine_pool:
+            print(f"[END] Engine latency: {self.engine_pool.latency_report()}")
+        if self.shard_pool:
+            print(f"[END] Sharded expansions: {self.shard_pool.sharded}")
+            self.shard_pool.shutdown()
+        self.metrics.flush(agent=type(self).__name__, color=chess.COLOR_NAMES[self.color], result=result,
+                           reason=str(win_reason), belief_drops=dict(self.belief_drops), ponder=dict(self.ponder_stats),
+                           eval_cache=self.eval_cache.stats(),
+                           engines=self.engine_pool.latency_report() if self.engine_pool else None)
+        if self.engine_pool:
+            self.engine_pool.quit()
     
     #UTIL
-    def update_opponent_piece_likelihood(self):
+    def evaluation_limit(self, time_per_board, depth=None):
+        """Search limit for the single per-board analysis according to eval_limit_policy."""
+        depth = depth or self.eval_depth
+        if self.eval_limit_policy == 'depth':
+            return chess.engine.Limit(depth=depth)
+        if self.eval_limit_policy == 'time':
+            return chess.engine.Limit(time=time_per_board)
+        return chess.engine.Limit(depth=depth, time=time_per_board)
+
+    def analyse_for_vote(self, boards: List[chess.Board], limit: chess.engine.Limit,
+                         move_actions: List[chess.Move]) -> list:
+        """Multipv analyses feeding the move vote, one per board in input order."""
+        results = [None] * len(boards)
+        self.metrics.count('vote.boards', len(boards))
+        if self.pondering and (limit.depth is None or limit.depth <= self.ponder_depth):
+            # Searches pondered during the opponent's turn are at least as deep as this pass asks for
+            ponder_limit = chess.engine.Limit(depth=self.ponder_depth)
+            for index, board in enumerate(boards):
+                key = EvalCache.key(board, ponder_limit, VOTE_LINES, None, searchmoves(board, move_actions))
+                # A miss is counted once, by the pool's own lookup below
+                results[index] = self.eval_cache.get(key, count_miss=False)
+            self.ponder_stats['reused'] += sum(result is not None for result in results)
+            self.metrics.count('ponder.reused', sum(result is not None for result in results))
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            searched = self.engine_pool.analyse_many([boards[index] for index in missing], limit, move_actions,
+                                                     multipv=VOTE_LINES)
+            for index, result in zip(missing, searched):
+                results[index] = result
+        return results
+
+    def start_pondering(self):
+        """Expand the belief for a quiet opponent move and pre-search its likeliest children in the background."""
+        if not self.pondering or not self.possible_boards or self.ponder is not None:
+            return
+        expansion = self.new_expansion()
+        self.ponder = Ponder(self.possible_boards, expansion, self.engine_pool,
+                             chess.engine.Limit(depth=self.ponder_depth), self.ponder_boards, VOTE_LINES).start()
+
+    def stop_pondering(self) -> Optional[LazyExpansion]:
+        """Stop pondering; returns the pondered expansion if it completed from the current belief."""
+        if self.ponder is None:
+            return None
+        ponder, self.ponder = self.ponder, None
+        with self.metrics.timer('ponder.stop'):
+            expansion = ponder.stop()
+        self.metrics.count('ponder.searched', ponder.searched)
+        self.ponder_stats['turns'] += 1
+        self.ponder_stats['searched'] += ponder.searched
+        if expansion is None or ponder.beliefs is not self.possible_boards:
+            return None
+        self.ponder_stats['expanded'] += 1
+        self.last_expansion = ponder.stats
+        return expansion
+
+    def update_opponent_piece_likelihood(self, removed: Optional[BeliefSet] = None):
         """Update the likelihood of opponent pieces being on each square."""
-        # Reset likelihoods
-        self.opponent_piece_likelihood = {}
-        
-        # Count occurrences of opponent pieces on each square across all possible boards
-        piece_counts = {}
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            for square in range(64):
-                piece = board.piece_at(square)
-                if piece and piece.color != self.color:
-                    if square not in piece_counts:
-                        piece_counts[square] = 0
-                    piece_counts[square] += 1
-        
-        # Convert counts to likelihoods
-        board_count = max(1, len(self.possible_boards))  # Avoid division by zero
-        for square, count in piece_counts.items():
-            self.opponent_piece_likelihood[square] = count / board_count
+        # Subtract removed hypotheses when that is cheaper than recounting the survivors
+        self.piece_heatmap.refresh(self.possible_boards, removed)
+        self.opponent_piece_likelihood = self.piece_heatmap.any_piece()
+
+
+    def initial_beliefs(self, boards):
+        """Belief set for known boards, weighted when a move model is in use."""
+        beliefs = BeliefSet.from_boards(boards)
+        if self.move_model is None:
+            return beliefs
+        return BeliefSet(beliefs.rows, np.ones(len(beliefs)), dedup=False).normalized()
+
+
+    def set_beliefs(self, beliefs, removed: Optional[BeliefSet] = None, prune: bool = True):
+        """Replace the belief set, dropping its low-probability tail and renormalising the weights."""
+        if prune:
+            keep = beliefs.prune_mask(self.max_hypotheses, self.hypothesis_mass)
+            self.pruned_tail, self.pruned_tail_move = None, None
+            if not keep.all():
+                self.pruned_tail = beliefs.select(~keep)
+                self.belief_drops['pruned'] += len(self.pruned_tail)
+                beliefs = beliefs.select(keep)
+                removed = None  # recount rather than subtract both eliminated and pruned hypotheses
+        self.possible_boards = beliefs.normalized()
+        self.update_opponent_piece_likelihood(removed)
+
+
+    def recover_pruned(self, sense_result) -> BeliefSet:
+        """Redo the opponent's move and this sense from the hypotheses the last prune dropped.
+
+        Used when nothing in the belief fits the sense result; empty when nothing in the tail fits either.
+        """
+        tail, self.pruned_tail = self.pruned_tail, None
+        if tail is None:
+            return BeliefSet()
+        if self.pruned_tail_move is not None:
+            tail = self.apply_move_result(tail, *self.pruned_tail_move)
+        expansion = LazyExpansion(tail, not self.color, self.my_piece_captured_square, self.move_model,
+                                  self.belief_cap())
+        recovered = expansion.filter_sense(sense_result)
+        if not recovered and not expansion.has_children():
+            # The opponent had no moves on any of them: the tail itself may still fit
+            recovered, _ = tail.filter_sense(sense_result)
+        self.belief_drops['recovered'] += len(recovered)
+        return recovered
+
+
+    def belief_cap(self) -> Optional[int]:
+        """Most hypotheses an expansion may keep: max_expansion or what fits in belief_memory_mb, whichever is less."""
+        caps = [self.max_expansion] if self.max_expansion is not None else []
+        if self.belief_memory_mb is not None:
+            caps.append(rows_for_memory(self.belief_memory_mb, weighted=self.move_model is not None))
+        return min(caps) if caps else None
+
+
+    def record_expansion(self):
+        """Add the last expansion's resampling losses to belief_drops."""
+        self.belief_drops['expansions'] += 1
+        if self.last_expansion.dropped:
+            self.belief_drops['resampled_expansions'] += 1
+            self.belief_drops['resampled'] += self.last_expansion.dropped
+            self.belief_drops['resampled_mass'] += self.last_expansion.dropped_mass
 
 
     def generate_next_positions(self):
         """Generate all possible positions after opponent's move with no capture."""
-        next_positions = set()
-
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            
-            # Skip boards where it's not the opponent's turn
-            if board.turn == self.color:
-                continue
-                
-            # Generate all possible opponent moves including null move
-            possible_moves = list(board.pseudo_legal_moves) + [chess.Move.null()]
-            
-            # Add castling possibilities
-            next_positions.update(self.get_opponent_castling(board))
-            
-            # For each move that doesn't capture, add the resulting position
-            for move in possible_moves:
-                # Only consider non-capturing moves
-                if board.piece_at(move.to_square) is None:
-                    new_board = board.copy()
-                    new_board.push(move)
-                    next_positions.add(new_board.fen())
-        
-        return next_positions
+        # Children are streamed and deduplicated as they are generated, never holding more than belief_cap()
+        self.last_expansion = ExpansionStats()
+        return self.new_expansion().materialize(self.last_expansion)
 
 
     def gen_next_positions_with_capture(self, capture_square):
         """Generate all possible positions after opponent's move with capture at specified square."""
-        next_positions = set()
-        
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            
-            # Skip boards where it's not the opponent's turn
-            if board.turn == self.color:
-                continue
-                
-            # Generate all possible opponent moves
-            possible_moves = list(board.pseudo_legal_moves)
-            
-            # For each capturing move to the right square, add the resulting position
-            for move in possible_moves:
-                if (board.is_capture(move) or board.is_en_passant(move)) and move.to_square == capture_square:
-                    new_board = board.copy()
-                    new_board.push(move)
-                    next_positions.add(new_board.fen())
-        
-        return next_positions
-
-
-    def get_opponent_castling(self, board):
-        """Generate positions resulting from opponent castling."""
-        castling_positions = set()
-        enemy_color = not self.color
-
-        # Check kingside castling
-        if board.has_kingside_castling_rights(enemy_color):
-            king_square = board.king(enemy_color)
-            target_square = chess.square(chess.square_file(king_square) + 2, chess.square_rank(king_square))
-            move = chess.Move(king_square, target_square)
-            
-            # Attempt the castling move if it's legal
-            if move in board.legal_moves:
-                new_board = board.copy()
-                new_board.push(move)
-                castling_positions.add(new_board.fen())
-
-        # Check queenside castling
-        if board.has_queenside_castling_rights(enemy_color):
-            king_square = board.king(enemy_color)
-            target_square = chess.square(chess.square_file(king_square) - 2, chess.square_rank(king_square))
-            move = chess.Move(king_square, target_square)
-            
-            # Attempt the castling move if it's legal
-            if move in board.legal_moves:
-                new_board = board.copy()
-                new_board.push(move)
-                castling_positions.add(new_board.fen())
+        self.last_expansion = ExpansionStats()
+        return self.new_expansion(capture_square).materialize(self.last_expansion)
 
-        return castling_positions
 
+    def new_expansion(self, capture_square: Optional[int] = None) -> LazyExpansion:
+        """Pending opponent move from the current belief; sharded across the worker processes when there are any."""
+        if self.shard_pool is not None:
+            return ShardedExpansion(self.possible_boards, not self.color, capture_square, self.move_model,
+                                    self.belief_cap(), self.shard_pool)
+        return LazyExpansion(self.possible_boards, not self.color, capture_square, self.move_model, self.belief_cap())
 
-    def find_potential_check_squares(self):
-        """Find squares where sensing might reveal if our king is in check across possible boards."""
-        potential_check_squares = set()
-        king_under_attack_count = 0
-        total_boards = len(self.possible_boards)
-        
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            # Ensure it's our turn
-            if board.turn != self.color:
-                board.push(chess.Move.null())
-                
-            king_square = board.king(self.color)
-            if king_square is None:
-                continue
-                
-            # Check if our king is attacked
-            attackers = board.attackers(not self.color, king_square)
-            if attackers:
-                king_under_attack_count += 1
-                # Add attacking squares to potential check squares
-                for attacker_square in attackers:
-                    potential_check_squares.add(attacker_square)
-                    
-                    # Also add squares between attacker and king for sliding pieces
-                    piece = board.piece_at(attacker_square)
-                    if piece and piece.piece_type in [chess.BISHOP, chess.ROOK, chess.QUEEN]:
-                        between_squares = chess.SquareSet(chess.between(attacker_square, king_square))
-                        for square in between_squares:
-                            potential_check_squares.add(square)
-        
-        # Check if there's a significant chance our king is in check
-        check_probability = king_under_attack_count / max(1, total_boards)
-        
-        return potential_check_squares, check_probability
-    
-    #probility stuff
-    def update_opponent_piece_likelihood(self):
-        """Update the likelihood of opponent pieces being on each square."""
-        # Reset likelihoods
-        self.opponent_piece_likelihood = {}
-        
-        # Count occurrences of opponent pieces on each square across all possible boards
-        piece_counts = {}
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            for square in range(64):
-                piece = board.piece_at(square)
-                if piece and piece.color != self.color:
-                    if square not in piece_counts:
-                        piece_counts[square] = 0
-                    piece_counts[square] += 1
-        
-        # Convert counts to likelihoods
-        board_count = max(1, len(self.possible_boards))  # Avoid division by zero
-        for square, count in piece_counts.items():
-            self.opponent_piece_likelihood[square] = count / board_count
-
-
-    def get_expected_states_after_sensing(self, sense_square):
-        """Calculate the expected number of states after sensing at a given square."""
-        # Group possible boards by what would be observed at the sense square
-        observation_groups = {}
-        
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            
-            # Generate the 3x3 grid around the sense square
-            sense_result = []
-            for rank_offset in range(-1, 2):
-                for file_offset in range(-1, 2):
-                    rank = chess.square_rank(sense_square) + rank_offset
-                    file = chess.square_file(sense_square) + file_offset
-                    
-                    if 0 <= rank < 8 and 0 <= file < 8:
-                        obs_square = chess.square(file, rank)
-                        piece = board.piece_at(obs_square)
-                        sense_result.append((obs_square, piece))
-            
-            # Convert sense result to a hashable representation
-            sense_key = tuple(sorted([(sq, str(p)) for sq, p in sense_result]))
-            
-            if sense_key not in observation_groups:
-                observation_groups[sense_key] = 0
-            observation_groups[sense_key] += 1
-        
-        # Calculate the expected number of states after sensing
-        total_boards = len(self.possible_boards)
-        expected_states = 0
-        for count in observation_groups.values():
-            probability = count / total_boards
-            expected_states += probability * count
-            
-        return expected_states
+
+    def sensing_beliefs(self):
+        """Boards to plan the sense on: a sample of the pending expansion's children, if one is pending."""
+        if self.pending_expansion is None:
+            return self.possible_boards
+        children = self.pending_expansion.sample(self.sense_sample_size)
+        # If we've eliminated all possible boards, keep the old ones
+        return children if children else self.possible_boards
+
+
+    def find_potential_check_squares(self, beliefs=None):
+        """Probability that each square is a check origin (attacker or interposing square), and the check probability."""
+        beliefs = beliefs if beliefs is not None else self.possible_boards
+        # One vectorized pass over every hypothesis' bitboards
+        check_probability, threat_heat = threat_heatmap(beliefs.rows, self.color, beliefs.weights)
+        return threat_heat, check_probability
@@ -1,42 +1,50 @@
 import os
-import platform
 import random
+import time
 import chess
 import chess.engine
 from reconchess import Player
 from chess import square_name 
 import collections
-import numpy as np
+from belief import BeliefSet, board_key, rows_for_memory
+from engines import EngineSupervisor, stockfish_path
+from expansion import ExpansionStats, child_key, collect
+from scheduler import MoveScheduler
+from sense_tables import INTERIOR_SQUARES
+from metrics import Metrics, instrumented
 
 class RandomSensing(Player):
     def __init__(self):
-        self.possible_boards = set()
+        self.possible_boards = BeliefSet()
         self.color = None
         self.capture_square = None
+        self.move_num = 0
+        self.move_scheduler = MoveScheduler(max_time_per_board=0.1, max_boards_per_engine=10000)
+        self.max_beliefs = 10000        # Hard cap on possible boards, enforced by reservoir sampling at expansion time
+        self.belief_memory_mb = None    # Optional memory budget for the possible boards
+        self.dropped_boards = 0
+        self.metrics = Metrics.from_env()   # Per-turn timers and counters, appended to the JSONL file named by RBC_METRICS
 
         # Setup Stockfish path
-        if platform.system() == 'Windows':
-            stockfish_path = './stockfish.exe'
-        elif platform.system() == 'Linux':
-            stockfish_path = '/usr/bin/stockfish'
-        elif platform.system() == 'Darwin':
-            stockfish_path = './stockfish-macos'
-        else:
-            raise EnvironmentError("Unsupported OS for Stockfish")
+        path = stockfish_path('/usr/bin/stockfish')
 
-        if not os.path.exists(stockfish_path):
-            raise FileNotFoundError(f"Stockfish not found at: {stockfish_path}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Stockfish not found at: {path}")
 
-        self.engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
-        print(f"[INIT] Stockfish engine loaded from {stockfish_path}")
+        # The supervisor keeps a warm spare so a crashed engine is replaced without a cold start
+        self.supervisor = EngineSupervisor(lambda: chess.engine.SimpleEngine.popen_uci(path))
+        self.engine = self.supervisor.start()
+        print(f"[INIT] Stockfish engine loaded from {path}")
 
     def handle_game_start(self, color, board, opponent_name):
         self.color = color
-        self.possible_boards = {board.fen()}
+        self.possible_boards = BeliefSet.from_boards([board])
         print(f"[START] Game started. Playing as {'White' if color else 'Black'} against {opponent_name}")
         print(f"[START] Initial board FEN: {board.fen()}")
 
+    @instrumented
     def handle_opponent_move_result(self, captured_my_piece, capture_square):
+        self.metrics.start_turn(self.move_num)
         self.capture_square = capture_square
         print(f"[OPPONENT MOVE] Captured my piece: {captured_my_piece}, Capture square: {capture_square}")
         
@@ -44,58 +52,66 @@ class RandomSensing(Player):
             print("[OPPONENT MOVE] No possible boards to update!")
             return
         
-        new_possible_boards = set()
-        
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            
-            # Skip boards where it's not the opponent's turn
-            if board.turn == self.color:
-                continue
-                
-            # Generate all possible opponent moves
-            for move in board.legal_moves:
-                # Check if the move is consistent with the capture information
-                move_captures = board.is_capture(move)
+        def new_possible_boards():
+            for board in self.possible_boards:
                 
-                # If opponent captured and the move is a capture to the right square
-                if captured_my_piece and move_captures and move.to_square == capture_square:
-                    new_board = board.copy()
-                    new_board.push(move)
-                    new_possible_boards.add(new_board.fen())
+                # Skip boards where it's not the opponent's turn
+                if board.turn == self.color:
+                    continue
                     
-                # If opponent didn't capture and the move is not a capture
-                elif not captured_my_piece and not move_captures:
-                    new_board = board.copy()
-                    new_board.push(move)
-                    new_possible_boards.add(new_board.fen())
+                # Generate all possible opponent moves
+                for move in board.legal_moves:
+                    # Check if the move is consistent with the capture information
+                    move_captures = board.is_capture(move)
                     
-                # If opponent didn't capture but move is en passant to capture square
-                elif not captured_my_piece and move.to_square == capture_square:
-                    new_board = board.copy()
-                    new_board.push(move)
-                    new_possible_boards.add(new_board.fen())
+                    # If opponent captured and the move is a capture to the right square
+                    if captured_my_piece and move_captures and move.to_square == capture_square:
+                        yield child_key(board, move)
+                        
+                    # If opponent didn't capture and the move is not a capture
+                    elif not captured_my_piece and not move_captures:
+                        yield child_key(board, move)
+                        
+                    # If opponent didn't capture but move is en passant to capture square
+                    elif not captured_my_piece and move.to_square == capture_square:
+                        yield child_key(board, move)
         
+        # Children stream into a fixed-size reservoir, so the set never outgrows the cap
         before_count = len(self.possible_boards)
-        self.possible_boards = new_possible_boards
+        stats = ExpansionStats()
+        self.possible_boards = collect(new_possible_boards(), stats=stats, reservoir=self.belief_cap())
         after_count = len(self.possible_boards)
+        self.dropped_boards += stats.dropped
+        if self.metrics.enabled:
+            self.metrics.set('opponent_move.in', before_count)
+            self.metrics.set('opponent_move.out', after_count)
+            for name, value in stats.as_dict().items():
+                self.metrics.set('expansion.' + name, value)
         
         print(f"[OPPONENT MOVE] Updated boards: {before_count} -> {after_count}")
+        if stats.dropped:
+            print(f"[OPPONENT MOVE] Resampled to {after_count} boards ({stats.dropped} dropped, "
+                  f"{stats.dropped_mass:.0%} of the candidates)")
         
         # If we've eliminated all possible boards, we're in trouble
         if after_count == 0:
             print("[OPPONENT MOVE] WARNING: All boards eliminated! Creating new possibilities.")
-            self.possible_boards = {chess.Board().fen()}
+            self.possible_boards = BeliefSet.from_boards([chess.Board()])
 
+    def belief_cap(self):
+        caps = [self.max_beliefs] if self.max_beliefs is not None else []
+        if self.belief_memory_mb is not None:
+            caps.append(rows_for_memory(self.belief_memory_mb))
+        return min(caps) if caps else None
+
+    @instrumented
     def choose_sense(self, sense_actions, move_actions, seconds_left):
-        valid_squares = [
-            square for square in sense_actions
-            if 1 <= square % 8 <= 6 and 1 <= square // 8 <= 6
-        ]
+        valid_squares = [square for square in sense_actions if square in INTERIOR_SQUARES]
         chosen = random.choice(valid_squares)
         print(f"[SENSE] Chosen sensing square: {square_name(chosen)}")
         return chosen
 
+    @instrumented
     def handle_sense_result(self, sense_result):
         print(f"[SENSE RESULT] Pieces sensed: {sense_result}")
         
@@ -104,85 +120,64 @@ class RandomSensing(Player):
             print("[SENSE RESULT] No possible boards to filter!")
             return
         
-        # Convert to list for iteration since we'll be modifying the set
-        consistent_boards = set()
-        
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
-            is_consistent = True
-            
-            # Check that each sensed piece matches our possible board
-            for square, piece in sense_result:
-                if piece is None:  # Empty square
-                    if board.piece_at(square) is not None:
-                        is_consistent = False
-                        break
-                else:  # Square has a piece
-                    board_piece = board.piece_at(square)
-                    if board_piece is None or board_piece.symbol() != piece.symbol():
-                        is_consistent = False
-
-                        break
-            
-            if is_consistent:
-                consistent_boards.add(fen)
-        
+        # Eliminate inconsistent boards in one vectorized pass over the belief set
         before_count = len(self.possible_boards)
-        self.possible_boards = consistent_boards
+        self.possible_boards, eliminated_count = self.possible_boards.filter_sense(sense_result)
         after_count = len(self.possible_boards)
         
-        print(f"[SENSE RESULT] Filtered boards: {before_count} -> {after_count}")
+        print(f"[SENSE RESULT] Filtered boards: {before_count} -> {after_count} ({eliminated_count} eliminated)")
+        self.metrics.set('sense.in', before_count)
+        self.metrics.set('sense.out', after_count)
         
         # If we've eliminated all possible boards, we're in trouble
         if after_count == 0:
             print("[SENSE RESULT] WARNING: All boards eliminated! Resetting to single random board.")
             # Create a standard chess board as fallback
-            self.possible_boards = {chess.Board().fen()}
+            self.possible_boards = BeliefSet.from_boards([chess.Board()])
 
+    @instrumented
     def choose_move(self, move_actions, seconds_left):
+        started = time.monotonic()
         board_count = len(self.possible_boards)
 
         if board_count == 0:
             print("[MOVE] No possible boards — choosing random move.")
             return random.choice(move_actions) if move_actions else None
 
-        if board_count > 10000:
-            self.possible_boards = set(random.sample(list(self.possible_boards), 10000))
-            board_count = 10000
-            print("[MOVE] Pruned to 10,000 possible boards.")
-
+        # Size the vote from the remaining clock: how many boards and how long each (min 1ms, max 100ms)
+        plan = self.move_scheduler.plan(board_count, seconds_left, self.move_num)
+        boards_to_evaluate = self.possible_boards.sample(plan.boards)
+        self.metrics.set('clock.seconds_left', seconds_left)
+        self.metrics.set('move.boards', board_count)
+        self.metrics.set('move.sampled', len(boards_to_evaluate))
+        self.metrics.set('move.sampling_ratio', len(boards_to_evaluate) / board_count)
         move_counter = collections.Counter()
-        time_per_board = max(0.001, min(0.1, 10.0 / board_count))  # Min 1ms, max 100ms per board
+        evaluated = 0
 
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
+        for index, board in enumerate(boards_to_evaluate):
+            # The plan ignores per-search overhead, so the clock decides when the vote has had its share
+            if evaluated and time.monotonic() - started >= plan.budget:
+                print(f"[MOVE] Move budget spent after {evaluated} boards.")
+                break
             try:
                 if board.turn == self.color:
-                    result = self.engine.play(board, chess.engine.Limit(time=time_per_board))
+                    result = self.play(board, chess.engine.Limit(time=plan.time_per_board))
+                    evaluated += 1
                     best_move = result.move
                     if best_move in move_actions:
                         move_counter[best_move] += 1
+                    # Stop early once the leader cannot be caught
+                    remaining = len(boards_to_evaluate) - index - 1
+                    if evaluated % plan.batch_size == 0 and \
+                            self.move_scheduler.vote_is_decided(move_counter, evaluated, remaining, 1):
+                        print(f"[MOVE] Vote decided after {evaluated} boards.")
+                        break
             except chess.engine.EngineTerminatedError:
-                print("[ERROR] Stockfish engine died - restarting")
-                try:
-                    self.engine.quit()  # make sure it's fully shut down
-                except:
-                    pass
-
-                # Re-detect the stockfish path
-                if platform.system() == 'Windows':
-                    stockfish_path = './stockfish.exe'
-                elif platform.system() == 'Linux':
-                    stockfish_path = '/usr/bin/stockfish'
-                elif platform.system() == 'Darwin':
-                    stockfish_path = './stockfish-macos'
-                else:
-                    raise EnvironmentError("Unsupported OS for Stockfish")
-
-                # Restart the engine
-                self.engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+                # The replacement died too; swap again and move on to the next board
+                print("[ERROR] Stockfish engine died again - restarting")
+                self.engine = self.supervisor.replace(self.engine)
             except Exception as e:
-                print(f"[MOVE] Stockfish error on board: {fen[:30]}... Error: {e}")
+                print(f"[MOVE] Stockfish error on board: {board.fen()[:30]}... Error: {e}")
                 continue
 
         if not move_counter:
@@ -192,10 +187,24 @@ class RandomSensing(Player):
                 return None
             return random.choice(move_actions)
 
+        self.metrics.set('vote.evaluated', evaluated)
         chosen_move, count = move_counter.most_common(1)[0]
-        print(f"[MOVE] Chosen move: {chosen_move} with {count} votes (out of {board_count})")
+        print(f"[MOVE] Chosen move: {chosen_move} with {count} votes (out of {evaluated})")
         return chosen_move
 
+    def play(self, board, limit):
+        """engine.play, retried once on the supervisor's replacement if the engine dies."""
+        self.metrics.count('engine.searches')
+        with self.metrics.timer('engine.play'):
+            try:
+                return self.engine.play(board, limit)
+            except chess.engine.EngineTerminatedError:
+                print("[ERROR] Stockfish engine died - switching to the warm spare")
+                self.metrics.count('engine.retries')
+                self.engine = self.supervisor.replace(self.engine)
+                return self.engine.play(board, limit)
+
+    @instrumented
     def handle_move_result(self, requested_move, taken_move, captured_opponent_piece, capture_square):
         print(f"[MOVE RESULT] Requested: {requested_move}, Taken: {taken_move}, Captured: {captured_opponent_piece}")
         
@@ -205,8 +214,7 @@ class RandomSensing(Player):
         
         new_possible_boards = set()
         
-        for fen in self.possible_boards:
-            board = chess.Board(fen)
+        for board in self.possible_boards:
             
             # Skip boards where it's not our turn
             if board.turn != self.color:
@@ -216,7 +224,7 @@ class RandomSensing(Player):
             if taken_move is None:
                 # Keep boards where the requested move is not legal
                 if requested_move not in board.legal_moves:
-                    new_possible_boards.add(fen)
+                    new_possible_boards.add(board_key(board))
                 continue
                     
             # Check if the move is consistent with the capture information
@@ -231,15 +239,15 @@ class RandomSensing(Player):
                 )
                 
                 if is_consistent:
-                    new_board = board.copy()
-                    new_board.push(taken_move)
-                    new_possible_boards.add(new_board.fen())
+                    new_possible_boards.add(child_key(board, taken_move))
         
         before_count = len(self.possible_boards)
-        self.possible_boards = new_possible_boards
+        self.possible_boards = BeliefSet.from_keys(new_possible_boards)
         after_count = len(self.possible_boards)
         
         print(f"[MOVE RESULT] Updated boards: {before_count} -> {after_count}")
+        self.metrics.set('move_result.in', before_count)
+        self.metrics.set('move_result.out', after_count)
         
         # If we've eliminated all possible boards, we're in trouble
         if after_count == 0:
@@ -250,11 +258,23 @@ class RandomSensing(Player):
                 board.push(chess.Move.null())  # Skip to our turn
             if taken_move is not None and taken_move in board.legal_moves:
                 board.push(taken_move)
-            self.possible_boards = {board.fen()}
+            self.possible_boards = BeliefSet.from_boards([board])
+
+        self.move_num += 1
+
+        # Between turns: ping the engine and swap in the spare if it stopped answering
+        self.engine = self.supervisor.ensure_healthy(self.engine)
+        self.metrics.set('engine.restarts', self.supervisor.restarts)
 
     def handle_game_end(self, winner_color, win_reason, game_history):
         result = "White wins" if winner_color == chess.WHITE else "Black wins" if winner_color == chess.BLACK else "Draw"
         print(f"[END] Game Over: {result}. Reason: {win_reason}")
+        print(f"[END] Possible boards dropped by resampling: {self.dropped_boards}")
+        print(f"[END] Engine supervisor: {self.supervisor.stats()}")
         if self.engine:
             self.engine.quit()
             print("[END] Stockfish engine shut down.")
+        self.supervisor.shutdown()
+        self.metrics.flush(agent=type(self).__name__, color=chess.COLOR_NAMES[self.color], result=result,
+                           reason=str(win_reason), dropped_boards=self.dropped_boards,
+                           supervisor=self.supervisor.stats())
@@ -0,0 +1,230 @@
+import random
+import chess
+import numpy as np
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Row layout: 12 piece bitboards followed by castling rights, en passant square and side to move
+PLANE_COUNT = 12
+CASTLING = 12
+EP_SQUARE = 13
+TURN = 14
+ROW_WIDTH = 15
+
+NO_EP = 64  # stored in the EP_SQUARE column when there is no en passant square
+
+ROW_BYTES = ROW_WIDTH * 8      # one packed hypothesis
+WEIGHT_BYTES = 8               # its float64 weight, when weighted
+COLLECT_OVERHEAD_BYTES = 104   # dedup dict entry per hypothesis while an expansion is being collected
+
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SALTS = np.array([(0x9E3779B97F4A7C15 * (i + 1)) & 0xFFFFFFFFFFFFFFFF for i in range(ROW_WIDTH)], dtype=np.uint64)
+
+
+def rows_for_memory(memory_mb: float, weighted: bool = False) -> int:
+    """How many hypotheses fit in memory_mb megabytes, counting rows, weights and collection overhead."""
+    per_row = ROW_BYTES + COLLECT_OVERHEAD_BYTES + (WEIGHT_BYTES if weighted else 0)
+    return max(1, int(memory_mb * 2 ** 20) // per_row)
+
+
+def plane_index(piece_type, color):
+    """Column of the bitboard holding pieces of the given type and color (white first)."""
+    return (piece_type - 1) + (0 if color == chess.WHITE else 6)
+
+
+def board_key(board: chess.Board) -> Tuple[int, ...]:
+    """Compact, hashable description of a position (no move counters)."""
+    white = board.occupied_co[chess.WHITE]
+    black = board.occupied_co[chess.BLACK]
+    ep_square = board.ep_square
+    if ep_square is None or not board.has_legal_en_passant():
+        ep_square = NO_EP
+    return (
+        board.pawns & white, board.knights & white, board.bishops & white,
+        board.rooks & white, board.queens & white, board.kings & white,
+        board.pawns & black, board.knights & black, board.bishops & black,
+        board.rooks & black, board.queens & black, board.kings & black,
+        board.clean_castling_rights(), ep_square, int(board.turn),
+    )
+
+
+def board_from_row(row) -> chess.Board:
+    """Rebuild a chess.Board from a stored row without going through FEN text."""
+    planes = [int(value) for value in row]
+    board = chess.Board(None)
+    white = planes[0] | planes[1] | planes[2] | planes[3] | planes[4] | planes[5]
+    black = planes[6] | planes[7] | planes[8] | planes[9] | planes[10] | planes[11]
+    board.pawns = planes[0] | planes[6]
+    board.knights = planes[1] | planes[7]
+    board.bishops = planes[2] | planes[8]
+    board.rooks = planes[3] | planes[9]
+    board.queens = planes[4] | planes[10]
+    board.kings = planes[5] | planes[11]
+    board.occupied_co[chess.WHITE] = white
+    board.occupied_co[chess.BLACK] = black
+    board.occupied = white | black
+    board.castling_rights = planes[CASTLING]
+    board.ep_square = None if planes[EP_SQUARE] == NO_EP else planes[EP_SQUARE]
+    board.turn = bool(planes[TURN])
+    return board
+
+
+def _mix(values):
+    """splitmix64 finaliser applied element-wise."""
+    values = (values ^ (values >> np.uint64(30))) * _MIX_1
+    values = (values ^ (values >> np.uint64(27))) * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+def hash_rows(rows: np.ndarray) -> np.ndarray:
+    """64-bit hash of every row, computed in one vectorized pass."""
+    hashes = np.zeros(len(rows), dtype=np.uint64)
+    for column in range(ROW_WIDTH):
+        hashes = _mix(hashes ^ rows[:, column] ^ _SALTS[column])
+    return hashes
+
+
+def sense_masks(sense_result: List[Tuple[int, Optional[chess.Piece]]]) -> Tuple[int, np.ndarray]:
+    """Bitmask of the sensed window and the bits each piece plane must have inside it."""
+    window = 0
+    expected = [0] * PLANE_COUNT
+    for square, piece in sense_result:
+        bit = chess.BB_SQUARES[square]
+        window |= bit
+        if piece is not None:
+            expected[plane_index(piece.piece_type, piece.color)] |= bit
+    return window, np.array(expected, dtype=np.uint64)
+
+
+def sense_consistent(rows: np.ndarray, sense_result: List[Tuple[int, Optional[chess.Piece]]]) -> np.ndarray:
+    """Boolean mask of rows whose pieces inside the window match the sense result exactly."""
+    window, expected = sense_masks(sense_result)
+    return ((rows[:, :PLANE_COUNT] & np.uint64(window)) == expected).all(axis=1)
+
+
+class BeliefSet:
+    """Set of board hypotheses stored as fixed-width bitboard rows in one contiguous array.
+
+    weights is either None (every hypothesis equally likely) or one non-negative, not necessarily
+    normalised weight per row; duplicates merged by dedup add their weights.
+    """
+
+    def __init__(self, rows: Optional[np.ndarray] = None, weights: Optional[np.ndarray] = None, dedup: bool = True):
+        if rows is None:
+            rows = np.empty((0, ROW_WIDTH), dtype=np.uint64)
+        self.rows = np.ascontiguousarray(rows, dtype=np.uint64).reshape(-1, ROW_WIDTH)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64).reshape(-1)
+        if dedup:
+            self._dedup()
+
+    def _dedup(self):
+        if len(self.rows) < 2:
+            return
+        _, first, inverse = np.unique(hash_rows(self.rows), return_index=True, return_inverse=True)
+        if len(first) == len(self.rows):
+            return
+        order = np.argsort(first)  # keep insertion order
+        if self.weights is not None:
+            self.weights = np.bincount(inverse.reshape(-1), weights=self.weights, minlength=len(first))[order]
+        self.rows = self.rows[first[order]]
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[Tuple[int, ...]], weights: Optional[Iterable[float]] = None,
+                  dedup: bool = True) -> 'BeliefSet':
+        keys = list(keys)
+        if not keys:
+            return cls(weights=None if weights is None else [])
+        return cls(np.array(keys, dtype=np.uint64), None if weights is None else list(weights), dedup=dedup)
+
+    @classmethod
+    def from_boards(cls, boards: Iterable[chess.Board], dedup: bool = True) -> 'BeliefSet':
+        return cls.from_keys((board_key(board) for board in boards), dedup=dedup)
+
+    @classmethod
+    def from_fens(cls, fens: Iterable[str], dedup: bool = True) -> 'BeliefSet':
+        return cls.from_boards((chess.Board(fen) for fen in fens), dedup=dedup)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return len(self.rows) > 0
+
+    def __iter__(self) -> Iterator[chess.Board]:
+        return self.boards()
+
+    def board(self, index: int) -> chess.Board:
+        return board_from_row(self.rows[index])
+
+    def boards(self) -> Iterator[chess.Board]:
+        for row in self.rows:
+            yield board_from_row(row)
+
+    def fens(self) -> List[str]:
+        return [board.fen() for board in self.boards()]
+
+    def hashes(self) -> np.ndarray:
+        return hash_rows(self.rows)
+
+    def probabilities(self) -> np.ndarray:
+        """Normalised weight of every hypothesis (uniform when unweighted)."""
+        if self.weights is None or not len(self.weights) or self.weights.sum() <= 0:
+            return np.full(len(self.rows), 1.0 / max(1, len(self.rows)))
+        return self.weights / self.weights.sum()
+
+    def normalized(self) -> 'BeliefSet':
+        if self.weights is None:
+            return self
+        return BeliefSet(self.rows, self.probabilities(), dedup=False)
+
+    def select(self, selector) -> 'BeliefSet':
+        """Subset by boolean mask or index array; rows are already unique so no dedup is needed."""
+        weights = None if self.weights is None else self.weights[selector]
+        return BeliefSet(self.rows[selector], weights, dedup=False)
+
+    def with_turn(self, color: chess.Color) -> 'BeliefSet':
+        return self.select(self.rows[:, TURN] == int(color))
+
+    def sample(self, count: int) -> 'BeliefSet':
+        """Random subset without replacement, drawn in proportion to weight when weighted."""
+        if count >= len(self.rows):
+            return self
+        if self.weights is None:
+            chosen = random.sample(range(len(self.rows)), count)
+        else:
+            probabilities = self.probabilities()
+            count = min(count, int(np.count_nonzero(probabilities)))
+            chosen = np.random.choice(len(self.rows), size=count, replace=False, p=probabilities)
+        return self.select(np.sort(np.array(chosen, dtype=np.intp)))
+
+    def top_k(self, count: int) -> 'BeliefSet':
+        """The count heaviest hypotheses (all of them when unweighted or already small enough)."""
+        if self.weights is None or count >= len(self.rows):
+            return self
+        return self.select(np.sort(np.argpartition(-self.weights, count)[:count]))
+
+    def prune_mask(self, max_count: Optional[int] = None, mass: Optional[float] = None) -> np.ndarray:
+        """Boolean mask of the hypotheses prune keeps."""
+        mask = np.ones(len(self.rows), dtype=bool)
+        if self.weights is None or not len(self.rows):
+            return mask
+        keep = len(self.rows) if max_count is None else min(max_count, len(self.rows))
+        if mass is not None and mass < 1:
+            order = np.argsort(-self.weights, kind='stable')
+            covered = np.cumsum(self.probabilities()[order])
+            keep = min(keep, int(np.searchsorted(covered, mass)) + 1)
+        if keep < len(self.rows):
+            mask[:] = False
+            mask[np.argpartition(-self.weights, keep)[:keep]] = True
+        return mask
+
+    def prune(self, max_count: Optional[int] = None, mass: Optional[float] = None) -> 'BeliefSet':
+        """Drop the low-probability tail: keep the fewest heaviest hypotheses covering mass, at most max_count."""
+        keep = self.prune_mask(max_count, mass)
+        return self if keep.all() else self.select(keep)
+
+    def filter_sense(self, sense_result: List[Tuple[int, Optional[chess.Piece]]]) -> Tuple['BeliefSet', int]:
+        """Keep the hypotheses consistent with a sense result; also returns how many were eliminated."""
+        consistent = sense_consistent(self.rows, sense_result)
+        survivors = self.select(consistent)
+        return survivors, len(self.rows) - len(survivors)
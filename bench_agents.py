@@ -0,0 +1,263 @@
+import argparse
+import collections
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Optional
+from unittest import mock
+
+import chess
+import chess.engine
+import chess.polyglot
+import numpy as np
+from reconchess import GameHistory, play_local_game
+from reconchess.bots.random_bot import RandomBot
+from reconchess.utilities import move_actions as available_moves
+
+import RandomSensing as random_sensing_module
+from ImprovedAgent import ImprovedAgent
+from RandomSensing import RandomSensing
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HANDLERS = ('handle_opponent_move_result', 'choose_sense', 'handle_sense_result', 'choose_move', 'handle_move_result')
+AGENTS = {'ImprovedAgent': ImprovedAgent, 'RandomSensing': RandomSensing}
+
+
+class StubEngine:
+    """Stands in for Stockfish: answers instantly (or after a fixed delay) with moves ordered by the position's hash."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.searches = 0
+
+    def configure(self, options):
+        pass
+
+    def ping(self):
+        pass
+
+    def analyse(self, board, limit, multipv=None, info=None, root_moves=None, game=None, **kwargs):
+        self.searches += 1
+        if self.delay:
+            time.sleep(self.delay)
+        moves = [move for move in board.legal_moves if root_moves is None or move in root_moves]
+        rng = random.Random(chess.polyglot.zobrist_hash(board))
+        rng.shuffle(moves)
+        lines = [{'multipv': rank + 1, 'pv': [move], 'depth': limit.depth or 1,
+                  'score': chess.engine.PovScore(chess.engine.Cp(rng.randint(-100, 100)), board.turn)}
+                 for rank, move in enumerate(moves[:multipv or 1])]
+        if multipv is None:
+            return lines[0] if lines else {}
+        return lines
+
+    def play(self, board, limit, **kwargs):
+        analysis = self.analyse(board, limit)
+        return chess.engine.PlayResult(analysis['pv'][0] if analysis else None, None)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def stub_engines(delay: float = 0.0):
+    """Every engine the agents open while active is a StubEngine; no Stockfish binary is needed."""
+    with mock.patch.object(chess.engine.SimpleEngine, 'popen_uci', lambda *args, **kwargs: StubEngine(delay)), \
+            mock.patch.object(random_sensing_module, 'stockfish_path', lambda *args: sys.executable):
+        yield
+
+
+def record_games(count: int, seed: int = 0) -> list:
+    """Synthetic games between two RandomBots, reproducible from seed."""
+    histories = []
+    for index in range(count):
+        random.seed(seed + index)
+        _, _, history = play_local_game(RandomBot(), RandomBot())
+        histories.append(history)
+    return histories
+
+
+def sense_window(board: chess.Board, square: Optional[int]) -> list:
+    """What sensing square on board reveals, exactly as reconchess' LocalGame.sense reports it."""
+    if square is None:
+        return []
+    rank, file = chess.square_rank(square), chess.square_file(square)
+    return [(chess.square(file + delta_file, rank + delta_rank),
+             board.piece_at(chess.square(file + delta_file, rank + delta_rank)))
+            for delta_rank in (1, 0, -1) for delta_file in (-1, 0, 1)
+            if 0 <= rank + delta_rank <= 7 and 0 <= file + delta_file <= 7]
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {'calls': 0}
+    milliseconds = np.array(samples) * 1000
+    return {
+        'calls': len(samples),
+        'mean_ms': float(milliseconds.mean()),
+        'p50_ms': float(np.percentile(milliseconds, 50)),
+        'p90_ms': float(np.percentile(milliseconds, 90)),
+        'p99_ms': float(np.percentile(milliseconds, 99)),
+        'max_ms': float(milliseconds.max()),
+        'total_s': float(milliseconds.sum() / 1000),
+    }
+
+
+def replay(agent, history: GameHistory, color: chess.Color, seconds_per_player: float = 900) -> dict:
+    """Drive agent through color's side of a recorded game and time every callback.
+
+    The agent senses wherever it likes (the result comes from the recorded true board), but the
+    recorded moves are played whatever it chooses, so the game never leaves the recording.
+    """
+    timings = collections.defaultdict(list)
+    turns = []
+    clock = seconds_per_player
+
+    def timed(handler, *args):
+        nonlocal clock
+        started = time.perf_counter()
+        result = getattr(agent, handler)(*args)
+        elapsed = time.perf_counter() - started
+        timings[handler].append(elapsed)
+        clock -= elapsed
+        return result
+
+    def belief_size():
+        return len(agent.possible_boards)
+
+    agent.handle_game_start(color, chess.Board(), 'replay')
+    try:
+        for turn in history.turns(color):
+            if not history.has_move(turn):
+                break
+            board = history.truth_board_before_move(turn)
+            capture_square = None
+            if not history.is_first_turn(turn):
+                capture_square = history.capture_square(turn.previous)
+            sizes = {'turn': turn.turn_number}
+
+            timed('handle_opponent_move_result', capture_square is not None, capture_square)
+            sizes['after_opponent_move'] = belief_size()
+            move_actions = available_moves(board)
+            square = timed('choose_sense', list(chess.SQUARES), move_actions, clock)
+            timed('handle_sense_result', sense_window(board, square))
+            sizes['after_sense'] = belief_size()
+            timed('choose_move', move_actions, clock)
+            captured = history.capture_square(turn)
+            timed('handle_move_result', history.requested_move(turn), history.taken_move(turn),
+                  captured is not None, captured)
+            sizes['after_move'] = belief_size()
+            turns.append(sizes)
+    finally:
+        agent.handle_game_end(history.get_winner_color(), history.get_win_reason(), history)
+
+    return {'timings': timings, 'turns': turns}
+
+
+def run(agent_names: list, histories: list, engine_delay: float = 0.0, trace_memory: bool = False) -> dict:
+    """Replay every history from both sides through each agent; latency percentiles, belief sizes and peak memory."""
+    report = {'agents': {}}
+    for name in agent_names:
+        timings = collections.defaultdict(list)
+        games = []
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for game_index, history in enumerate(histories):
+            for color in (chess.WHITE, chess.BLACK):
+                with stub_engines(engine_delay), contextlib.redirect_stdout(io.StringIO()):
+                    result = replay(AGENTS[name](), history, color)
+                for handler, samples in result['timings'].items():
+                    timings[handler].extend(samples)
+                sizes = [turn['after_sense'] for turn in result['turns']]
+                games.append({'game': game_index, 'color': chess.COLOR_NAMES[color], 'turns': result['turns'],
+                              'max_beliefs': max(sizes, default=0)})
+        entry = {
+            'wall_s': time.perf_counter() - started,
+            'handlers': {handler: percentiles(timings[handler]) for handler in HANDLERS},
+            'games': games,
+        }
+        if trace_memory:
+            entry['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        report['agents'][name] = entry
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux; it covers the whole process, so compare runs of the same agent set
+        report['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return report
+
+
+def git_commit() -> Optional[str]:
+    try:
+        # The checkout the agents were imported from, not wherever the benchmark was started
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict):
+    """Print the p50 and p90 of every handler next to a baseline report's."""
+    for name, entry in report['agents'].items():
+        old = baseline.get('agents', {}).get(name)
+        if old is None:
+            continue
+        print(f"{name} vs {baseline.get('commit')}:")
+        for handler in HANDLERS:
+            now, before = entry['handlers'][handler], old['handlers'].get(handler, {})
+            if not now.get('calls') or not before.get('calls'):
+                continue
+            print(f"  {handler:28s} p50 {before['p50_ms']:8.2f} -> {now['p50_ms']:8.2f} ms "
+                  f"({now['p50_ms'] / max(before['p50_ms'], 1e-9):.2f}x)  "
+                  f"p90 {before['p90_ms']:8.2f} -> {now['p90_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay games through the agents' callbacks and time them.")
+    parser.add_argument('histories', nargs='*', help="GameHistory JSON files (default: synthetic RandomBot games)")
+    parser.add_argument('--games', type=int, default=3, help="synthetic games to record when no files are given")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--agents', nargs='+', default=list(AGENTS), choices=list(AGENTS))
+    parser.add_argument('--engine-ms', type=float, default=0.0, help="simulated time per stub engine search")
+    parser.add_argument('--trace-memory', action='store_true', help="also report tracemalloc peaks (slower)")
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--baseline', help="JSON report of an earlier run to compare against")
+    args = parser.parse_args()
+
+    if args.histories:
+        histories = [GameHistory.from_file(path) for path in args.histories]
+    else:
+        histories = record_games(args.games, args.seed)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    report = run(args.agents, histories, args.engine_ms / 1000, args.trace_memory)
+    report.update({'commit': git_commit(), 'python': sys.version.split()[0], 'games': len(histories),
+                   'seed': args.seed, 'engine_ms': args.engine_ms})
+
+    for name, entry in report['agents'].items():
+        print(f"{name}: {entry['wall_s']:.2f}s, largest belief {max(game['max_beliefs'] for game in entry['games'])}")
+        for handler in HANDLERS:
+            stats = entry['handlers'][handler]
+            if stats['calls']:
+                print(f"  {handler:28s} {stats['calls']:5d} calls  p50 {stats['p50_ms']:8.2f}  "
+                      f"p90 {stats['p90_ms']:8.2f}  p99 {stats['p99_ms']:8.2f}  max {stats['max_ms']:8.2f} ms")
+    if 'peak_rss_mb' in report:
+        print(f"peak RSS {report['peak_rss_mb']:.1f} MB")
+    if args.baseline:
+        with open(args.baseline) as handle:
+            compare(report, json.load(handle))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=1)
@@ -0,0 +1,63 @@
+import random
+import time
+import chess
+
+from belief import BeliefSet, board_key
+from expansion import child_key, child_keys
+
+
+def busy_positions(count, min_moves=40, seed=0):
+    """Positions from random games that have at least min_moves pseudo-legal moves."""
+    rng = random.Random(seed)
+    positions = []
+    board = chess.Board()
+    while len(positions) < count:
+        moves = list(board.legal_moves)
+        if not moves or board.ply() > 80:
+            board = chess.Board()
+            continue
+        board.push(rng.choice(moves))
+        if board.pseudo_legal_moves.count() >= min_moves:
+            positions.append(board.copy(stack=False))
+    # Rebuild from belief rows so every variant starts from the boards the agents actually see
+    return list(BeliefSet.from_boards(positions))
+
+
+def copy_and_push(boards):
+    children = 0
+    for board in boards:
+        for move in list(board.pseudo_legal_moves):
+            new_board = board.copy()
+            new_board.push(move)
+            board_key(new_board)
+            children += 1
+    return children
+
+
+def push_and_pop(boards):
+    children = 0
+    for board in boards:
+        for move in board.generate_pseudo_legal_moves():
+            child_key(board, move)
+            children += 1
+    return children
+
+
+def bitboard_apply(boards):
+    children = 0
+    for board in boards:
+        for _ in child_keys(board, list(board.generate_pseudo_legal_moves())):
+            children += 1
+    return children
+
+
+if __name__ == "__main__":
+    boards = busy_positions(500)
+    baseline = None
+    for variant in (copy_and_push, push_and_pop, bitboard_apply):
+        started = time.perf_counter()
+        children = variant(boards)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"{variant.__name__:15s} {children} children in {elapsed:.3f}s "
+              f"({children / elapsed:,.0f}/s, {baseline / elapsed:.1f}x)")
@@ -0,0 +1,44 @@
+import json
+import os
+import socket
+import tempfile
+from typing import Optional
+
+# Kept free of chess/numpy imports: command-line tools import it on every invocation
+
+
+def socket_path() -> str:
+    """Where the engine daemon listens, overridable with RBC_ENGINE_SOCKET."""
+    return os.environ.get('RBC_ENGINE_SOCKET') or os.path.join(tempfile.gettempdir(), 'rbc-engine.sock')
+
+
+def request(payload: dict, path: Optional[str] = None, timeout: float = 120.0) -> Optional[dict]:
+    """Send one request to the engine daemon; None when no daemon is listening (or it went away)."""
+    path = path or socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(timeout)
+            connection.connect(path)
+            connection.sendall((json.dumps(payload) + '\n').encode())
+            with connection.makefile('rb') as reply:
+                line = reply.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    reply = json.loads(line)
+    return None if 'error' in reply else reply
+
+
+def best_move(fen: str, time_limit: float, path: Optional[str] = None) -> Optional[str]:
+    """UCI best move for fen from the daemon, or None when it is not available."""
+    reply = request({'op': 'best_move', 'fen': fen, 'time': time_limit}, path)
+    return reply['move'] if reply else None
+
+
+def majority_move(fens: list, time_limit: float, path: Optional[str] = None) -> Optional[str]:
+    """Most common best move over fens from the daemon, or None when it is not available."""
+    reply = request({'op': 'majority_move', 'fens': fens, 'time': time_limit}, path)
+    return reply['move'] if reply else None
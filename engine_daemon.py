@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import chess
+import chess.engine
+from typing import List, Optional
+
+import engine_client
+from engines import EnginePool
+from eval_cache import EvalCache
+from sub1p3 import MOVE_TIME as BEST_MOVE_TIME, capture_king_if_possible
+from sub2p3 import MOVE_TIME as MAJORITY_MOVE_TIME, king_capture_move, most_common_move
+
+
+class EngineDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server answering sub1p3/sub2p3 requests from a pool of engines that stay loaded.
+
+    Requests and replies are one JSON object per line; a connection may send several requests.
+    Operations: {"op": "best_move", "fen", "time"}, {"op": "majority_move", "fens", "time"} and
+    {"op": "ping"}. The move operations search for the caller's time, but need not return the move the
+    scripts' own engine would: the engines keep their hash between requests, a majority_move searches
+    each distinct position once, and the move is the first move of the principal variation.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, pool: EnginePool):
+        self.pool = pool
+        self.requests = 0
+        super().__init__(path, _Handler)
+
+    def best_move(self, fen: str, time_limit: float) -> Optional[str]:
+        board = chess.Board(fen)
+        move = capture_king_if_possible(board)
+        if move is None:
+            result = self.pool.analyse(board, chess.engine.Limit(time=time_limit))
+            if not result or not result.get('pv'):
+                raise RuntimeError('engine failed')
+            move = result['pv'][0]
+        return move.uci()
+
+    def majority_move(self, fens: List[str], time_limit: float) -> str:
+        boards = [chess.Board(fen) for fen in fens]
+        moves = [king_capture_move(board) for board in boards]
+        searched = [index for index, move in enumerate(moves) if move is None]
+        # One search per distinct position, spread over every engine
+        results = self.pool.analyse_many([boards[index] for index in searched], chess.engine.Limit(time=time_limit))
+        for index, result in zip(searched, results):
+            if result and result.get('pv'):
+                moves[index] = result['pv'][0].uci()
+        return most_common_move([move for move in moves if move is not None])
+
+    def dispatch(self, request: dict) -> dict:
+        self.requests += 1
+        op = request.get('op')
+        if op == 'best_move':
+            return {'move': self.best_move(request['fen'], request.get('time', BEST_MOVE_TIME))}
+        if op == 'majority_move':
+            return {'move': self.majority_move(request['fens'], request.get('time', MAJORITY_MOVE_TIME))}
+        if op == 'ping':
+            return {'ok': True, 'engines': self.pool.size, 'requests': self.requests}
+        raise ValueError(f'unknown op {op!r}')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.dispatch(json.loads(line))
+            except Exception as e:
+                reply = {'error': str(e)}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+            self.wfile.flush()
+
+
+def clear_stale_socket(path: str):
+    """Remove a socket file left behind by a daemon that is gone; refuse if one still answers."""
+    if not os.path.exists(path):
+        return
+    if engine_client.request({'op': 'ping'}, path, timeout=2.0) is not None:
+        raise RuntimeError(f'an engine daemon is already listening on {path}')
+    os.unlink(path)
+
+
+def serve(path: Optional[str] = None, engines: Optional[int] = None, threads: int = 1, hash_mb: int = 128):
+    path = path or engine_client.socket_path()
+    clear_stale_socket(path)
+    pool = EnginePool(engines, threads=threads, hash_mb=hash_mb, cache=EvalCache())
+    server = EngineDaemon(path, pool)
+    # serve_forever runs on the main thread, so shutdown() has to come from another one
+    signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+    print(f"[DAEMON] {pool.size} engines listening on {path}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        pool.quit()
+        print(f"[DAEMON] Stopped after {server.requests} requests", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep engines loaded for sub1p3.py and sub2p3.py.")
+    parser.add_argument('--socket', help="socket path (default: RBC_ENGINE_SOCKET or <tmp>/rbc-engine.sock)")
+    parser.add_argument('--engines', type=int, help="engines to keep loaded (default: one per pair of cores)")
+    parser.add_argument('--threads', type=int, default=1, help="threads per engine")
+    parser.add_argument('--hash', type=int, default=128, help="hash MB per engine")
+    args = parser.parse_args()
+    serve(args.socket, args.engines, args.threads, args.hash)
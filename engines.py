@@ -0,0 +1,391 @@
+import collections
+import os
+import platform
+import queue
+import signal
+import threading
+import time
+import chess
+import chess.engine
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from eval_cache import EvalCache
+from metrics import DISABLED, Metrics
+
+
+def stockfish_path(linux_path='/opt/stockfish/stockfish'):
+    if platform.system() == 'Windows':
+        return './stockfish.exe'
+    elif platform.system() == 'Linux':
+        return linux_path
+    elif platform.system() == 'Darwin':
+        return './stockfish-macos'
+    else:
+        raise EnvironmentError("Unsupported OS for Stockfish")
+
+
+def openEngine(threads=2, hash_mb=128):
+    engine = chess.engine.SimpleEngine.popen_uci(stockfish_path(), setpgrp=True, timeout=None)
+    engine.configure({"Threads": threads, "Hash": hash_mb})
+
+    return engine
+
+
+def searchmoves(board: chess.Board, move_actions: Optional[Iterable[chess.Move]]) -> Optional[List[chess.Move]]:
+    """Legal moves of board that are also in move_actions, or None when that would not restrict the search."""
+    if move_actions is None:
+        return None
+    allowed = set(move_actions)
+    legal = list(board.legal_moves)
+    root_moves = [move for move in legal if move in allowed]
+    if not root_moves or len(root_moves) == len(legal):
+        return None
+    return root_moves
+
+
+def hash_order(boards: Sequence[chess.Board]) -> List[int]:
+    """Indices of boards with similar positions next to each other, so consecutive searches reuse the engine hash.
+
+    Boards are grouped by side to move, then by the side to move's own pieces (usually identical
+    across hypotheses), then by the other side's king and pawn structure.
+    """
+    def similarity(index):
+        board = boards[index]
+        own = board.occupied_co[board.turn]
+        other = board.occupied_co[not board.turn]
+        return (board.turn, own, board.pawns & own, board.kings & other, board.pawns & other, other)
+    return sorted(range(len(boards)), key=similarity)
+
+
+QUIT_TIMEOUT = 2.0  # seconds an engine gets to exit on quit before it is killed
+
+
+def _kill(engine):
+    """Kill the engine's process; used for engines that stopped answering."""
+    try:
+        os.kill(engine.transport.get_pid(), getattr(signal, 'SIGKILL', signal.SIGTERM))
+    except Exception:
+        pass
+
+
+def _discard(engine):
+    """Shut an engine down without waiting for it; a hung process must not block the caller."""
+    def shut_down():
+        try:
+            engine.timeout = QUIT_TIMEOUT  # quit() waits at most this long for the engine to exit
+            engine.quit()
+        except Exception:
+            _kill(engine)
+            try:
+                engine.close()
+            except Exception:
+                pass
+    threading.Thread(target=shut_down, daemon=True).start()
+
+
+class EngineSupervisor:
+    """Starts engines, keeps a warm spare running, and swaps it in for engines that die or stop answering.
+
+    Replacing an engine only waits for the spare (normally already up) while the next spare starts in
+    the background. Cold-start latency of every engine start, handover waits, restarts and failed
+    health checks are recorded.
+    """
+
+    def __init__(self, factory: Optional[Callable[[], chess.engine.SimpleEngine]] = None, warm_spare: bool = True,
+                 ping_timeout: float = 2.0):
+        self.factory = factory or openEngine
+        self.warm_spare = warm_spare
+        self.ping_timeout = ping_timeout
+        self.restarts = 0
+        self.failed_pings = 0
+        self.cold_starts = []
+        self.handover_waits = []
+        self._lock = threading.Lock()
+        self._spawner = ThreadPoolExecutor(max_workers=1)
+        self._spare = None
+        if warm_spare:
+            self._spare = self._spawner.submit(self._spawn)
+
+    def _spawn(self):
+        started = time.perf_counter()
+        engine = self.factory()
+        self.cold_starts.append(time.perf_counter() - started)
+        return engine
+
+    def start(self) -> chess.engine.SimpleEngine:
+        """A fresh engine, started on the calling thread."""
+        return self._spawn()
+
+    def replace(self, engine) -> chess.engine.SimpleEngine:
+        """Retire engine and hand back the warm spare (or a cold-started engine), starting the next spare."""
+        _discard(engine)
+        started = time.perf_counter()
+        with self._lock:
+            self.restarts += 1
+            spare, self._spare = self._spare, None
+            if self.warm_spare:
+                self._spare = self._spawner.submit(self._spawn)
+        try:
+            replacement = spare.result() if spare is not None else self._spawn()
+        except Exception:
+            replacement = self._spawn()  # the spare failed to start; try once more in the foreground
+        self.handover_waits.append(time.perf_counter() - started)
+        return replacement
+
+    def is_healthy(self, engine) -> bool:
+        """Whether engine answers isready within ping_timeout."""
+        answered = []
+
+        def ping():
+            try:
+                engine.ping()
+                answered.append(True)
+            except Exception:
+                pass
+        # A daemon thread, so a ping stuck on a hung engine cannot keep the process alive
+        pinger = threading.Thread(target=ping, daemon=True)
+        pinger.start()
+        pinger.join(self.ping_timeout)
+        return bool(answered)
+
+    def ensure_healthy(self, engine) -> chess.engine.SimpleEngine:
+        """engine itself if it answers a ping, otherwise its replacement (the hung engine is killed)."""
+        if self.is_healthy(engine):
+            return engine
+        self.failed_pings += 1
+        _kill(engine)
+        return self.replace(engine)
+
+    def stats(self) -> dict:
+        def milliseconds(samples):
+            return {'mean_ms': 1000 * sum(samples) / len(samples), 'max_ms': 1000 * max(samples)} if samples else {}
+        return {
+            'restarts': self.restarts,
+            'failed_pings': self.failed_pings,
+            'engines_started': len(self.cold_starts),
+            'cold_start': milliseconds(self.cold_starts),
+            'handover_wait': milliseconds(self.handover_waits),
+        }
+
+    def shutdown(self):
+        self._spawner.shutdown(wait=True)
+        if self._spare is not None:
+            try:
+                self._spare.result().quit()
+            except Exception:
+                pass
+            self._spare = None
+
+
+def default_pool_size():
+    """One two-threaded engine per pair of cores, overridable with RBC_ENGINE_POOL."""
+    configured = os.environ.get('RBC_ENGINE_POOL')
+    if configured:
+        return max(1, int(configured))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class EngineSession:
+    """One long-lived engine that positions are pipelined through, keeping its hash between them.
+
+    Every search passes the same game token, so python-chess only sends ucinewgame (which clears the
+    hash) on the session's first search or after new_game(). Per-position latencies are recorded.
+    With a supervisor, a dead engine is swapped for its warm spare and the position is retried once.
+    """
+
+    def __init__(self, engine=None, threads=2, hash_mb=128, latency_window=2000,
+                 supervisor: Optional[EngineSupervisor] = None):
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.supervisor = supervisor
+        if engine is None:
+            engine = supervisor.start() if supervisor is not None else openEngine(threads, hash_mb)
+        self.engine = engine
+        self.game = object()
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.evaluated = 0
+        self.failed = 0
+        self.restarts = 0
+        self.retries = 0
+
+    def new_game(self):
+        """Let the engine clear its hash before the next search."""
+        self.game = object()
+
+    def restart(self):
+        if self.supervisor is not None:
+            self.engine = self.supervisor.replace(self.engine)
+        else:
+            _discard(self.engine)
+            self.engine = openEngine(self.threads, self.hash_mb)
+        self.game = object()
+        self.restarts += 1
+
+    def check_health(self):
+        """Ping the engine with isready and replace it if it does not answer (supervised sessions only)."""
+        if self.supervisor is None:
+            return
+        engine = self.supervisor.ensure_healthy(self.engine)
+        if engine is not self.engine:
+            self.engine = engine
+            self.game = object()
+            self.restarts += 1
+
+    def analyse(self, board: chess.Board, limit: chess.engine.Limit, root_moves: Optional[List[chess.Move]] = None,
+                retry: bool = True, **kwargs):
+        """Analyse one board; returns None if the engine errored or died (it is restarted, and the board retried once)."""
+        started = time.perf_counter()
+        try:
+            result = self.engine.analyse(board, limit, game=self.game, root_moves=root_moves, **kwargs)
+        except chess.engine.EngineTerminatedError:
+            self.failed += 1
+            self.restart()
+            if retry and self.supervisor is not None:
+                self.retries += 1
+                return self.analyse(board, limit, root_moves, retry=False, **kwargs)
+            return None
+        except Exception:
+            self.failed += 1
+            return None
+        self.latencies.append(time.perf_counter() - started)
+        self.evaluated += 1
+        return result
+
+    def analyse_batch(self, boards: Sequence[chess.Board], limit: chess.engine.Limit,
+                      root_moves: Optional[Sequence[Optional[List[chess.Move]]]] = None, **kwargs) -> list:
+        """Analyse boards one after another in the given order."""
+        return [self.analyse(board, limit, root_moves[index] if root_moves is not None else None, **kwargs)
+                for index, board in enumerate(boards)]
+
+    def quit(self):
+        try:
+            self.engine.quit()
+        except chess.engine.EngineTerminatedError:
+            pass
+
+
+def latency_report(sessions: Iterable[EngineSession]) -> dict:
+    """Per-position latency percentiles and throughput over the sessions' recent searches."""
+    sessions = list(sessions)
+    latencies = sorted(latency for session in sessions for latency in session.latencies)
+    report = {
+        'evaluated': sum(session.evaluated for session in sessions),
+        'failed': sum(session.failed for session in sessions),
+        'restarts': sum(session.restarts for session in sessions),
+        'retries': sum(session.retries for session in sessions),
+    }
+    if latencies:
+        busy = sum(latencies)
+        report.update({
+            'mean_ms': 1000 * busy / len(latencies),
+            'p50_ms': 1000 * latencies[len(latencies) // 2],
+            'p95_ms': 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'max_ms': 1000 * latencies[-1],
+            'evals_per_engine_second': len(latencies) / busy if busy > 0 else None,
+        })
+    return report
+
+
+class EnginePool:
+    """Fixed set of engine sessions that batches of boards are fanned out to concurrently."""
+
+    def __init__(self, size: Optional[int] = None, threads=2, hash_mb=128, cache: Optional[EvalCache] = None,
+                 warm_spare: bool = True, metrics: Optional[Metrics] = None):
+        self.size = size or default_pool_size()
+        self.cache = cache
+        self.metrics = metrics or DISABLED
+        self.threads = threads
+        self.hash_mb = hash_mb
+        self.supervisor = EngineSupervisor(lambda: openEngine(threads, hash_mb), warm_spare)
+        self.sessions = [EngineSession(threads=threads, hash_mb=hash_mb, supervisor=self.supervisor)
+                         for _ in range(self.size)]
+        self._idle = queue.Queue()
+        for session in self.sessions:
+            self._idle.put(session)
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+
+    def analyse(self, board: chess.Board, limit: chess.engine.Limit, root_moves: Optional[List[chess.Move]] = None,
+                **kwargs):
+        """Analyse one board on whichever engine is free; returns None if the engine died or errored."""
+        return self._run([board], limit, [root_moves], kwargs)[0]
+
+    def _run(self, boards, limit, root_moves, kwargs) -> list:
+        session = self._idle.get()
+        try:
+            return session.analyse_batch(boards, limit, root_moves, **kwargs)
+        finally:
+            self._idle.put(session)
+
+    def analyse_many(self, boards: List[chess.Board], limit: chess.engine.Limit,
+                     move_actions: Optional[List[chess.Move]] = None, **kwargs) -> list:
+        """Analyse boards across the pool; results come back in input order.
+
+        Searches are restricted to move_actions (via searchmoves) when given. Uncached boards are
+        searched once per distinct position, put in hash_order and split into one contiguous run per
+        engine, so each engine sees similar positions back to back. The cache is only touched from the
+        calling thread, before submission and after collection.
+        """
+        started = time.perf_counter()
+        results = [None] * len(boards)
+        pending = []
+        repeats = []  # (index, index of the identical pending board)
+        searched = {}
+        for index, board in enumerate(boards):
+            root_moves = searchmoves(board, move_actions)
+            key = None
+            if self.cache is not None:
+                key = EvalCache.key(board, limit, kwargs.get('multipv'), kwargs.get('info'), root_moves)
+                if key in searched:
+                    repeats.append((index, searched[key]))
+                    continue
+                results[index] = self.cache.get(key)
+                if results[index] is not None:
+                    continue
+                searched[key] = index
+            pending.append((index, key, root_moves))
+
+        ordered = [pending[position] for position in hash_order([boards[index] for index, _, _ in pending])]
+        run_length = -(-len(ordered) // self.size) if ordered else 0
+        runs = []
+        for start in range(0, len(ordered), run_length or 1):
+            run = ordered[start:start + run_length]
+            future = self._executor.submit(self._run, [boards[index] for index, _, _ in run], limit,
+                                           [root_moves for _, _, root_moves in run], kwargs)
+            runs.append((run, future))
+
+        for run, future in runs:
+            for (index, key, _), result in zip(run, future.result()):
+                results[index] = result
+                if key is not None:
+                    self.cache.put(key, result)
+        for index, original in repeats:
+            results[index] = results[original]
+
+        if self.metrics.enabled:
+            self.metrics.add_time('engine.analyse_many', time.perf_counter() - started)
+            self.metrics.count('engine.boards', len(boards))
+            self.metrics.count('engine.searches', len(pending))
+            self.metrics.count('engine.cache_hits', len(boards) - len(pending) - len(repeats))
+            self.metrics.count('engine.failed', sum(results[index] is None for index, _, _ in pending))
+        return results
+
+    def health_check(self):
+        """Ping every idle engine and replace the ones that do not answer; meant for between turns."""
+        for _ in range(self.size):
+            session = self._idle.get()
+            try:
+                session.check_health()
+            finally:
+                self._idle.put(session)
+
+    def latency_report(self) -> dict:
+        report = latency_report(self.sessions)
+        report['supervisor'] = self.supervisor.stats()
+        return report
+
+    def quit(self):
+        self._executor.shutdown(wait=True)
+        for session in self.sessions:
+            session.quit()
+        self.supervisor.shutdown()
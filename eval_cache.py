@@ -0,0 +1,81 @@
+import collections
+import chess
+import chess.engine
+import chess.polyglot
+from typing import Optional
+
+
+def limit_key(limit: chess.engine.Limit):
+    # A depth-limited search is keyed without its time: the cache compares the depth reached instead
+    return (None if limit.depth is not None else limit.time, limit.nodes, limit.mate)
+
+
+def reached_depth(result, depth: Optional[int]) -> Optional[int]:
+    """Depth a search asked for depth finished, lower when its time ran out first (every multipv line counts)."""
+    if depth is None:
+        return None
+    infos = result if isinstance(result, list) else [result]
+    return min([depth] + [info['depth'] for info in infos if 'depth' in info])
+
+
+class EvalCache:
+    """Size-bounded LRU cache of engine analyses keyed by Zobrist hash, search limit, options and searchmoves.
+
+    Depth-limited searches share one entry per position whatever their time limit, so the changing
+    per-turn time does not cause misses. A lookup hits when the entry was searched at least as deep as
+    it asks for, and an entry is only replaced by a search at least as deep.
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # position key -> (depth reached, result)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(board: chess.Board, limit: chess.engine.Limit, multipv=None, info=None, root_moves=None):
+        # The Zobrist hash already covers side to move, castling rights and en passant
+        root_moves = None if root_moves is None else frozenset(root_moves)
+        return (chess.polyglot.zobrist_hash(board), limit_key(limit), multipv, info, root_moves), limit.depth
+
+    def get(self, key, count_miss: bool = True):
+        """Cached result or None; count_miss=False for a probe whose misses fall through to a counted lookup."""
+        position, depth = key
+        entry = self._entries.get(position)
+        if entry is None or (entry[0] is None) != (depth is None) or (depth is not None and entry[0] < depth):
+            self.misses += count_miss
+            return None
+        self._entries.move_to_end(position)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, result):
+        if result is None:
+            return
+        position, depth = key
+        reached = reached_depth(result, depth)
+        current = self._entries.get(position)
+        if current is None or current[0] is None or reached is None or reached >= current[0]:
+            self._entries[position] = (reached, result)
+        self._entries.move_to_end(position)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate(),
+        }
@@ -0,0 +1,424 @@
+import heapq
+import math
+import random
+import threading
+import chess
+import numpy as np
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from belief import BeliefSet, board_key, plane_index, sense_masks, CASTLING, NO_EP, PLANE_COUNT, ROW_WIDTH
+
+CHUNK_KEYS = 4096  # keys buffered as Python tuples before being packed into an array chunk
+
+Key = Tuple[int, ...]
+
+
+class ExpansionStats:
+    """What happened to the children produced by one expansion."""
+
+    def __init__(self):
+        self.generated = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.truncated = False
+        self.dropped = 0         # children offered to a reservoir but not kept; an evicted child seen again counts again
+        self.dropped_mass = 0.0  # their share of the offered weight (of the count, when unweighted)
+
+    def as_dict(self) -> dict:
+        return {
+            'generated': self.generated,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'truncated': self.truncated,
+            'dropped': self.dropped,
+            'dropped_mass': self.dropped_mass,
+        }
+
+    def copy_from(self, other: 'ExpansionStats'):
+        self.generated, self.duplicates, self.rejected = other.generated, other.duplicates, other.rejected
+        self.truncated, self.dropped, self.dropped_mass = other.truncated, other.dropped, other.dropped_mass
+
+
+class Reservoir:
+    """Fixed-size random sample of a stream of children, held in a preallocated row array.
+
+    Unweighted children are kept by Algorithm R, so every child is equally likely to survive.
+    Weighted children are kept by A-Res (the size largest log(u) / weight keys), so heavier
+    children are more likely to survive; kept children keep their weight. Only children currently
+    in the sample are deduplicated (by tuple hash), so memory stays fixed however long the stream.
+    """
+
+    def __init__(self, size: int, weighted: bool = False):
+        self.size = size
+        self.weighted = weighted
+        self.rows = np.empty((size, ROW_WIDTH), dtype=np.uint64)
+        self.weights = np.zeros(size)
+        self.slots = {}          # hash(key) -> slot
+        self._slot_hashes = []
+        self._priorities = []    # weighted: min-heap of (priority, slot)
+        self.offered = 0
+        self.offered_mass = 0.0
+
+    def __len__(self):
+        return len(self._slot_hashes)
+
+    def merge(self, key: Key, weight: Optional[float]) -> bool:
+        """Add a duplicate's weight to its sampled copy; False when key is not in the sample."""
+        slot = self.slots.get(hash(key))
+        if slot is None:
+            return False
+        if self.weighted:
+            self.weights[slot] += weight
+            self.offered_mass += weight
+        return True
+
+    def offer(self, key: Key, weight: Optional[float]):
+        self.offered += 1
+        self.offered_mass += weight if self.weighted else 1.0
+        if self.weighted:
+            priority = math.log(random.random() or 1e-300) / weight if weight > 0 else -math.inf
+            if len(self) < self.size:
+                slot = self._place(len(self), key, weight)
+                heapq.heappush(self._priorities, (priority, slot))
+            elif priority > self._priorities[0][0]:
+                slot = heapq.heappop(self._priorities)[1]
+                self._place(slot, key, weight)
+                heapq.heappush(self._priorities, (priority, slot))
+        elif len(self) < self.size:
+            self._place(len(self), key, 1.0)
+        else:
+            slot = random.randrange(self.offered)
+            if slot < self.size:
+                self._place(slot, key, 1.0)
+
+    def _place(self, slot: int, key: Key, weight: float) -> int:
+        if slot < len(self._slot_hashes):
+            del self.slots[self._slot_hashes[slot]]
+            self._slot_hashes[slot] = hash(key)
+        else:
+            self._slot_hashes.append(hash(key))
+        self.slots[self._slot_hashes[slot]] = slot
+        self.rows[slot] = key
+        self.weights[slot] = weight
+        return slot
+
+    def belief_set(self, stats: ExpansionStats) -> BeliefSet:
+        kept = len(self)
+        kept_mass = float(self.weights[:kept].sum())
+        stats.dropped += self.offered - kept
+        if self.offered_mass > 0:
+            stats.dropped_mass = max(0.0, self.offered_mass - kept_mass) / self.offered_mass
+        return BeliefSet(self.rows[:kept].copy(), self.weights[:kept].copy() if self.weighted else None, dedup=False)
+
+
+def castling_moves(board: chess.Board, color: chess.Color) -> Iterator[chess.Move]:
+    """Legal castling moves for color, by the king's two-square step."""
+    king_square = board.king(color)
+    if king_square is None:
+        return
+    rank = chess.square_rank(king_square)
+    file = chess.square_file(king_square)
+    if board.has_kingside_castling_rights(color) and file + 2 < 8:
+        move = chess.Move(king_square, chess.square(file + 2, rank))
+        if move in board.legal_moves:
+            yield move
+    if board.has_queenside_castling_rights(color) and file - 2 >= 0:
+        move = chess.Move(king_square, chess.square(file - 2, rank))
+        if move in board.legal_moves:
+            yield move
+
+
+def child_key(board: chess.Board, move: chess.Move) -> Key:
+    """Key after move, made and unmade on the board itself instead of a copy."""
+    board.push(move)
+    try:
+        return board_key(board)
+    finally:
+        board.pop()
+
+
+def child_keys(board: chess.Board, moves: Iterable[chess.Move]) -> Iterator[Key]:
+    """Key after each move, applied directly to the parent's bitboards without touching the board.
+
+    Only a double pawn push next to an enemy pawn goes through push/pop, because whether the en
+    passant square is kept depends on the capture being legal.
+    """
+    parent = board_key(board)
+    planes = parent[:PLANE_COUNT]
+    castling = parent[CASTLING]
+    color = board.turn
+    turn = int(not color)
+    own = plane_index(chess.PAWN, color) - 1
+    opponent = plane_index(chess.PAWN, not color) - 1
+    opponent_occupied = board.occupied_co[not color]
+    opponent_pawns = board.pawns & opponent_occupied
+    back_rank = chess.BB_RANK_1 if color == chess.WHITE else chess.BB_RANK_8
+    opponent_back_rank = chess.BB_RANK_8 if color == chess.WHITE else chess.BB_RANK_1
+
+    for move in moves:
+        if not move:
+            yield planes + (castling, NO_EP, turn)
+            continue
+
+        from_square, to_square = move.from_square, move.to_square
+        from_bb, to_bb = chess.BB_SQUARES[from_square], chess.BB_SQUARES[to_square]
+        piece_type = board.piece_type_at(from_square)
+        child = list(planes)
+        child[own + piece_type] ^= from_bb
+        child[own + (move.promotion or piece_type)] |= to_bb
+        rights = castling & ~from_bb & ~to_bb
+        if opponent_occupied & to_bb:
+            captured_type = board.piece_type_at(to_square)
+            child[opponent + captured_type] &= ~to_bb
+            if captured_type == chess.KING:
+                # A captured king takes its side's castling rights with it, as board.push does
+                rights &= ~opponent_back_rank
+
+        if piece_type == chess.PAWN:
+            if to_square == board.ep_square and chess.square_file(from_square) != chess.square_file(to_square) \
+                    and not board.occupied & to_bb:
+                # En passant removes the pawn that just passed
+                captured = to_square - 8 if color == chess.WHITE else to_square + 8
+                child[opponent + chess.PAWN] &= ~chess.BB_SQUARES[captured]
+            elif abs(to_square - from_square) == 16:
+                ep_square = (from_square + to_square) // 2
+                if chess.BB_PAWN_ATTACKS[color][ep_square] & opponent_pawns:
+                    yield child_key(board, move)
+                    continue
+        elif piece_type == chess.KING:
+            rights &= ~back_rank
+            file_step = chess.square_file(to_square) - chess.square_file(from_square)
+            if abs(file_step) == 2:
+                # Castling also moves the rook next to the king
+                rank = chess.square_rank(from_square)
+                rook_from = chess.square(7 if file_step > 0 else 0, rank)
+                rook_to = chess.square(5 if file_step > 0 else 3, rank)
+                child[own + chess.ROOK] ^= chess.BB_SQUARES[rook_from] | chess.BB_SQUARES[rook_to]
+
+        yield tuple(child) + (rights, NO_EP, turn)
+
+
+def quiet_moves(board: chess.Board, color: chess.Color) -> Iterator[chess.Move]:
+    """Every non-capturing pseudo-legal move plus the null move and castling."""
+    # Only consider moves onto an empty square
+    yield from board.generate_pseudo_legal_moves(to_mask=chess.BB_ALL & ~board.occupied)
+    yield chess.Move.null()
+    yield from castling_moves(board, color)
+
+
+def capture_moves(board: chess.Board, capture_square: int) -> Iterator[chess.Move]:
+    """Every pseudo-legal capture onto capture_square."""
+    for move in board.generate_pseudo_legal_moves(to_mask=chess.BB_SQUARES[capture_square]):
+        if board.is_capture(move):
+            yield move
+
+
+def touched_squares(board: chess.Board, move: chess.Move) -> int:
+    """Bitmask of the squares whose contents a move changes."""
+    if not move:
+        return 0
+    touched = chess.BB_SQUARES[move.from_square] | chess.BB_SQUARES[move.to_square]
+    piece_type = board.piece_type_at(move.from_square)
+    file_step = chess.square_file(move.to_square) - chess.square_file(move.from_square)
+    if piece_type == chess.PAWN and move.to_square == board.ep_square and file_step \
+            and not board.occupied & chess.BB_SQUARES[move.to_square]:
+        touched |= chess.BB_SQUARES[move.to_square - 8 if board.turn == chess.WHITE else move.to_square + 8]
+    elif piece_type == chess.KING and abs(file_step) == 2:
+        rank = chess.square_rank(move.from_square)
+        touched |= chess.BB_SQUARES[chess.square(7 if file_step > 0 else 0, rank)]
+        touched |= chess.BB_SQUARES[chess.square(5 if file_step > 0 else 3, rank)]
+    return touched
+
+
+def sense_key_filter(sense_result) -> Callable[[Key], bool]:
+    """Pre-filter accepting only keys consistent with a sense result."""
+    window, expected = sense_masks(sense_result)
+    expected = [int(value) for value in expected]
+    return lambda key: all((key[plane] & window) == expected[plane] for plane in range(PLANE_COUNT))
+
+
+def collect(keys: Iterable, cap: Optional[int] = None, key_filter: Optional[Callable[[Key], bool]] = None,
+            stats: Optional[ExpansionStats] = None, weighted: bool = False,
+            reservoir: Optional[int] = None) -> BeliefSet:
+    """Deduplicate a stream of child keys as they arrive and pack them into a BeliefSet.
+
+    Keys rejected by key_filter are never stored, and the stream stops being consumed once cap unique
+    children have been collected, so the generators upstream never produce the rest. With weighted the
+    stream holds (key, weight) pairs and the weights of duplicate children are added up. With
+    reservoir the whole stream is consumed but at most that many children are ever held, chosen by
+    reservoir sampling instead of stream order.
+    """
+    stats = stats if stats is not None else ExpansionStats()
+    if reservoir is not None:
+        return _collect_reservoir(keys, Reservoir(reservoir, weighted), key_filter, stats)
+    seen = {}  # key -> position of its weight
+    weights = []
+    chunks = []
+    buffer = []
+    for item in keys:
+        key, weight = item if weighted else (item, None)
+        stats.generated += 1
+        position = seen.get(key)
+        if position is not None:
+            stats.duplicates += 1
+            if weighted:
+                weights[position] += weight
+            continue
+        if key_filter is not None and not key_filter(key):
+            stats.rejected += 1
+            continue
+        seen[key] = len(weights)
+        weights.append(weight)
+        buffer.append(key)
+        if len(buffer) >= CHUNK_KEYS:
+            chunks.append(np.array(buffer, dtype=np.uint64))
+            buffer = []
+        if cap is not None and len(seen) >= cap:
+            stats.truncated = True
+            break
+    if buffer:
+        chunks.append(np.array(buffer, dtype=np.uint64))
+    if not chunks:
+        return BeliefSet(weights=[] if weighted else None)
+    return BeliefSet(np.concatenate(chunks), weights if weighted else None, dedup=False)
+
+
+def _collect_reservoir(keys: Iterable, sample: Reservoir, key_filter: Optional[Callable[[Key], bool]],
+                       stats: ExpansionStats) -> BeliefSet:
+    for item in keys:
+        key, weight = item if sample.weighted else (item, None)
+        stats.generated += 1
+        if sample.merge(key, weight):
+            stats.duplicates += 1
+            continue
+        if key_filter is not None and not key_filter(key):
+            stats.rejected += 1
+            continue
+        sample.offer(key, weight)
+    return sample.belief_set(stats)
+
+
+MAX_TOUCHED = 4  # castling changes four squares, every other move at most three
+
+
+class LazyExpansion:
+    """Belief after an opponent move, kept as "parents + pending move" until children are needed.
+
+    filter_sense applies a sense result to (parent, move) pairs: a parent whose window already
+    disagrees with the sense result on squares no move can change is dropped without generating
+    anything, and for the rest only moves touching every disagreeing square are expanded.
+
+    With a move_model(board, moves) returning move probabilities, each child is weighted by its
+    parent's weight times the probability of the move that produced it. With max_children, the
+    children kept by materialize and filter_sense are a reservoir sample of at most that many.
+    """
+
+    def __init__(self, parents: BeliefSet, color: chess.Color, capture_square: Optional[int] = None,
+                 move_model: Optional[Callable[[chess.Board, List[chess.Move]], np.ndarray]] = None,
+                 max_children: Optional[int] = None):
+        self.parents = parents.with_turn(color)
+        self.color = color
+        self.capture_square = capture_square
+        self.move_model = move_model
+        self.max_children = max_children
+        self._complete = None
+        self._complete_stats = None
+
+    def moves(self, board: chess.Board) -> Iterator[chess.Move]:
+        if self.capture_square is None:
+            return quiet_moves(board, self.color)
+        return capture_moves(board, self.capture_square)
+
+    def _expand(self, index: int, must_touch: int = 0) -> Iterable:
+        """Children of parent index (as (key, weight) pairs with a move model), restricted to moves touching must_touch."""
+        board = self.parents.board(index)
+        moves = list(self.moves(board))
+        priors = None
+        if self.move_model is not None and moves:
+            # Priors are normalised over every move of the parent, before any are filtered out
+            weight = 1.0 if self.parents.weights is None else self.parents.weights[index]
+            priors = self.move_model(board, moves) * weight
+        if must_touch:
+            keep = [position for position, move in enumerate(moves) if not must_touch & ~touched_squares(board, move)]
+            moves = [moves[position] for position in keep]
+            priors = None if priors is None else priors[keep]
+        if priors is None:
+            return child_keys(board, moves)
+        return zip(child_keys(board, moves), priors.tolist())
+
+    def _children(self, order: Iterable[int], stop: Optional[threading.Event] = None) -> Iterator:
+        for index in order:
+            if stop is not None and stop.is_set():
+                return
+            yield from self._expand(index)
+
+    def materialize(self, stats: Optional[ExpansionStats] = None, cap: Optional[int] = None,
+                    stop: Optional[threading.Event] = None) -> BeliefSet:
+        """Every child (up to cap, or until stop is set); a complete result is kept for later calls."""
+        if self._complete is not None:
+            return self._complete
+        stats = stats if stats is not None else ExpansionStats()
+        children = collect(self._children(range(len(self.parents)), stop), cap=cap, stats=stats,
+                           weighted=self.move_model is not None, reservoir=self.max_children)
+        if stop is not None and stop.is_set():
+            stats.truncated = True
+        if not stats.truncated:
+            self._set_complete(children, stats)
+        return children
+
+    def _set_complete(self, children: BeliefSet, stats: ExpansionStats):
+        self._complete = children
+        self._complete_stats = stats
+
+    def has_children(self) -> bool:
+        """Whether any parent has a move, expanding at most one child to find out."""
+        if self._complete is not None:
+            return bool(self._complete)
+        if self.capture_square is None:
+            return bool(self.parents)  # the null move is always a quiet child
+        return bool(self.materialize(cap=1))
+
+    def sample(self, count: int) -> BeliefSet:
+        """Up to count children drawn from parents in random (weighted) order; a sample that turns out complete is kept."""
+        if self._complete is not None:
+            return self._complete.sample(count)
+        if self.parents.weights is None or not self.parents:
+            order = list(range(len(self.parents)))
+            random.shuffle(order)
+        else:
+            # Heavier parents come first, so a truncated sample favours the likely children
+            probabilities = self.parents.probabilities()
+            order = np.random.choice(len(self.parents), size=int(np.count_nonzero(probabilities)),
+                                     replace=False, p=probabilities)
+        stats = ExpansionStats()
+        children = collect(self._children(order), cap=count, stats=stats, weighted=self.move_model is not None)
+        if not stats.truncated:
+            self._set_complete(children, stats)
+        return children
+
+    def filter_sense(self, sense_result, stats: Optional[ExpansionStats] = None) -> BeliefSet:
+        """Children consistent with sense_result, generated only from parents that can still produce one."""
+        if self._complete is not None:
+            survivors, eliminated = self._complete.filter_sense(sense_result)
+            if stats is not None:
+                # Report the finished expansion's counts, with this sense's eliminations as rejections
+                stats.copy_from(self._complete_stats)
+                stats.rejected += eliminated
+            return survivors
+
+        window, expected = sense_masks(sense_result)
+        rows = self.parents.rows
+        mismatch = np.zeros(len(rows), dtype=np.uint64)
+        for plane in range(PLANE_COUNT):
+            mismatch |= (rows[:, plane] & np.uint64(window)) ^ expected[plane]
+        mismatch_count = np.unpackbits(mismatch.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        candidates = np.flatnonzero(mismatch_count <= MAX_TOUCHED)
+
+        key_filter = sense_key_filter(sense_result)
+
+        def keys():
+            for index in candidates:
+                yield from self._expand(index, int(mismatch[index]))
+
+        return collect(keys(), key_filter=key_filter, stats=stats, weighted=self.move_model is not None,
+                       reservoir=self.max_children)
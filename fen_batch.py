@@ -0,0 +1,83 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+from sub1p1 import ascii_board
+from sub1p2 import generate_all_possible_moves
+from sub2p1 import move_result
+from sub2p2 import generate_all_possible_next_states
+from sub3p2 import generate_next_states_with_capture
+from sub4p2 import filter_states_by_sensing
+
+# Operations are named after the single-query scripts' functions and take the same arguments
+OPERATIONS = {
+    'print_ascii_board': ascii_board,                                        # fen
+    'generate_all_possible_moves': generate_all_possible_moves,              # fen
+    'execute_move': move_result,                                             # fen, move_uci
+    'generate_all_possible_next_states': generate_all_possible_next_states,  # fen
+    'generate_next_states_with_capture': generate_next_states_with_capture,  # fen, capture_square
+    'filter_states_by_sensing': filter_states_by_sensing,                    # fen_list, sensing_window
+}
+WRITE_EVERY = 1024  # output lines buffered between writes
+
+
+def process_line(line: str) -> str:
+    """One JSONL query in, one JSONL answer out: {"op", args..., "id"?} -> {"id"?, "result"} or {"id"?, "error"}."""
+    query = {}
+    try:
+        query = json.loads(line)
+        operation = OPERATIONS.get(query.get('op'))
+        if operation is None:
+            answer = {'error': f'unknown op {query.get("op")!r}'}
+        else:
+            args = {name: value for name, value in query.items() if name not in ('op', 'id')}
+            answer = {'result': operation(**args)}
+    except Exception as e:
+        answer = {'error': f'{type(e).__name__}: {e}'}
+    if 'id' in query:
+        answer = {'id': query['id'], **answer}
+    return json.dumps(answer) + '\n'
+
+
+def run(source, sink, workers: int = 1, chunk_size: int = 256):
+    """Answer every query line of source on sink, in input order; blank lines are skipped."""
+    lines = (line for line in source if line.strip())
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        answers = pool.imap(process_line, lines, chunk_size)
+    else:
+        answers = map(process_line, lines)
+    try:
+        while True:
+            batch = list(itertools.islice(answers, WRITE_EVERY))
+            if not batch:
+                break
+            sink.writelines(batch)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    sink.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer many FEN queries (JSONL in, JSONL out) in one process pool.")
+    parser.add_argument('input', nargs='?', help="JSONL file of queries (default: stdin)")
+    parser.add_argument('-o', '--output', help="JSONL file for the answers (default: stdout)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=256, help="queries handed to a worker at a time")
+    args = parser.parse_args()
+
+    source = open(args.input) if args.input else sys.stdin
+    sink = open(args.output, 'w', buffering=1 << 20) if args.output else sys.stdout
+    try:
+        run(source, sink, args.workers, args.chunk_size)
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            sink.close()
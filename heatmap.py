@@ -0,0 +1,84 @@
+import chess
+import numpy as np
+from typing import Optional
+
+from belief import BeliefSet, plane_index
+
+CHUNK_ROWS = 16384  # bound the temporary (rows, 6, 64) bit array while reducing
+
+
+class PieceHeatmap:
+    """Per-square, per-piece-type occupancy histogram of one color's pieces across a belief set.
+
+    For a weighted belief set the counts are sums of hypothesis weights, kept normalised to a total of
+    1 so hypotheses removed from a normalised BeliefSet can be subtracted on the same scale.
+    """
+
+    def __init__(self, color: chess.Color):
+        self.color = color
+        self.counts = np.zeros((64, 6), dtype=np.float64)  # indexed [square, piece_type - 1]
+        self.total = 0.0
+        first = plane_index(chess.PAWN, color)
+        self._planes = slice(first, first + 6)
+
+    def _bits(self, rows: np.ndarray) -> np.ndarray:
+        """(rows, 6, 64) occupancy bits of this color's piece planes."""
+        planes = np.ascontiguousarray(rows[:, self._planes], dtype='<u8')
+        return np.unpackbits(planes.view(np.uint8).reshape(len(planes), 6, 8), axis=2, bitorder='little')
+
+    def _square_counts(self, rows: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        counts = np.zeros((64, 6), dtype=np.float64)
+        for start in range(0, len(rows), CHUNK_ROWS):
+            bits = self._bits(rows[start:start + CHUNK_ROWS])
+            if weights is None:
+                counts += bits.sum(axis=0, dtype=np.int64).T
+            else:
+                counts += np.tensordot(weights[start:start + CHUNK_ROWS], bits, axes=1).T
+        return counts
+
+    @staticmethod
+    def _mass(rows: np.ndarray, weights: Optional[np.ndarray]) -> float:
+        return float(len(rows)) if weights is None else float(weights.sum())
+
+    def rebuild(self, rows: np.ndarray, weights: Optional[np.ndarray] = None):
+        """Recount from scratch with a single vectorized reduction."""
+        self.counts = self._square_counts(rows, weights)
+        self.total = self._mass(rows, weights)
+
+    def add(self, rows: np.ndarray, weights: Optional[np.ndarray] = None):
+        self.counts += self._square_counts(rows, weights)
+        self.total += self._mass(rows, weights)
+
+    def remove(self, rows: np.ndarray, weights: Optional[np.ndarray] = None):
+        self.counts -= self._square_counts(rows, weights)
+        self.total -= self._mass(rows, weights)
+
+    def refresh(self, beliefs: BeliefSet, removed: Optional[BeliefSet] = None):
+        """Bring the counts in line with beliefs, subtracting removed hypotheses when that is cheaper than a recount."""
+        if removed is not None and len(removed) < len(beliefs):
+            self.remove(removed.rows, removed.weights)
+        else:
+            self.rebuild(beliefs.rows, beliefs.weights)
+        if beliefs.weights is not None and self.total > 0:
+            self.counts /= self.total
+            self.total = 1.0
+
+    def probabilities(self) -> np.ndarray:
+        """(64, 6) probability of each piece type on each square."""
+        return self.counts / max(1, self.total)
+
+    def piece_probability(self, piece_type: chess.PieceType) -> np.ndarray:
+        return self.counts[:, piece_type - 1] / max(1, self.total)
+
+    def any_piece(self) -> np.ndarray:
+        """(64,) probability that any piece of this color is on each square."""
+        return self.counts.sum(axis=1) / max(1, self.total)
+
+    def log_likelihood(self, rows: np.ndarray) -> np.ndarray:
+        """Per-row sum of log marginal probabilities of its piece placements; higher means more typical."""
+        log_probabilities = np.log(np.maximum(self.probabilities(), 1e-9)).T  # (6, 64)
+        scores = np.empty(len(rows))
+        for start in range(0, len(rows), CHUNK_ROWS):
+            bits = self._bits(rows[start:start + CHUNK_ROWS])
+            scores[start:start + CHUNK_ROWS] = (bits * log_probabilities).sum(axis=(1, 2))
+        return scores
@@ -0,0 +1,148 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+import numpy as np
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+class _Timer:
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Timers, counters and histograms per turn, appended to a JSONL file once per game.
+
+    Without a path it is disabled: every method returns at once, so instrumented code pays one
+    attribute check. Each game writes one "turn" line per turn (time per timer, counters and
+    values recorded during the turn) followed by one "game" line (totals and percentiles).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.enabled = path is not None
+        self._lock = threading.Lock()  # engine calls may report from the ponder or speculation threads
+        self._reset()
+
+    @classmethod
+    def from_env(cls, variable: str = 'RBC_METRICS') -> 'Metrics':
+        return cls(os.environ.get(variable) or None)
+
+    def _reset(self):
+        self.game = uuid.uuid4().hex[:12]
+        self.turns = []
+        self._turn = None
+        self.totals = collections.Counter()
+        self.timings = collections.defaultdict(list)
+        self.histograms = collections.defaultdict(list)
+
+    def _open_turn(self, number: Optional[int]) -> dict:
+        # Caller holds self._lock
+        self._turn = {'type': 'turn', 'game': self.game, 'turn': number, 'time_ms': collections.Counter(),
+                      'counters': collections.Counter(), 'values': {}}
+        self.turns.append(self._turn)
+        return self._turn
+
+    def _current(self) -> dict:
+        # Caller holds self._lock; records made before the first turn (or after a flush) get a turn of their own
+        if self._turn is None:
+            return self._open_turn(None)
+        return self._turn
+
+    def start_turn(self, number: Optional[int]):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._open_turn(number)
+
+    def timer(self, name: str):
+        """Context manager adding its duration to timer name."""
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._current()['time_ms'][name] += seconds * 1000
+            self.timings[name].append(seconds)
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._current()['counters'][name] += value
+            self.totals[name] += value
+
+    def set(self, name: str, value):
+        """Record a value for this turn; numbers also go into the game's histogram of name."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._current()['values'][name] = value
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.histograms[name].append(value)
+
+    def flush(self, **game):
+        """Append this game's turns and summary to the file and start over for the next game."""
+        if not self.enabled:
+            return
+        with self._lock:
+            summary = {
+                'type': 'game', 'game': self.game, 'turns': len(self.turns), **game,
+                'totals': dict(self.totals),
+                'timers': {name: _summary(np.array(samples) * 1000, 'ms') for name, samples in self.timings.items()},
+                'histograms': {name: _summary(np.array(values, dtype=float), '')
+                               for name, values in self.histograms.items()},
+            }
+            with open(self.path, 'a') as handle:
+                for turn in self.turns:
+                    handle.write(json.dumps(turn, default=str) + '\n')
+                handle.write(json.dumps(summary, default=str) + '\n')
+            self._reset()
+
+
+def _summary(samples: np.ndarray, unit: str) -> dict:
+    suffix = f'_{unit}' if unit else ''
+    return {
+        'count': len(samples),
+        'sum' + suffix: float(samples.sum()),
+        'mean' + suffix: float(samples.mean()),
+        'p50' + suffix: float(np.percentile(samples, 50)),
+        'p95' + suffix: float(np.percentile(samples, 95)),
+        'max' + suffix: float(samples.max()),
+    }
+
+
+def instrumented(method):
+    """Time a Player callback under its own name when the player's metrics are enabled."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.metrics.enabled:
+            return method(self, *args, **kwargs)
+        with _Timer(self.metrics, name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+DISABLED = Metrics()
@@ -0,0 +1,48 @@
+import chess
+import numpy as np
+from typing import List
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 100}
+
+NULL_MOVE_WEIGHT = 0.2   # passing (or a failed move attempt) is rarely chosen
+CASTLING_WEIGHT = 3.0
+CENTER_BONUS = 0.5       # landing on one of the four centre squares
+DEVELOPMENT_BONUS = 0.5  # knight or bishop leaving its back rank
+KING_WEIGHT = 0.3        # king walks other than castling
+EN_PRISE_WEIGHT = 0.3    # landing where one of the mover's opponent's pawns can take it
+
+
+def move_weight(board: chess.Board, move: chess.Move) -> float:
+    """Unnormalised heuristic likelihood that the side to move plays move."""
+    if not move:
+        return NULL_MOVE_WEIGHT
+    piece_type = board.piece_type_at(move.from_square)
+    color = board.turn
+    to_bb = chess.BB_SQUARES[move.to_square]
+
+    if piece_type == chess.KING:
+        if abs(chess.square_file(move.to_square) - chess.square_file(move.from_square)) == 2:
+            return CASTLING_WEIGHT
+        weight = KING_WEIGHT
+    else:
+        weight = 1.0
+
+    victim = board.piece_type_at(move.to_square)
+    if victim is not None:
+        # Cheap attackers taking valuable pieces are the captures people actually make
+        weight += PIECE_VALUES[victim] / PIECE_VALUES[piece_type]
+    if to_bb & chess.BB_CENTER:
+        weight += CENTER_BONUS
+    back_rank = chess.BB_RANK_1 if color == chess.WHITE else chess.BB_RANK_8
+    if piece_type in (chess.KNIGHT, chess.BISHOP) and chess.BB_SQUARES[move.from_square] & back_rank:
+        weight += DEVELOPMENT_BONUS
+    if piece_type != chess.PAWN and board.attackers_mask(not color, move.to_square) & board.pawns:
+        weight *= EN_PRISE_WEIGHT
+    return weight
+
+
+def move_priors(board: chess.Board, moves: List[chess.Move]) -> np.ndarray:
+    """Probability of each of moves under the heuristic model, normalised over the given moves."""
+    weights = np.array([move_weight(board, move) for move in moves], dtype=np.float64)
+    total = weights.sum()
+    return weights / total if total > 0 else weights
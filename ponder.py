@@ -0,0 +1,67 @@
+import threading
+import chess
+import chess.engine
+import numpy as np
+from typing import Optional
+from reconchess.utilities import move_actions as available_moves
+
+from belief import BeliefSet
+from engines import EnginePool
+from expansion import ExpansionStats, LazyExpansion
+
+
+class Ponder:
+    """Work done on a background thread while the opponent thinks.
+
+    Expands the belief for a quiet opponent move (the usual case) and then searches the likeliest
+    children to a fixed depth through the engine pool, whose cache keeps the results for our turn.
+    Our pieces are the same on every quiet child, so one move_actions list (what reconchess will
+    offer us) restricts every search exactly as choose_move will.
+    """
+
+    def __init__(self, beliefs: BeliefSet, expansion: LazyExpansion, engine_pool: Optional[EnginePool],
+                 limit: chess.engine.Limit, boards: int, multipv: Optional[int] = None):
+        self.beliefs = beliefs        # the belief the expansion started from
+        self.expansion = expansion
+        self.engine_pool = engine_pool
+        self.limit = limit
+        self.boards = boards
+        self.multipv = multipv
+        self.stats = ExpansionStats()
+        self.expanded = False
+        self.searched = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ponder', daemon=True)
+
+    def start(self) -> 'Ponder':
+        self._thread.start()
+        return self
+
+    def _run(self):
+        children = self.expansion.materialize(self.stats, stop=self._stop)
+        if self._stop.is_set():
+            return
+        self.expanded = True
+        if not children or self.engine_pool is None or not self.boards:
+            return
+
+        candidates = children.top_k(self.boards)
+        if len(candidates) > self.boards:
+            candidates = candidates.sample(self.boards)
+        if candidates.weights is not None:
+            candidates = candidates.select(np.argsort(-candidates.weights, kind='stable'))
+        boards = list(candidates)
+        move_actions = available_moves(boards[0])
+        # One batch per round of engines, so stop() never waits for more than one search per engine
+        for start in range(0, len(boards), self.engine_pool.size):
+            if self._stop.is_set():
+                return
+            batch = boards[start:start + self.engine_pool.size]
+            self.engine_pool.analyse_many(batch, self.limit, move_actions, multipv=self.multipv)
+            self.searched += len(batch)
+
+    def stop(self) -> Optional[LazyExpansion]:
+        """Stop pondering and wait for the searches in flight; returns the expansion if it was completed."""
+        self._stop.set()
+        self._thread.join()
+        return self.expansion if self.expanded else None
@@ -0,0 +1,74 @@
+import collections
+import math
+from typing import NamedTuple
+
+
+class TurnPlan(NamedTuple):
+    budget: float          # seconds the move phase may spend this turn
+    boards: int            # hypotheses to evaluate
+    time_per_board: float  # engine time per hypothesis
+    depth: int             # engine depth cap per hypothesis
+    batch_size: int        # boards evaluated between early-stop checks
+
+
+class MoveScheduler:
+    """Splits the remaining game clock into a per-turn move budget and sizes the engine work to fit it."""
+
+    def __init__(self, expected_game_moves=50, min_moves_left=10, reserve_seconds=10.0, move_phase_share=0.8,
+                 min_time_per_board=0.001, max_time_per_board=0.05, max_boards_per_engine=200,
+                 full_depth=8, shallow_depth=5, shallow_below=0.01, batches_per_engine=4, confidence=0.95,
+                 min_boards_before_stop=12):
+        self.expected_game_moves = expected_game_moves
+        self.min_moves_left = min_moves_left
+        self.reserve_seconds = reserve_seconds    # never planned away, protects against clock losses
+        self.move_phase_share = move_phase_share  # the rest of the turn is left for sensing and belief updates
+        self.min_time_per_board = min_time_per_board
+        self.max_time_per_board = max_time_per_board
+        self.max_boards_per_engine = max_boards_per_engine
+        self.full_depth = full_depth
+        self.shallow_depth = shallow_depth
+        self.shallow_below = shallow_below        # per-board time under which searches are cut to shallow_depth
+        self.batches_per_engine = batches_per_engine
+        self.confidence = confidence
+        self.min_boards_before_stop = min_boards_before_stop
+
+    def turn_budget(self, seconds_left: float, move_num: int) -> float:
+        usable = max(0.0, seconds_left - self.reserve_seconds)
+        moves_left = max(self.min_moves_left, self.expected_game_moves - move_num)
+        return usable / moves_left * self.move_phase_share
+
+    def plan(self, board_count: int, seconds_left: float, move_num: int, engines: int = 1) -> TurnPlan:
+        budget = self.turn_budget(seconds_left, move_num)
+        engine_seconds = budget * engines
+
+        boards = min(board_count, self.max_boards_per_engine * engines)
+        boards = min(boards, int(engine_seconds / self.min_time_per_board))
+        boards = max(1, boards) if board_count else 0
+
+        time_per_board = self.max_time_per_board
+        if boards:
+            time_per_board = max(self.min_time_per_board, min(self.max_time_per_board, engine_seconds / boards))
+        depth = self.full_depth if time_per_board >= self.shallow_below else self.shallow_depth
+        return TurnPlan(budget, boards, time_per_board, depth, max(1, engines * self.batches_per_engine))
+
+    def vote_is_decided(self, move_counter: collections.Counter, evaluated: int, remaining: int,
+                        max_weight_per_board: float) -> bool:
+        """Whether the vote leader is safe, either outright or with the configured confidence.
+
+        The statistical check treats each evaluated board's contribution to (leader - runner-up) as a
+        sample bounded by +/- max_weight_per_board and applies Hoeffding's inequality to the mean.
+        """
+        if remaining <= 0:
+            return True
+        if not move_counter:
+            return False
+        top = move_counter.most_common(2)
+        lead = top[0][1] - (top[1][1] if len(top) > 1 else 0)
+        if lead > remaining * max_weight_per_board:
+            return True
+        if evaluated < self.min_boards_before_stop:
+            return False
+        mean_lead = lead / evaluated
+        spread = 2 * max_weight_per_board
+        margin = spread * math.sqrt(math.log(1 / (1 - self.confidence)) / (2 * evaluated))
+        return mean_lead > margin
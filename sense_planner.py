@@ -0,0 +1,75 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+from belief import PLANE_COUNT
+from sense_tables import WINDOW_INDEX
+
+CHUNK_ROWS = 8192
+
+WINDOWS = WINDOW_INDEX  # (64, 9) window slots; slots off the board point at the always-empty padding column
+
+# Each window square contributes a 4-bit piece code (0 = empty, 1..12 = plane + 1)
+_SHIFTS = np.arange(9, dtype=np.uint64) * np.uint64(4)
+_WINDOW_SHIFT = np.uint64(36)
+
+
+def square_codes(rows: np.ndarray) -> np.ndarray:
+    """(rows, 65) piece code of every square plus an always-empty padding column."""
+    codes = np.zeros((len(rows), 65), dtype=np.uint8)
+    for plane in range(PLANE_COUNT):
+        masks = np.ascontiguousarray(rows[:, plane], dtype='<u8')
+        bits = np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+        codes[:, :64] += bits * np.uint8(plane + 1)
+    return codes
+
+
+def observation_keys(rows: np.ndarray, squares: List[int]) -> np.ndarray:
+    """(rows, len(squares)) key of what sensing each square would reveal, for every hypothesis."""
+    windows = WINDOWS[np.asarray(squares, dtype=np.intp)]
+    keys = np.empty((len(rows), len(windows)), dtype=np.uint64)
+    for start in range(0, len(rows), CHUNK_ROWS):
+        codes = square_codes(rows[start:start + CHUNK_ROWS])
+        observed = codes[:, windows].astype(np.uint64)  # (chunk, squares, 9)
+        keys[start:start + CHUNK_ROWS] = (observed << _SHIFTS).sum(axis=2, dtype=np.uint64)
+    return keys
+
+
+def score_sense_squares(rows: np.ndarray, squares: List[int],
+                        weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Expected remaining states and expected remaining entropy (bits) after sensing each square.
+
+    All candidate windows are grouped in one np.unique call by tagging each observation key with
+    its window index. With hypothesis weights, each observation is expected with its probability
+    mass and the entropy is that of the posterior weights; uniform weights give the unweighted scores.
+    """
+    total = len(rows)
+    if total == 0 or not squares:
+        return np.zeros(len(squares)), np.zeros(len(squares))
+
+    keys = observation_keys(rows, squares)
+    tagged = keys | (np.arange(len(squares), dtype=np.uint64) << _WINDOW_SHIFT)
+    if weights is not None:
+        return _weighted_scores(tagged, len(squares), weights)
+    unique, counts = np.unique(tagged.ravel(), return_counts=True)
+    window = (unique >> _WINDOW_SHIFT).astype(np.intp)
+    counts = counts.astype(np.float64)
+
+    expected_states = np.bincount(window, weights=counts * counts, minlength=len(squares)) / total
+    expected_entropy = np.bincount(window, weights=counts * np.log2(counts), minlength=len(squares)) / total
+    return expected_states, expected_entropy
+
+
+def _weighted_scores(tagged: np.ndarray, square_count: int, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    probabilities = np.asarray(weights, dtype=np.float64)
+    probabilities = probabilities / max(probabilities.sum(), 1e-300)
+    unique, inverse, counts = np.unique(tagged.ravel(), return_inverse=True, return_counts=True)
+    window = (unique >> _WINDOW_SHIFT).astype(np.intp)
+    # Probability mass of every observation; keys are laid out row-major, one row per hypothesis
+    mass = np.bincount(inverse.reshape(-1), weights=np.repeat(probabilities, square_count), minlength=len(unique))
+
+    expected_states = np.bincount(window, weights=mass * counts, minlength=square_count)
+    # Posterior entropy averaged over observations: H(hypothesis) - H(observation)
+    positive = probabilities[probabilities > 0]
+    prior_entropy = -(positive * np.log2(positive)).sum()
+    observation_entropy = np.bincount(window, weights=mass * np.log2(np.maximum(mass, 1e-300)), minlength=square_count)
+    return expected_states, prior_entropy + observation_entropy
@@ -0,0 +1,31 @@
+import chess
+import numpy as np
+from typing import List
+
+OFF_BOARD = 64  # padding index for window slots that fall off the board
+
+
+def _window_slots(center: int) -> List[int]:
+    """The 3x3 window around center in rank-major order, OFF_BOARD where it leaves the board."""
+    slots = []
+    for rank_offset in range(-1, 2):
+        for file_offset in range(-1, 2):
+            rank = chess.square_rank(center) + rank_offset
+            file = chess.square_file(center) + file_offset
+            slots.append(chess.square(file, rank) if 0 <= rank < 8 and 0 <= file < 8 else OFF_BOARD)
+    return slots
+
+
+# (64, 9) window slots per centre square, for fancy indexing into (rows, 65) square arrays
+WINDOW_INDEX = np.array([_window_slots(center) for center in chess.SQUARES], dtype=np.intp)
+
+# Squares whose window lies fully on the board
+EDGE_MASK = chess.BB_RANK_1 | chess.BB_RANK_8 | chess.BB_FILE_A | chess.BB_FILE_H
+INTERIOR_MASK = chess.BB_ALL & ~EDGE_MASK
+INTERIOR_SQUARES = frozenset(chess.scan_forward(INTERIOR_MASK))
+
+
+def window_mass(squares: List[int], square_values: np.ndarray) -> np.ndarray:
+    """Sum of a (64,) per-square quantity over each candidate's sense window."""
+    padded = np.append(np.asarray(square_values, dtype=np.float64), 0.0)
+    return padded[WINDOW_INDEX[np.asarray(squares, dtype=np.intp)]].sum(axis=1)
@@ -0,0 +1,219 @@
+import os
+import multiprocessing
+import threading
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+from belief import BeliefSet, ROW_WIDTH
+from expansion import ExpansionStats, LazyExpansion
+
+ITEM_BYTES = 8  # uint64 row planes and float64 weights alike
+
+
+def default_shard_processes():
+    """One worker process per core, overridable with RBC_SHARD_PROCESSES."""
+    configured = os.environ.get('RBC_SHARD_PROCESSES')
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def share(beliefs: BeliefSet) -> Optional[shared_memory.SharedMemory]:
+    """Copy the rows (then the weights, if any) into a new shared memory block; None when empty."""
+    if not beliefs:
+        return None
+    count = len(beliefs)
+    size = count * ROW_WIDTH * ITEM_BYTES + (count * ITEM_BYTES if beliefs.weights is not None else 0)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    np.ndarray((count, ROW_WIDTH), dtype=np.uint64, buffer=block.buf)[:] = beliefs.rows
+    if beliefs.weights is not None:
+        np.ndarray(count, dtype=np.float64, buffer=block.buf, offset=count * ROW_WIDTH * ITEM_BYTES)[:] = beliefs.weights
+    return block
+
+
+def attach(name: str, count: int, weighted: bool, start: int = 0, stop: Optional[int] = None,
+           unlink: bool = False) -> BeliefSet:
+    """Copy rows start:stop of a block made by share() out of shared memory."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        stop = count if stop is None else stop
+        rows = np.ndarray((count, ROW_WIDTH), dtype=np.uint64, buffer=block.buf)[start:stop].copy()
+        weights = None
+        if weighted:
+            weights = np.ndarray(count, dtype=np.float64, buffer=block.buf,
+                                 offset=count * ROW_WIDTH * ITEM_BYTES)[start:stop].copy()
+        return BeliefSet(rows, weights, dedup=False)
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _expand_shard(job: tuple) -> Tuple[Optional[str], int, ExpansionStats, float]:
+    """Worker side: expand (and sense-filter) one slice of the parents; children go back through shared memory."""
+    name, count, weighted, start, stop, color, capture_square, move_model, max_children, sense_result = job
+    parents = attach(name, count, weighted, start, stop)
+    expansion = LazyExpansion(parents, color, capture_square, move_model, max_children)
+    stats = ExpansionStats()
+    if sense_result is None:
+        children = expansion.materialize(stats)
+    else:
+        children = expansion.filter_sense(sense_result, stats)
+    kept_mass = float(children.weights.sum()) if children.weights is not None else float(len(children))
+    # What the reservoir was offered, so the merge can report one drop share for the whole expansion
+    offered_mass = kept_mass / (1 - stats.dropped_mass) if stats.dropped_mass < 1 else kept_mass
+    block = share(children)
+    if block is None:
+        return None, 0, stats, offered_mass
+    block.close()  # the parent copies and unlinks it
+    return block.name, len(children), stats, offered_mass
+
+
+def _release(future):
+    # Children of an abandoned shard still sit in shared memory
+    if not future.cancelled() and future.exception() is None:
+        name, count, _, _ = future.result()
+        if name is not None:
+            block = shared_memory.SharedMemory(name=name)
+            block.close()
+            block.unlink()
+
+
+def merge_shards(parts: List[Tuple[BeliefSet, ExpansionStats, float]], cap: Optional[int], weighted: bool,
+                 stats: ExpansionStats) -> BeliefSet:
+    """Children of every shard, deduplicated across shards and cut to cap.
+
+    Unweighted shards are reservoir samples, so the cut draws how many children each shard keeps from a
+    multivariate hypergeometric over what the shards were offered, which keeps the result a uniform
+    sample of the whole expansion. Weighted children are cut by weighted sampling without replacement,
+    the distribution the in-process A-Res reservoir draws from; it matches that reservoir exactly when
+    no shard had to sample on its own, and stays weight-proportional when one did.
+    """
+    offered_mass = sum(offered for _, _, offered in parts)
+    dropped_mass = 0.0
+    for children, shard_stats, offered in parts:
+        stats.generated += shard_stats.generated
+        stats.duplicates += shard_stats.duplicates
+        stats.rejected += shard_stats.rejected
+        stats.dropped += shard_stats.dropped
+        dropped_mass += shard_stats.dropped_mass * offered
+
+    if not weighted and cap is not None and sum(len(children) for children, _, _ in parts) > cap:
+        offered = np.array([len(children) + shard_stats.dropped for children, shard_stats, _ in parts], dtype=np.int64)
+        takes = np.random.default_rng().multivariate_hypergeometric(offered, cap)
+        sampled = []
+        for (children, shard_stats, shard_offered), take in zip(parts, takes):
+            take = min(int(take), len(children))
+            stats.dropped += len(children) - take
+            dropped_mass += len(children) - take
+            sampled.append((children.sample(take), shard_stats, shard_offered))
+        parts = sampled
+
+    rows = [children.rows for children, _, _ in parts]
+    weights = [children.weights for children, _, _ in parts] if weighted else None
+    merged = BeliefSet(np.concatenate(rows) if rows else None,
+                       (np.concatenate(weights) if weights else np.zeros(0)) if weighted else None)
+    stats.duplicates += sum(len(children) for children, _, _ in parts) - len(merged)
+    if weighted and cap is not None and len(merged) > cap:
+        kept = merged.sample(cap)
+        stats.dropped += len(merged) - len(kept)
+        dropped_mass += float(merged.weights.sum() - kept.weights.sum())
+        merged = kept
+    if offered_mass > 0:
+        stats.dropped_mass = min(1.0, dropped_mass / offered_mass)
+    return merged
+
+
+class ShardPool:
+    """Persistent worker processes that expand and sense-filter a belief set in shards.
+
+    Parents and children travel as bitboard rows through shared memory, never pickled boards or FENs;
+    only the small job description and per-shard statistics are pickled. A belief too small to fill
+    a shard of min_shard_parents parents is expanded in-process.
+    """
+
+    def __init__(self, processes: Optional[int] = None, min_shard_parents: int = 200):
+        self.processes = processes or default_shard_processes()
+        self.min_shard_parents = min_shard_parents
+        # forkserver workers do not inherit the engine threads and processes of the agent
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        self.sharded = 0
+
+    def shards(self, parents: int) -> int:
+        return min(self.processes, parents // self.min_shard_parents)
+
+    def warm_up(self):
+        """Start every worker now rather than on the first sharded turn."""
+        for future in [self._executor.submit(os.getpid) for _ in range(self.processes)]:
+            future.result()
+
+    def run(self, expansion: LazyExpansion, sense_result=None, stats: Optional[ExpansionStats] = None,
+            stop: Optional[threading.Event] = None) -> Optional[BeliefSet]:
+        """Children of expansion (consistent with sense_result, when given); None if stop was set first."""
+        stats = stats if stats is not None else ExpansionStats()
+        parents = expansion.parents
+        weighted = parents.weights is not None
+        shards = max(1, self.shards(len(parents)))
+        bounds = np.linspace(0, len(parents), shards + 1).astype(int)
+        block = share(parents)
+        try:
+            futures = [self._executor.submit(_expand_shard, (
+                block.name, len(parents), weighted, int(start), int(end), expansion.color, expansion.capture_square,
+                expansion.move_model, expansion.max_children, sense_result))
+                for start, end in zip(bounds[:-1], bounds[1:])]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                if pending and stop is not None and stop.is_set():
+                    for future in futures:
+                        future.add_done_callback(_release)
+                    return None
+        finally:
+            block.close()
+            block.unlink()
+
+        parts = []
+        for future in futures:
+            name, count, shard_stats, offered = future.result()
+            children = attach(name, count, expansion.move_model is not None, unlink=True) if name is not None else \
+                BeliefSet(weights=np.zeros(0) if expansion.move_model is not None else None)
+            parts.append((children, shard_stats, offered))
+        self.sharded += 1
+        return merge_shards(parts, expansion.max_children, expansion.move_model is not None, stats)
+
+    def shutdown(self):
+        # Cancel what has not started, then wait so no worker outlives the pool (or the interpreter)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ShardedExpansion(LazyExpansion):
+    """LazyExpansion whose materialize and filter_sense run on a ShardPool once the parents fill two shards."""
+
+    def __init__(self, parents: BeliefSet, color, capture_square=None, move_model=None, max_children=None,
+                 pool: Optional[ShardPool] = None):
+        super().__init__(parents, color, capture_square, move_model, max_children)
+        self.pool = pool
+
+    def _sharded(self) -> bool:
+        return self.pool is not None and self.pool.shards(len(self.parents)) > 1
+
+    def materialize(self, stats: Optional[ExpansionStats] = None, cap: Optional[int] = None,
+                    stop: Optional[threading.Event] = None) -> BeliefSet:
+        if self._complete is not None or cap is not None or not self._sharded():
+            return super().materialize(stats, cap, stop)
+        stats = stats if stats is not None else ExpansionStats()
+        children = self.pool.run(self, None, stats, stop)
+        if children is None:
+            stats.truncated = True
+            return BeliefSet(weights=np.zeros(0) if self.move_model is not None else None)
+        self._set_complete(children, stats)
+        return children
+
+    def filter_sense(self, sense_result, stats: Optional[ExpansionStats] = None) -> BeliefSet:
+        if self._complete is not None or not self._sharded():
+            return super().filter_sense(sense_result, stats)
+        return self.pool.run(self, sense_result, stats)
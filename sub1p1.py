@@ -1,15 +1,21 @@
 import reconchess
 import chess
 
-def print_ascii_board(fen):
+def ascii_board(fen):
     board = chess.Board(fen=fen)
+    rows = []
     for rank in range(8, 0, -1):
         row = ""
         for file in range(8):
             square = chess.square(file, rank - 1)
             piece = board.piece_at(square)
             row += (piece.symbol() if piece else '.') + ' '
-        print(row.strip())
+        rows.append(row.strip())
+    return rows
+
+def print_ascii_board(fen):
+    for row in ascii_board(fen):
+        print(row)
 
 if __name__ == "__main__":
     #input
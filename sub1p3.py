@@ -1,5 +1,6 @@
 import chess
-import chess.engine
+
+MOVE_TIME = 0.5
 
 def capture_king_if_possible(board):
     for move in board.legal_moves:
@@ -19,9 +20,17 @@ if __name__ == "__main__":
     move = capture_king_if_possible(board)
 
     if move is None:
+        # A running engine daemon keeps warm engines, which saves the engine start-up per call
+        import engine_client
+        uci = engine_client.best_move(fen, MOVE_TIME)
+        if uci is not None:
+            move = chess.Move.from_uci(uci)
+
+    if move is None:
+        import chess.engine  # only needed without a daemon; it takes a while to import
         #engine = chess.engine.SimpleEngine.popen_uci('./stockfish', setpgrp=True)
         engine = chess.engine.SimpleEngine.popen_uci('/opt/stockfish/stockfish', setpgrp=True)
-        result = engine.play(board, chess.engine.Limit(time=0.5))
+        result = engine.play(board, chess.engine.Limit(time=MOVE_TIME))
         move = result.move
         engine.quit()
 
@@ -1,15 +1,18 @@
 import chess
 import reconchess
 
-def execute_move(fen, move_uci):
+def move_result(fen, move_uci):
     board = chess.Board(fen)
     move = chess.Move.from_uci(move_uci)
 
     if move in board.legal_moves:
         board.push(move)
-        print(board.fen())
+        return board.fen()
     else:
-        print("Illegal MAte!")
+        return "Illegal MAte!"
+
+def execute_move(fen, move_uci):
+    print(move_result(fen, move_uci))
 
 if __name__ == "__main__":
     #inpu
@@ -9,26 +9,20 @@ def generate_all_possible_next_states(fen):
     states = set()
     
     # Handle null move
-    null_board = board.copy()
-    null_board.push(chess.Move.null())
-    states.add(null_board.fen())
+    moves = [chess.Move.null()]
     
     # Handle pseudo-legal moves
-    for move in board.pseudo_legal_moves:
-        new_board = board.copy()
-        new_board.push(move)
-        states.add(new_board.fen())
+    moves.extend(board.generate_pseudo_legal_moves())
     
     # Handle RBC-specific castling moves
-    for move in without_opponent_pieces(board).generate_castling_moves():
-        if not is_illegal_castle(board, move):
-            new_board = board.copy()
-            try:
-                new_board.push(move)
-                states.add(new_board.fen())
-            except chess.IllegalMoveError:
-                # Skip if move is somehow illegal
-                continue
+    moves.extend(move for move in without_opponent_pieces(board).generate_castling_moves()
+                 if not is_illegal_castle(board, move))
+    
+    # Each move is made and unmade on the one board instead of pushing onto a copy
+    for move in moves:
+        board.push(move)
+        states.add(board.fen())
+        board.pop()
     
     return sorted(list(states))
 
@@ -1,8 +1,46 @@
 import chess
-import chess.engine
 from collections import Counter
 
+MOVE_TIME = 0.1  # Lower time limit to save time
+
+
+def king_capture_move(board):
+    """UCI move capturing the opponent's king, if any of our pieces attacks it."""
+    opponent_color = not board.turn
+    
+    # Get opponent's king position using board's built-in king_square method
+    opponent_king_square = board.king(opponent_color)
+    
+    if opponent_king_square is not None:
+        # Check if any of our pieces can attack the king
+        attackers = board.attackers(board.turn, opponent_king_square)
+        if attackers:
+            # Get the first attacker square
+            attacker_square = chess.square_name(chess.SQUARES[attackers.pop()])
+            king_square = chess.square_name(opponent_king_square)
+            return attacker_square + king_square
+    return None
+
+def most_common_move(moves):
+    # Count moves and find most common
+    if not moves:
+        return "0000"  # Default move if something went wrong
+        
+    move_counter = Counter(moves)
+    max_count = max(move_counter.values())
+    most_common_moves = [move for move, count in move_counter.items() if count == max_count]
+    
+    # Return alphabetically first move among the most common
+    return sorted(most_common_moves)[0]
+
 def select_most_common_move(fen_list):
+    # A running engine daemon keeps warm engines, which saves the engine start-up per call
+    import engine_client
+    move = engine_client.majority_move(fen_list, MOVE_TIME)
+    if move is not None:
+        return move
+    
+    import chess.engine  # only needed without a daemon; it takes a while to import
     moves = []
     
     # Initialize engine once
@@ -13,26 +51,11 @@ def select_most_common_move(fen_list):
             board = chess.Board(fen)
             
             # Quick check for king captures - much faster approach
-            king_capture_made = False
-            opponent_color = not board.turn
-            
-            # Get opponent's king position using board's built-in king_square method
-            opponent_king_square = board.king(opponent_color)
-            
-            if opponent_king_square is not None:
-                # Check if any of our pieces can attack the king
-                attackers = board.attackers(board.turn, opponent_king_square)
-                if attackers:
-                    # Get the first attacker square
-                    attacker_square = chess.square_name(chess.SQUARES[attackers.pop()])
-                    king_square = chess.square_name(opponent_king_square)
-                    king_capture_move = attacker_square + king_square
-                    moves.append(king_capture_move)
-                    king_capture_made = True
-            
-            if not king_capture_made:
-                # Lower time limit to save time
-                result = engine.play(board, chess.engine.Limit(time=0.1))
+            king_capture = king_capture_move(board)
+            if king_capture is not None:
+                moves.append(king_capture)
+            else:
+                result = engine.play(board, chess.engine.Limit(time=MOVE_TIME))
                 moves.append(result.move.uci())
     
     except Exception as e:
@@ -42,16 +65,7 @@ def select_most_common_move(fen_list):
         # Ensure engine is closed
         engine.quit()
     
-    # Count moves and find most common
-    if not moves:
-        return "0000"  # Default move if something went wrong
-        
-    move_counter = Counter(moves)
-    max_count = max(move_counter.values())
-    most_common_moves = [move for move, count in move_counter.items() if count == max_count]
-    
-    # Return alphabetically first move among the most common
-    return sorted(most_common_moves)[0]
+    return most_common_move(moves)
 
 if __name__ == "__main__":
     n = int(input().strip())
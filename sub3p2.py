@@ -5,13 +5,15 @@ import chess
 def generate_next_states_with_capture(fen, capture_square):
     board = chess.Board(fen)
     capture_index = chess.parse_square(capture_square)
-    states = set()
+    moves = [move for move in board.generate_pseudo_legal_moves(to_mask=chess.BB_SQUARES[capture_index])
+             if board.is_capture(move)]
 
-    for move in board.pseudo_legal_moves:
-        if move.to_square == capture_index and board.is_capture(move):
-            new_board = board.copy()
-            new_board.push(move)
-            states.add(new_board.fen())
+    # Each move is made and unmade on the one board instead of pushing onto a copy
+    states = set()
+    for move in moves:
+        board.push(move)
+        states.add(board.fen())
+        board.pop()
 
     return sorted(states)
 
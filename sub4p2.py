@@ -10,20 +10,22 @@ def parse_window(window_str):
             observations[square] = piece
     return observations
 
+def placement(fen):
+    """Piece symbol on each square, a1 to h8, with '?' for empty squares; read from the FEN's first field."""
+    squares = []
+    for rank in reversed(fen.split(' ', 1)[0].split('/')):
+        for symbol in rank:
+            squares.extend('?' * int(symbol) if symbol.isdigit() else symbol)
+    return squares
+
 def filter_states_by_sensing(fen_list, sensing_window):
-    observations = parse_window(sensing_window)
-    consistent_states = []
+    observations = [(chess.parse_square(square), symbol) for square, symbol in parse_window(sensing_window).items()]
 
+    # Only the piece placement is compared, so the FEN is not parsed into a board
+    consistent_states = []
     for fen in fen_list:
-        board = chess.Board(fen)
-        is_consistent = True
-        for square, expected_piece in observations.items():
-            actual_piece = board.piece_at(chess.parse_square(square))
-            actual_symbol = actual_piece.symbol() if actual_piece else '?'
-            if actual_symbol != expected_piece:
-                is_consistent = False
-                break
-        if is_consistent:
+        squares = placement(fen)
+        if all(squares[square] == symbol for square, symbol in observations):
             consistent_states.append(fen)
 
     return sorted(consistent_states)
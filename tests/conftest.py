@@ -0,0 +1,44 @@
+import os
+import sys
+
+import chess.engine
+import pytest
+
+# The modules live at the top of the repo, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engines  # noqa: E402
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripted_engine.py')
+
+
+class ScriptedEngines:
+    """Starts scripted engines, each logging the UCI commands it receives to its own file."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.logs = []
+
+    def __call__(self, threads=1, hash_mb=16, die_after=None):
+        """A new engine; with die_after it exits on that search."""
+        log = str(self.directory / f'engine{len(self.logs)}.log')
+        self.logs.append(log)
+        command = [sys.executable, SCRIPT, log] + (['--die-after', str(die_after)] if die_after else [])
+        return chess.engine.SimpleEngine.popen_uci(command)
+
+    def commands(self, index: int = None) -> list:
+        logs = self.logs if index is None else [self.logs[index]]
+        lines = []
+        for log in logs:
+            with open(log) as handle:
+                lines.extend(line.strip() for line in handle)
+        return lines
+
+
+@pytest.fixture
+def scripted(tmp_path, monkeypatch):
+    """Every engine the code under test opens is a scripted engine instead of Stockfish."""
+    factory = ScriptedEngines(tmp_path)
+    monkeypatch.setattr(engines, 'openEngine', factory)
+    return factory
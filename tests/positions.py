@@ -0,0 +1,31 @@
+import random
+
+import chess
+
+
+def random_positions(count: int, seed: int) -> list:
+    """Positions from random games of pseudo-legal moves, played on until a king is taken."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = chess.Board()
+        for _ in range(120):
+            if not board.king(chess.WHITE) or not board.king(chess.BLACK):
+                break
+            positions.append(board.copy(stack=False))
+            moves = list(board.generate_pseudo_legal_moves())
+            if not moves:
+                break
+            # Prefer captures now and then, so king captures and en passant come up
+            captures = [move for move in moves if board.is_capture(move)]
+            board.push(rng.choice(captures if captures and rng.random() < 0.3 else moves))
+    return positions[:count]
+
+
+def sense_window(board: chess.Board, square: int) -> list:
+    """What sensing square on board reveals, as reconchess reports it."""
+    rank, file = chess.square_rank(square), chess.square_file(square)
+    return [(chess.square(file + delta_file, rank + delta_rank),
+             board.piece_at(chess.square(file + delta_file, rank + delta_rank)))
+            for delta_rank in (1, 0, -1) for delta_file in (-1, 0, 1)
+            if 0 <= rank + delta_rank <= 7 and 0 <= file + delta_file <= 7]
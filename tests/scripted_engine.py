@@ -0,0 +1,65 @@
+"""Minimal scripted UCI engine for the engine tests; no Stockfish needed.
+
+Every command it receives is appended to the log file given as the first argument. It answers go
+at once with the alphabetically first legal move (within searchmoves, when given). With
+--die-after N it exits without a word on its Nth go.
+"""
+import argparse
+import sys
+
+import chess
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('log')
+    parser.add_argument('--die-after', type=int)
+    args = parser.parse_args()
+
+    board = chess.Board()
+    searches = 0
+    with open(args.log, 'a', buffering=1) as log:
+        for line in sys.stdin:
+            command = line.strip()
+            log.write(command + '\n')
+            words = command.split()
+            if not words:
+                continue
+            if words[0] == 'uci':
+                print('id name scripted', flush=True)
+                print('option name Threads type spin default 1 min 1 max 64', flush=True)
+                print('option name Hash type spin default 16 min 1 max 1024', flush=True)
+                print('option name MultiPV type spin default 1 min 1 max 500', flush=True)
+                print('uciok', flush=True)
+            elif words[0] == 'isready':
+                print('readyok', flush=True)
+            elif words[0] == 'position':
+                board = position(words[1:])
+            elif words[0] == 'go':
+                searches += 1
+                if args.die_after is not None and searches >= args.die_after:
+                    return
+                moves = sorted(board.legal_moves, key=chess.Move.uci)
+                if 'searchmoves' in words:
+                    allowed = set(words[words.index('searchmoves') + 1:])
+                    moves = [move for move in moves if move.uci() in allowed]
+                best = moves[0].uci() if moves else '0000'
+                print(f'info depth 1 seldepth 1 multipv 1 score cp 0 nodes 1 time 0 pv {best}', flush=True)
+                print(f'bestmove {best}', flush=True)
+            elif words[0] == 'quit':
+                return
+
+
+def position(words):
+    if words[0] == 'startpos':
+        board, rest = chess.Board(), words[1:]
+    else:
+        end = words.index('moves') if 'moves' in words else len(words)
+        board, rest = chess.Board(' '.join(words[1:end])), words[end:]
+    for move in rest[1:]:
+        board.push_uci(move)
+    return board
+
+
+if __name__ == '__main__':
+    main()
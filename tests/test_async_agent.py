@@ -0,0 +1,68 @@
+import chess
+import chess.engine
+import pytest
+from reconchess import GameHistory
+
+from AsyncImprovedAgent import AsyncImprovedAgent, Speculation
+
+
+def limit(depth=None, time=None) -> chess.engine.Limit:
+    return chess.engine.Limit(depth=depth, time=time)
+
+
+def lines(depth: int) -> list:
+    return [{'depth': depth, 'pv': [chess.Move.from_uci('e2e4')]}]
+
+
+def test_covers_compares_depth_and_time():
+    speculation = Speculation(chess.Board(), limit(8, 0.01), None)
+    assert speculation.covers(limit(8, 0.01))
+    assert speculation.covers(limit(6, 0.005))
+    assert not speculation.covers(limit(10, 0.01))
+    assert not speculation.covers(limit(8, 0.05))
+    assert not speculation.covers(limit(time=0.01))
+    assert Speculation(chess.Board(), limit(time=0.05), None).covers(limit(time=0.01))
+
+
+def test_short_search_answers_once_it_reached_the_depth():
+    speculation = Speculation(chess.Board(), limit(8, 0.01), None)
+    assert speculation.could_answer(limit(8, 0.05))
+    assert speculation.answers(limit(8, 0.05), lines(8))
+    assert not speculation.answers(limit(8, 0.05), lines(5))
+    assert not speculation.could_answer(limit(10, 0.05))
+
+
+@pytest.fixture
+def agent(scripted):
+    agent = AsyncImprovedAgent(engine_pool_size=1)
+    agent.shard_processes = 1
+    agent.pondering = False
+    agent.handle_game_start(chess.WHITE, chess.Board(), 'opponent')
+    yield agent
+    agent.handle_game_end(None, None, GameHistory())
+
+
+def speculate(agent, search_limit) -> list:
+    """Speculative searches of the agent's belief with search_limit, waited for."""
+    agent.evaluation_limit = lambda time_per_board, depth=None: search_limit
+    move_actions = list(chess.Board().legal_moves)
+    agent.speculate(agent.possible_boards, move_actions, seconds_left=600)
+    for speculation in agent.speculations.values():
+        speculation.future.result()
+    return move_actions
+
+
+@pytest.mark.parametrize('vote_limit, reused', [
+    (limit(1, 0.01), True),   # the same limit
+    (limit(1, 0.5), True),    # more time, but the speculation already reached depth 1
+    (limit(4, 0.01), False),  # deeper than the speculation searched
+])
+def test_vote_reuses_speculation_that_answers_its_limit(agent, vote_limit, reused):
+    move_actions = speculate(agent, limit(1, 0.01))
+    boards = list(agent.possible_boards)
+    assert len(agent.speculations) == len(boards) == 1
+
+    results = agent.analyse_for_vote(boards, vote_limit, move_actions)
+    assert results[0] is not None
+    assert agent.speculation_stats['reused'] == int(reused)
+    assert not agent.speculations
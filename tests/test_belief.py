@@ -0,0 +1,60 @@
+import random
+
+import chess
+import numpy as np
+import pytest
+
+from belief import BeliefSet, board_from_row, board_key, hash_rows, sense_consistent
+from positions import random_positions, sense_window
+from sub4p2 import filter_states_by_sensing
+
+
+def test_rows_round_trip_to_boards():
+    boards = random_positions(500, 4) + [chess.Board('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2')]
+    beliefs = BeliefSet.from_boards(boards, dedup=False)
+    for board, row in zip(boards, beliefs.rows):
+        rebuilt = board_from_row(row)
+        assert rebuilt.board_fen() == board.board_fen() and rebuilt.turn == board.turn
+        assert rebuilt.castling_rights == board.clean_castling_rights()
+        assert rebuilt.has_legal_en_passant() == board.has_legal_en_passant()
+        assert board_key(rebuilt) == board_key(board)
+
+
+def test_duplicate_hypotheses_are_merged_with_their_weights():
+    boards = random_positions(100, 5)
+    keys = [board_key(board) for board in boards]
+    beliefs = BeliefSet.from_keys(keys + keys[:10], [1.0] * len(keys) + [2.0] * 10)
+    assert len(beliefs) == len(set(keys))
+    assert beliefs.weights.sum() == len(keys) + 20
+    assert len(np.unique(hash_rows(beliefs.rows))) == len(beliefs)
+
+
+def consistent_by_piece_at(board: chess.Board, sense_result) -> bool:
+    return all(board.piece_at(square) == piece for square, piece in sense_result)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_vectorized_sense_filter_matches_piece_at(seed):
+    rng = random.Random(seed)
+    boards = random_positions(2000, seed)
+    beliefs = BeliefSet.from_boards(boards, dedup=False)
+    for _ in range(20):
+        truth = rng.choice(boards)
+        sense_result = sense_window(truth, rng.choice(chess.SQUARES))
+        expected = [consistent_by_piece_at(board, sense_result) for board in boards]
+        assert sense_consistent(beliefs.rows, sense_result).tolist() == expected
+
+        survivors, eliminated = beliefs.filter_sense(sense_result)
+        assert len(survivors) == sum(expected) and eliminated == len(boards) - sum(expected)
+
+
+def test_filter_states_by_sensing_matches_per_board_check():
+    rng = random.Random(0)
+    fens = [board.fen() for board in random_positions(500, 3)]
+    for _ in range(10):
+        truth = chess.Board(rng.choice(fens))
+        sense_result = sense_window(truth, rng.choice(chess.SQUARES))
+        window = ';'.join(f"{chess.square_name(square)}:{piece.symbol() if piece else '?'}"
+                          for square, piece in sense_result)
+        expected = sorted(fen for fen in fens if consistent_by_piece_at(chess.Board(fen), sense_result))
+        assert filter_states_by_sensing(fens, window) == expected
@@ -0,0 +1,52 @@
+import threading
+
+import chess
+import pytest
+
+import engine_client
+from engine_daemon import EngineDaemon
+from engines import EnginePool
+from eval_cache import EvalCache
+
+
+def first_move(fen: str) -> str:
+    return min(move.uci() for move in chess.Board(fen).legal_moves)
+
+
+@pytest.fixture
+def daemon(scripted, tmp_path):
+    path = str(tmp_path / 'engine.sock')
+    pool = EnginePool(2, threads=1, hash_mb=16, cache=EvalCache(), warm_spare=False)
+    server = EngineDaemon(path, pool)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    pool.quit()
+
+
+def test_best_move_searches_with_the_callers_time(daemon, scripted):
+    fen = chess.Board().fen()
+    assert engine_client.best_move(fen, 0.25, daemon) == first_move(fen)
+    assert any(command.startswith('go movetime 250') for command in scripted.commands())
+
+
+def test_best_move_captures_the_king_without_searching(daemon, scripted):
+    fen = '4k3/8/8/8/8/8/4R3/4K3 w - - 0 1'
+    assert engine_client.best_move(fen, 0.1, daemon) == 'e2e8'
+    assert not any(command.startswith('go') for command in scripted.commands())
+
+
+def test_majority_move_searches_repeated_positions_once(daemon, scripted):
+    board = chess.Board()
+    board.push_uci('e2e4')
+    fens = [chess.Board().fen()] * 3 + [board.fen()]
+    assert engine_client.majority_move(fens, 0.1, daemon) == first_move(fens[0])
+    assert sum(command.startswith('go') for command in scripted.commands()) == 2
+
+
+def test_client_falls_back_when_no_daemon_answers(daemon, tmp_path):
+    assert engine_client.request({'op': 'ping'}, daemon)['engines'] == 2
+    assert engine_client.request({'op': 'nope'}, daemon) is None
+    assert engine_client.best_move(chess.Board().fen(), 0.1, str(tmp_path / 'missing.sock')) is None
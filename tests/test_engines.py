@@ -0,0 +1,110 @@
+import itertools
+import os
+import signal
+import time
+
+import chess
+import chess.engine
+import pytest
+
+import engines
+from engines import EnginePool, EngineSession, EngineSupervisor
+from eval_cache import EvalCache
+
+LIMIT = chess.engine.Limit(depth=1)
+
+
+def first_move(board: chess.Board, allowed=None) -> chess.Move:
+    moves = [move for move in board.legal_moves if allowed is None or move in allowed]
+    return min(moves, key=chess.Move.uci)
+
+
+def positions(count: int) -> list:
+    boards = []
+    board = chess.Board()
+    for move in itertools.islice(itertools.cycle(['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6']), count):
+        board.push_uci(move)
+        boards.append(board.copy())
+    return boards
+
+
+def test_session_sends_ucinewgame_once(scripted):
+    session = EngineSession(engine=scripted())
+    try:
+        for board in positions(4):
+            assert session.analyse(board, LIMIT)['pv'][0] == first_move(board)
+        assert scripted.commands().count('ucinewgame') == 1
+        session.new_game()
+        session.analyse(chess.Board(), LIMIT)
+        assert scripted.commands().count('ucinewgame') == 2
+    finally:
+        session.quit()
+
+
+def test_pool_restricts_searches_and_searches_repeats_once(scripted):
+    pool = EnginePool(2, threads=1, hash_mb=16, cache=EvalCache(), warm_spare=False)
+    boards = positions(5)
+    boards = boards + [boards[0].copy(), boards[2].copy()]
+    move_actions = [move for move in chess.Board().legal_moves if move.uci()[1] in '12']
+    try:
+        results = pool.analyse_many(boards, LIMIT, move_actions)
+    finally:
+        pool.quit()
+
+    searches = [command for command in scripted.commands() if command.startswith('go')]
+    assert len(searches) == 5
+    for board, result in zip(boards, results):
+        assert result['pv'][0] == first_move(board, engines.searchmoves(board, move_actions))
+    restricted = [board for board in boards[:5] if engines.searchmoves(board, move_actions) is not None]
+    assert restricted and sum('searchmoves' in command for command in searches) == len(restricted)
+    assert scripted.commands().count('ucinewgame') == pool.size
+
+
+def process_exists(pid: int) -> bool:
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False  # it exited and is now reaped
+    except ChildProcessError:
+        pass  # not ours to reap, or already reaped
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_dead_engine_is_replaced_and_position_retried(scripted):
+    supervisor = EngineSupervisor(scripted, warm_spare=True)
+    session = EngineSession(engine=scripted(die_after=3), supervisor=supervisor)
+    try:
+        boards = positions(5)
+        results = session.analyse_batch(boards, LIMIT)
+        assert [result['pv'][0] for result in results] == [first_move(board) for board in boards]
+        assert session.restarts == session.retries == supervisor.restarts == 1
+    finally:
+        session.quit()
+        supervisor.shutdown()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGSTOP'), reason='needs SIGSTOP')
+def test_stopped_engine_is_killed_and_replaced(scripted):
+    supervisor = EngineSupervisor(scripted, warm_spare=True, ping_timeout=0.5)
+    engine = supervisor.start()
+    stopped = engine.transport.get_pid()
+    replacement = None
+    try:
+        assert supervisor.ensure_healthy(engine) is engine
+        os.kill(stopped, signal.SIGSTOP)
+        replacement = supervisor.ensure_healthy(engine)
+        assert replacement is not engine
+        assert supervisor.failed_pings == supervisor.restarts == 1
+        assert replacement.analyse(chess.Board(), LIMIT)['pv'][0] == first_move(chess.Board())
+
+        deadline = time.monotonic() + 5
+        while process_exists(stopped) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not process_exists(stopped)
+    finally:
+        if replacement is not None:
+            replacement.quit()
+        supervisor.shutdown()
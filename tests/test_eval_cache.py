@@ -0,0 +1,70 @@
+import chess
+import chess.engine
+
+from eval_cache import EvalCache
+
+BOARD = chess.Board()
+MOVE = chess.Move.from_uci('e2e4')
+
+
+def result(depth: int) -> dict:
+    return {'depth': depth, 'pv': [MOVE], 'score': chess.engine.PovScore(chess.engine.Cp(20), chess.WHITE)}
+
+
+def key(depth=None, time=None, board=BOARD, multipv=None):
+    return EvalCache.key(board, chess.engine.Limit(depth=depth, time=time), multipv)
+
+
+def test_depth_limited_entries_hit_across_turn_times():
+    cache = EvalCache()
+    cache.put(key(8, 0.02), result(8))
+    assert cache.get(key(8, 0.05)) == result(8)
+    assert cache.get(key(6, 0.001)) == result(8)
+    assert cache.get(key(10, 0.05)) is None
+    assert cache.get(key(8)) == result(8)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_search_cut_short_only_serves_the_depth_it_reached():
+    cache = EvalCache()
+    cache.put(key(8, 0.001), result(5))
+    assert cache.get(key(8, 0.05)) is None
+    assert cache.get(key(5, 0.05)) == result(5)
+
+    lines = [result(8), result(7)]
+    cache.put(key(8, 0.01, multipv=2), lines)
+    assert cache.get(key(8, multipv=2)) is None
+    assert cache.get(key(7, multipv=2)) == lines
+
+
+def test_shallower_search_does_not_replace_a_deeper_one():
+    cache = EvalCache()
+    cache.put(key(10), result(10))
+    cache.put(key(6), result(6))
+    assert cache.get(key(6)) == result(10)
+    cache.put(key(12), result(12))
+    assert cache.get(key(10)) == result(12)
+
+
+def test_time_limited_entries_are_keyed_on_time():
+    cache = EvalCache()
+    cache.put(key(time=0.01), result(4))
+    assert cache.get(key(time=0.01)) == result(4)
+    assert cache.get(key(time=0.02)) is None
+    assert cache.get(key(4)) is None
+    cache.put(key(4), result(4))
+    assert cache.get(key(time=0.02)) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EvalCache(max_entries=2)
+    boards = [chess.Board(), chess.Board(), chess.Board()]
+    boards[1].push(MOVE)
+    boards[2].push_uci('d2d4')
+    cache.put(key(8, board=boards[0]), result(8))
+    cache.put(key(8, board=boards[1]), result(8))
+    assert cache.get(key(8, board=boards[0])) is not None
+    cache.put(key(8, board=boards[2]), result(8))
+    assert cache.get(key(8, board=boards[1])) is None
+    assert cache.get(key(8, board=boards[0])) is not None
+    assert cache.evictions == 1 and len(cache) == 2
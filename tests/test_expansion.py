@@ -0,0 +1,93 @@
+import random
+
+import chess
+import numpy as np
+import pytest
+
+from belief import BeliefSet
+from expansion import ExpansionStats, LazyExpansion, castling_moves, child_key, child_keys
+from move_model import move_priors
+from positions import random_positions, sense_window
+
+
+def expansion_moves(board: chess.Board) -> list:
+    return list(board.generate_pseudo_legal_moves()) + [chess.Move.null()] + \
+        list(castling_moves(board, board.turn))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_child_keys_match_push_and_pop(seed):
+    for board in random_positions(1500, seed):
+        moves = expansion_moves(board)
+        expected = [child_key(board, move) for move in moves]
+        assert list(child_keys(board, moves)) == expected, board.fen()
+
+
+def test_king_capture_clears_castling_rights():
+    board = chess.Board('r3k2r/8/8/8/8/8/4Q3/R3K2R w KQkq - 0 1')
+    move = chess.Move.from_uci('e2e8')
+    assert list(child_keys(board, [move])) == [child_key(board, move)]
+
+
+def rows(beliefs: BeliefSet) -> dict:
+    weights = beliefs.weights if beliefs.weights is not None else np.ones(len(beliefs))
+    return dict(zip(map(tuple, beliefs.rows.tolist()), weights.tolist()))
+
+
+@pytest.mark.parametrize('move_model', [None, move_priors])
+@pytest.mark.parametrize('seed', range(3))
+def test_lazy_filter_sense_matches_expand_then_filter(seed, move_model):
+    rng = random.Random(seed)
+    parents = BeliefSet.from_boards(board for board in random_positions(400, seed) if board.turn == chess.BLACK)
+    if move_model is not None:
+        parents = BeliefSet(parents.rows, [rng.random() + 0.1 for _ in range(len(parents))], dedup=False)
+    children = LazyExpansion(parents, chess.BLACK, move_model=move_model).materialize()
+
+    for _ in range(10):
+        truth = children.board(rng.randrange(len(children)))
+        sense_result = sense_window(truth, rng.choice(chess.SQUARES))
+        expected = rows(children.filter_sense(sense_result)[0])
+        lazy = rows(LazyExpansion(parents, chess.BLACK, move_model=move_model).filter_sense(sense_result))
+        assert lazy.keys() == expected.keys()
+        assert np.allclose([lazy[key] for key in expected], list(expected.values()))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_lazy_capture_filter_sense_matches_expand_then_filter(seed):
+    rng = random.Random(seed)
+    boards = [board for board in random_positions(1500, seed) if board.turn == chess.BLACK]
+    parents = BeliefSet.from_boards(boards)
+    captures = [move.to_square for board in boards for move in board.generate_pseudo_legal_captures()]
+    for capture_square in rng.sample(captures, 5):
+        children = LazyExpansion(parents, chess.BLACK, capture_square).materialize()
+        truth = children.board(rng.randrange(len(children)))
+        sense_result = sense_window(truth, capture_square)
+        expected = rows(children.filter_sense(sense_result)[0])
+        assert rows(LazyExpansion(parents, chess.BLACK, capture_square).filter_sense(sense_result)) == expected
+
+
+def test_has_children_does_not_expand():
+    parents = BeliefSet.from_boards(board for board in random_positions(300, 5) if board.turn == chess.BLACK)
+    quiet = LazyExpansion(parents, chess.BLACK)
+    assert quiet.has_children() and quiet._complete is None
+    assert not LazyExpansion(BeliefSet(), chess.BLACK).has_children()
+
+    board = next(board for board in parents if any(board.generate_pseudo_legal_captures()))
+    parent = BeliefSet.from_boards([board])
+    capture_square = next(board.generate_pseudo_legal_captures()).to_square
+    assert LazyExpansion(parent, chess.BLACK, capture_square).has_children()
+    quiet_square = next(square for square in chess.SQUARES if not board.is_attacked_by(chess.BLACK, square))
+    assert not LazyExpansion(parent, chess.BLACK, quiet_square).has_children()
+
+
+def test_filter_sense_after_materialize_reports_stats():
+    parents = BeliefSet.from_boards(board for board in random_positions(300, 6) if board.turn == chess.BLACK)
+    expansion = LazyExpansion(parents, chess.BLACK)
+    expanded = ExpansionStats()
+    children = expansion.materialize(expanded)
+    sense_result = sense_window(children.board(0), chess.E5)
+
+    stats = ExpansionStats()
+    survivors = expansion.filter_sense(sense_result, stats)
+    assert stats.generated == expanded.generated and stats.duplicates == expanded.duplicates
+    assert stats.rejected == len(children) - len(survivors) > 0
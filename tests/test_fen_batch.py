@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import chess
+import pytest
+
+import fen_batch
+from positions import random_positions, sense_window
+from sub2p2 import generate_all_possible_next_states
+from sub3p2 import generate_next_states_with_capture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def window(board: chess.Board, square: int) -> str:
+    return ';'.join(f'{chess.square_name(square)}:{piece.symbol() if piece else "?"}'
+                    for square, piece in sense_window(board, square))
+
+
+def queries(count: int) -> list:
+    boards = random_positions(count, 7)
+    fens = [board.fen() for board in boards]
+    lines = []
+    for index, board in enumerate(boards):
+        lines.append({'op': 'generate_all_possible_next_states', 'fen': fens[index], 'id': index})
+        move = next(iter(board.pseudo_legal_moves), None)
+        if move is not None:
+            lines.append({'op': 'execute_move', 'fen': fens[index], 'move_uci': move.uci()})
+        capture = next(board.generate_pseudo_legal_captures(), None)
+        if capture is not None:
+            lines.append({'op': 'generate_next_states_with_capture', 'fen': fens[index],
+                          'capture_square': chess.square_name(capture.to_square)})
+    lines.append({'op': 'filter_states_by_sensing', 'fen_list': fens, 'sensing_window': window(boards[0], chess.E4)})
+    return lines
+
+
+def answers(lines: list, workers: int = 1) -> list:
+    sink = io.StringIO()
+    fen_batch.run(io.StringIO(''.join(json.dumps(line) + '\n' for line in lines)), sink, workers, chunk_size=4)
+    return [json.loads(line) for line in sink.getvalue().splitlines()]
+
+
+def test_batch_answers_match_the_single_query_functions():
+    lines = queries(40)
+    for line, answer in zip(lines, answers(lines), strict=True):
+        args = {name: value for name, value in line.items() if name not in ('op', 'id')}
+        expected = fen_batch.OPERATIONS[line['op']](**args)
+        assert answer == ({'id': line['id']} if 'id' in line else {}) | {'result': json.loads(json.dumps(expected))}
+
+
+def test_workers_keep_input_order():
+    lines = queries(40)
+    assert answers(lines, workers=2) == answers(lines)
+
+
+def test_bad_queries_answer_with_an_error():
+    result = answers([{'op': 'nope', 'id': 1}, {'op': 'generate_all_possible_next_states', 'fen': 'bad'}])
+    assert result[0] == {'id': 1, 'error': "unknown op 'nope'"}
+    assert result[1]['error'].startswith('ValueError')
+
+
+def copy_and_push(board: chess.Board, moves) -> list:
+    states = set()
+    for move in moves:
+        child = board.copy()
+        child.push(move)
+        states.add(child.fen())
+    return sorted(states)
+
+
+def test_next_states_match_copy_and_push():
+    for board in random_positions(200, 8):
+        states = generate_all_possible_next_states(board.fen())
+        assert set(copy_and_push(board, board.generate_pseudo_legal_moves())) <= set(states)
+        captures = list(board.generate_pseudo_legal_captures())
+        if captures:
+            square = captures[0].to_square
+            expected = copy_and_push(board, [move for move in captures if move.to_square == square])
+            assert generate_next_states_with_capture(board.fen(), chess.square_name(square)) == expected
+
+
+@pytest.mark.parametrize('script', ['sub1p3', 'sub2p3', 'sub2p2', 'sub3p2', 'sub4p2'])
+def test_scripts_start_without_numpy_or_the_engine(script):
+    check = f'import sys, {script}; print(any(name in sys.modules for name in ("numpy", "chess.engine")))'
+    output = subprocess.run([sys.executable, '-c', check], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
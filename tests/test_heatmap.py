@@ -0,0 +1,63 @@
+import chess
+import numpy as np
+import pytest
+
+import heatmap
+from belief import BeliefSet
+from heatmap import PieceHeatmap
+from positions import random_positions
+
+
+def counts_by_piece_at(boards, color: chess.Color, weights=None) -> np.ndarray:
+    counts = np.zeros((64, 6))
+    for index, board in enumerate(boards):
+        for square, piece in board.piece_map().items():
+            if piece.color == color:
+                counts[square, piece.piece_type - 1] += 1 if weights is None else weights[index]
+    return counts
+
+
+@pytest.mark.parametrize('color', chess.COLORS)
+def test_rebuild_matches_piece_at_counts(color, monkeypatch):
+    monkeypatch.setattr(heatmap, 'CHUNK_ROWS', 64)  # several chunks
+    beliefs = BeliefSet.from_boards(random_positions(300, 1))
+    pieces = PieceHeatmap(color)
+    pieces.rebuild(beliefs.rows)
+    assert np.array_equal(pieces.counts, counts_by_piece_at(beliefs, color))
+    assert pieces.total == len(beliefs)
+
+    weights = np.random.default_rng(1).random(len(beliefs))
+    pieces.rebuild(beliefs.rows, weights)
+    assert np.allclose(pieces.counts, counts_by_piece_at(beliefs, color, weights))
+    assert np.isclose(pieces.total, weights.sum())
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_refresh_after_removal_matches_rebuild(weighted):
+    beliefs = BeliefSet.from_boards(random_positions(400, 2))
+    if weighted:
+        beliefs.weights = np.random.default_rng(2).random(len(beliefs))
+        beliefs.weights /= beliefs.weights.sum()
+    pieces = PieceHeatmap(chess.BLACK)
+    pieces.refresh(beliefs)
+
+    keep = np.arange(len(beliefs)) % 3 != 0
+    removed, kept = beliefs.select(~keep), beliefs.select(keep)
+    if weighted:
+        kept.weights = kept.weights / kept.weights.sum()
+    pieces.refresh(kept, removed)
+
+    expected = PieceHeatmap(chess.BLACK)
+    expected.refresh(kept)
+    assert np.allclose(pieces.probabilities(), expected.probabilities())
+    assert np.allclose(pieces.any_piece(), expected.any_piece())
+
+
+def test_log_likelihood_sums_log_marginals():
+    beliefs = BeliefSet.from_boards(random_positions(200, 3))
+    pieces = PieceHeatmap(chess.WHITE)
+    pieces.rebuild(beliefs.rows)
+    log_probabilities = np.log(np.maximum(pieces.probabilities(), 1e-9))
+    expected = [sum(log_probabilities[square, piece.piece_type - 1] for square, piece in board.piece_map().items()
+                    if piece.color == chess.WHITE) for board in beliefs]
+    assert np.allclose(pieces.log_likelihood(beliefs.rows), expected)
@@ -0,0 +1,50 @@
+import json
+import threading
+
+from metrics import Metrics
+
+
+def record_without_turn(metrics: Metrics):
+    metrics.count('calls')
+    metrics.set('boards', 3)
+    metrics.add_time('play', 0.5)
+
+
+def run_with_timeout(target, *args, timeout: float = 5.0):
+    worker = threading.Thread(target=target, args=args, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    assert not worker.is_alive(), 'recording a metric deadlocked'
+
+
+def test_records_before_first_turn(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics = Metrics(str(path))
+    run_with_timeout(record_without_turn, metrics)
+    metrics.flush()
+
+    turn, game = [json.loads(line) for line in path.read_text().splitlines()]
+    assert turn['turn'] is None
+    assert turn['counters'] == {'calls': 1}
+    assert turn['values'] == {'boards': 3}
+    assert game['turns'] == 1 and game['totals'] == {'calls': 1}
+
+
+def test_records_after_flush(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics = Metrics(str(path))
+    metrics.start_turn(1)
+    metrics.count('calls')
+    metrics.flush()
+    run_with_timeout(record_without_turn, metrics)
+    metrics.flush()
+
+    games = [json.loads(line) for line in path.read_text().splitlines() if json.loads(line)['type'] == 'game']
+    assert [game['totals'] for game in games] == [{'calls': 1}, {'calls': 1}]
+
+
+def test_disabled_records_nothing():
+    metrics = Metrics()
+    record_without_turn(metrics)
+    metrics.flush()
+    assert metrics.turns == []
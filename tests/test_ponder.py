@@ -0,0 +1,87 @@
+import chess
+import chess.engine
+import pytest
+from reconchess import GameHistory
+from reconchess.utilities import move_actions as available_moves
+
+from belief import BeliefSet
+from engines import EnginePool
+from eval_cache import EvalCache
+from expansion import LazyExpansion
+from ImprovedAgent import ImprovedAgent
+from ponder import Ponder
+from positions import random_positions
+
+LIMIT = chess.engine.Limit(depth=1)
+
+
+def after(*moves) -> chess.Board:
+    board = chess.Board()
+    for move in moves:
+        board.push_uci(move)
+    return board
+
+
+def searches(scripted) -> int:
+    return sum(command.startswith('go') for command in scripted.commands())
+
+
+@pytest.fixture
+def pool(scripted):
+    pool = EnginePool(2, threads=1, hash_mb=16, cache=EvalCache(), warm_spare=False)
+    yield pool
+    pool.quit()
+
+
+def test_ponder_expands_and_searches_the_likeliest_children(pool, scripted):
+    parents = BeliefSet.from_boards([after('e2e4')])
+    expansion = LazyExpansion(parents, chess.BLACK)
+    ponder = Ponder(parents, expansion, pool, LIMIT, boards=4).start()
+    ponder._thread.join()  # let it finish before the opponent "moves"
+    assert ponder.stop() is expansion
+    assert ponder.expanded and ponder.searched == 4
+    assert searches(scripted) == 4 and len(pool.cache) == 4
+    assert len(expansion.materialize()) == ponder.stats.generated - ponder.stats.duplicates
+
+
+def test_stopped_ponder_returns_nothing(pool, scripted):
+    parents = BeliefSet.from_boards(board for board in random_positions(2000, 1) if board.turn == chess.BLACK)
+    ponder = Ponder(parents, LazyExpansion(parents, chess.BLACK), pool, LIMIT, boards=4)
+    ponder._stop.set()  # the opponent moved before pondering got going
+    assert ponder.start().stop() is None
+    assert not ponder.expanded and ponder.searched == 0 and searches(scripted) == 0
+
+
+@pytest.fixture
+def agent(scripted):
+    agent = ImprovedAgent(engine_pool_size=1)
+    agent.shard_processes = 1
+    agent.ponder_depth = 1
+    agent.ponder_boards = 4
+    agent.handle_game_start(chess.WHITE, chess.Board(), 'opponent')
+    yield agent
+    agent.handle_game_end(None, None, GameHistory())
+
+
+def test_vote_reuses_pondered_searches(agent, scripted):
+    agent.possible_boards = agent.initial_beliefs([after('e2e4')])
+    agent.start_pondering()
+    agent.ponder._thread.join()
+    expansion = agent.stop_pondering()
+    assert expansion is not None and agent.ponder_stats['searched'] == 4
+    pondered = searches(scripted)
+
+    boards = list(expansion.materialize())
+    move_actions = available_moves(boards[0])
+    results = agent.analyse_for_vote(boards, agent.evaluation_limit(0.01, 1), move_actions)
+    assert all(result is not None for result in results)
+    assert agent.ponder_stats['reused'] == 4
+    assert searches(scripted) - pondered == len(boards) - 4
+
+
+def test_pondered_expansion_is_dropped_when_the_belief_changed(agent):
+    agent.possible_boards = agent.initial_beliefs([after('e2e4')])
+    agent.start_pondering()
+    agent.possible_boards = agent.initial_beliefs([after('d2d4')])
+    assert agent.stop_pondering() is None
+    assert agent.ponder_stats['turns'] == 1 and agent.ponder_stats['expanded'] == 0
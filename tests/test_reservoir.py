@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import pytest
+
+from belief import BeliefSet, ROW_BYTES, board_key, rows_for_memory
+from expansion import ExpansionStats, Reservoir, collect
+from positions import random_positions
+
+
+def keys(count: int, seed: int) -> list:
+    return list(dict.fromkeys(board_key(board) for board in random_positions(count, seed)))
+
+
+def rows(belief: BeliefSet) -> set:
+    return {tuple(row) for row in belief.rows.tolist()}
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_large_reservoir_keeps_everything(weighted):
+    unique = keys(300, 1)
+    stream = unique + unique[:50]
+    items = [(key, 1.0) for key in stream] if weighted else stream
+    expected = collect(items, weighted=weighted)
+    stats = ExpansionStats()
+    sampled = collect(items, weighted=weighted, reservoir=1000, stats=stats)
+    assert rows(sampled) == rows(expected)
+    assert stats.duplicates == 50 and stats.dropped == 0 and stats.dropped_mass == 0
+    if weighted:
+        assert sorted(sampled.weights) == sorted(expected.weights)
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_small_reservoir_keeps_a_sample(weighted):
+    unique = keys(300, 2)
+    items = [(key, 1.0) for key in unique] if weighted else unique
+    stats = ExpansionStats()
+    sampled = collect(items, weighted=weighted, reservoir=100, stats=stats)
+    assert len(sampled) == 100 and rows(sampled) <= set(unique)
+    assert stats.dropped == len(unique) - 100
+    assert np.isclose(stats.dropped_mass, 1 - 100 / len(unique))
+
+
+def test_duplicates_of_sampled_children_add_their_weight():
+    sample = Reservoir(2, weighted=True)
+    first, second, other = keys(10, 3)[:3]
+    sample.offer(first, 0.25)
+    sample.offer(second, 0.5)
+    assert sample.merge(first, 0.25)
+    assert not sample.merge(other, 1.0)
+    belief = sample.belief_set(ExpansionStats())
+    assert sorted(belief.weights) == [0.5, 0.5]
+
+
+def test_unweighted_reservoir_is_uniform():
+    random.seed(5)
+    stream = keys(30, 5)[:10]
+    kept = np.zeros(len(stream))
+    trials = 4000
+    for _ in range(trials):
+        sample = Reservoir(3)
+        for key in stream:
+            sample.offer(key, None)
+        for row in sample.belief_set(ExpansionStats()).rows.tolist():
+            kept[stream.index(tuple(row))] += 1
+    assert np.allclose(kept / trials, 0.3, atol=0.04)
+
+
+def test_weighted_reservoir_favours_heavy_children():
+    random.seed(6)
+    light, heavy = keys(10, 6)[:2]
+    trials = 4000
+    heavy_kept = 0
+    for _ in range(trials):
+        sample = Reservoir(1, weighted=True)
+        sample.offer(light, 1.0)
+        sample.offer(heavy, 9.0)
+        heavy_kept += tuple(sample.belief_set(ExpansionStats()).rows[0].tolist()) == heavy
+    assert abs(heavy_kept / trials - 0.9) < 0.03
+
+
+def test_prune_keeps_the_heaviest_covering_the_mass():
+    belief = BeliefSet(np.array(keys(20, 7)[:4], dtype=np.uint64), [0.5, 0.1, 0.3, 0.1])
+    assert rows(belief.prune(mass=0.75)) == rows(belief.select(np.array([0, 2])))
+    assert rows(belief.prune(max_count=1)) == rows(belief.select(np.array([0])))
+    assert belief.prune(mass=1.0) is belief
+    assert len(BeliefSet(belief.rows).prune(max_count=1)) == 4  # unweighted beliefs have no tail
+
+
+def test_rows_for_memory():
+    assert rows_for_memory(1) < 2 ** 20 // ROW_BYTES
+    assert rows_for_memory(1, weighted=True) < rows_for_memory(1)
+    assert rows_for_memory(0) == 1
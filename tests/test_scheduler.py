@@ -0,0 +1,31 @@
+import pytest
+
+from scheduler import MoveScheduler
+
+
+@pytest.mark.parametrize('seconds_left', [0.0, 5.0, 10.0])
+def test_plan_at_low_clock_still_searches_one_board(seconds_left):
+    scheduler = MoveScheduler()
+    plan = scheduler.plan(500, seconds_left, move_num=30, engines=4)
+    assert plan.budget == 0
+    assert plan.boards == 1
+    assert plan.time_per_board == scheduler.min_time_per_board
+    assert plan.depth == scheduler.shallow_depth
+
+
+def test_plan_fits_the_budget():
+    scheduler = MoveScheduler()
+    plan = scheduler.plan(10000, 300.0, move_num=10, engines=2)
+    assert plan.budget == pytest.approx((300 - scheduler.reserve_seconds) / 40 * scheduler.move_phase_share)
+    assert plan.boards == 2 * scheduler.max_boards_per_engine
+    assert plan.boards * plan.time_per_board <= plan.budget * 2 + 1e-9
+    assert plan.batch_size == 2 * scheduler.batches_per_engine
+
+
+def test_plan_gives_small_beliefs_more_time_per_board():
+    scheduler = MoveScheduler()
+    plan = scheduler.plan(3, 300.0, move_num=10)
+    assert plan.boards == 3
+    assert plan.time_per_board == scheduler.max_time_per_board
+    assert plan.depth == scheduler.full_depth
+    assert scheduler.plan(0, 300.0, move_num=10).boards == 0
@@ -0,0 +1,58 @@
+import collections
+import math
+
+import chess
+import numpy as np
+import pytest
+
+import sense_planner
+from belief import BeliefSet
+from positions import random_positions, sense_window
+from sense_planner import score_sense_squares
+from sense_tables import INTERIOR_SQUARES
+
+
+def observation_groups(boards, square: int, weights) -> list:
+    """(hypotheses, probability mass) of each distinct sense result of square."""
+    groups = collections.defaultdict(lambda: [0, 0.0])
+    for board, weight in zip(boards, weights):
+        group = groups[tuple(sense_window(board, square))]
+        group[0] += 1
+        group[1] += weight
+    return list(groups.values())
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_unweighted_scores_match_per_square_grouping(seed, monkeypatch):
+    monkeypatch.setattr(sense_planner, 'CHUNK_ROWS', 100)
+    beliefs = BeliefSet.from_boards(random_positions(500, seed))
+    boards = list(beliefs)
+    squares = list(INTERIOR_SQUARES)
+    states, entropy = score_sense_squares(beliefs.rows, squares)
+    for index, square in enumerate(squares):
+        groups = observation_groups(boards, square, [1] * len(boards))
+        assert np.isclose(states[index], sum(count * count for count, _ in groups) / len(boards))
+        assert np.isclose(entropy[index], sum(count * math.log2(count) for count, _ in groups) / len(boards))
+
+
+def test_weighted_scores_match_per_square_grouping():
+    beliefs = BeliefSet.from_boards(random_positions(400, 3))
+    boards = list(beliefs)
+    weights = np.random.default_rng(3).random(len(boards))
+    probabilities = weights / weights.sum()
+    squares = [chess.B2, chess.E4, chess.G7]
+    states, entropy = score_sense_squares(beliefs.rows, squares, weights)
+    prior = -sum(p * math.log2(p) for p in probabilities)
+    for index, square in enumerate(squares):
+        groups = observation_groups(boards, square, probabilities)
+        assert np.isclose(states[index], sum(count * mass for count, mass in groups))
+        assert np.isclose(entropy[index], prior + sum(mass * math.log2(mass) for _, mass in groups))
+
+
+def test_uniform_weights_give_the_unweighted_scores():
+    beliefs = BeliefSet.from_boards(random_positions(300, 4))
+    squares = list(INTERIOR_SQUARES)
+    states, entropy = score_sense_squares(beliefs.rows, squares)
+    weighted_states, weighted_entropy = score_sense_squares(beliefs.rows, squares, np.ones(len(beliefs)))
+    assert np.allclose(states, weighted_states)
+    assert np.allclose(entropy, weighted_entropy)
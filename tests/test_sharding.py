@@ -0,0 +1,114 @@
+import os
+
+import chess
+import numpy as np
+
+from belief import BeliefSet
+from expansion import ExpansionStats, LazyExpansion
+from move_model import move_priors
+from positions import random_positions, sense_window
+from sharding import ShardPool, ShardedExpansion, default_shard_processes, merge_shards
+
+
+def positions(count: int, seed: int, weighted: bool = False) -> BeliefSet:
+    """count distinct positions."""
+    belief = BeliefSet.from_boards(random_positions(2 * count, seed)).select(np.arange(count))
+    if weighted:
+        belief.weights = np.random.default_rng(seed).random(len(belief))
+    return belief
+
+
+def rows(belief: BeliefSet) -> set:
+    return {tuple(row) for row in belief.rows.tolist()}
+
+
+def part(belief: BeliefSet, stats: ExpansionStats = None) -> tuple:
+    offered = float(belief.weights.sum()) if belief.weights is not None else float(len(belief))
+    return belief, stats or ExpansionStats(), offered
+
+
+def test_default_shard_processes_uses_every_core(monkeypatch):
+    monkeypatch.delenv('RBC_SHARD_PROCESSES', raising=False)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    assert default_shard_processes() == 8
+    monkeypatch.setenv('RBC_SHARD_PROCESSES', '1')
+    assert default_shard_processes() == 1
+
+
+def test_multi_core_agent_starts_a_shard_pool(scripted, monkeypatch):
+    from ImprovedAgent import ImprovedAgent
+    monkeypatch.delenv('RBC_SHARD_PROCESSES', raising=False)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+    agent = ImprovedAgent(engine_pool_size=1)
+    agent.handle_game_start(chess.WHITE, chess.Board(), 'opponent')
+    try:
+        assert agent.shard_pool is not None and agent.shard_pool.processes == 2
+    finally:
+        if agent.shard_pool is not None:
+            agent.shard_pool.shutdown()
+        agent.engine_pool.quit()
+
+
+def test_merge_shards_deduplicates_across_shards():
+    whole = positions(300, 1)
+    first, second = whole.select(np.arange(0, 200)), whole.select(np.arange(100, 300))
+    shard_stats = ExpansionStats()
+    shard_stats.generated, shard_stats.duplicates = 250, 50
+    stats = ExpansionStats()
+    merged = merge_shards([part(first, shard_stats), part(second)], None, False, stats)
+    assert rows(merged) == rows(whole) and len(merged) == len(whole)
+    assert stats.generated == 250
+    assert stats.duplicates == 50 + 100
+
+
+def test_merge_shards_adds_up_the_weights_of_shared_children():
+    whole = positions(300, 2, weighted=True)
+    first, second = whole.select(np.arange(0, 200)), whole.select(np.arange(100, 300))
+    merged = merge_shards([part(first), part(second)], None, True, ExpansionStats())
+    assert len(merged) == len(whole)
+    order = {row: index for index, row in enumerate(map(tuple, whole.rows.tolist()))}
+    for row, weight in zip(merged.rows.tolist(), merged.weights):
+        index = order[tuple(row)]
+        assert np.isclose(weight, whole.weights[index] * (2 if 100 <= index < 200 else 1))
+
+
+def test_merge_shards_caps_unweighted_children():
+    whole = positions(400, 3)
+    first, second = whole.select(np.arange(0, 300)), whole.select(np.arange(300, 400))
+    stats = ExpansionStats()
+    merged = merge_shards([part(first), part(second)], 100, False, stats)
+    assert len(merged) == 100 and rows(merged) <= rows(whole)
+    assert stats.dropped == len(whole) - 100
+    assert np.isclose(stats.dropped_mass, 300 / 400)
+
+
+def test_merge_shards_caps_weighted_children():
+    whole = positions(400, 4, weighted=True)
+    first, second = whole.select(np.arange(0, 200)), whole.select(np.arange(200, 400))
+    stats = ExpansionStats()
+    merged = merge_shards([part(first), part(second)], 100, True, stats)
+    assert len(merged) == 100 and rows(merged) <= rows(whole)
+    assert stats.dropped == len(whole) - 100
+    assert np.isclose(stats.dropped_mass, 1 - merged.weights.sum() / whole.weights.sum())
+
+
+def test_shard_pool_matches_in_process_expansion():
+    parents = BeliefSet.from_boards(board for board in random_positions(600, 5) if board.turn == chess.BLACK)
+    pool = ShardPool(2, min_shard_parents=50)
+    try:
+        for move_model in (None, move_priors):
+            expected = LazyExpansion(parents, chess.BLACK, move_model=move_model).materialize()
+            sharded = ShardedExpansion(parents, chess.BLACK, move_model=move_model, pool=pool)
+            children = sharded.materialize()
+            assert rows(children) == rows(expected)
+            if move_model is not None:
+                order = {row: index for index, row in enumerate(map(tuple, expected.rows.tolist()))}
+                indices = [order[tuple(row)] for row in children.rows.tolist()]
+                assert np.allclose(children.weights, expected.weights[indices])
+
+            sense_result = sense_window(expected.board(0), chess.D5)
+            filtered = ShardedExpansion(parents, chess.BLACK, move_model=move_model, pool=pool)
+            assert rows(filtered.filter_sense(sense_result)) == rows(expected.filter_sense(sense_result)[0])
+        assert pool.sharded == 4
+    finally:
+        pool.shutdown()
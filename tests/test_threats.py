@@ -0,0 +1,42 @@
+import chess
+import numpy as np
+import pytest
+
+from belief import BeliefSet
+from positions import random_positions
+from threats import check_threats, threat_heatmap
+
+
+def threats_by_attackers_mask(board: chess.Board, color: chess.Color) -> int:
+    king = board.king(color)
+    if king is None:
+        return 0
+    attackers = board.attackers_mask(not color, king)
+    mask = attackers
+    for attacker in chess.scan_forward(attackers):
+        mask |= chess.between(attacker, king)
+    return mask
+
+
+@pytest.mark.parametrize('color', chess.COLORS)
+@pytest.mark.parametrize('seed', range(3))
+def test_check_threats_match_attackers_mask(seed, color):
+    boards = random_positions(3000, seed)
+    in_check, threats = check_threats(BeliefSet.from_boards(boards, dedup=False).rows, color)
+    expected = [threats_by_attackers_mask(board, color) for board in boards]
+    assert threats.tolist() == expected
+    assert in_check.tolist() == [mask != 0 for mask in expected]
+
+
+def test_threat_heatmap_weights_each_board():
+    boards = random_positions(500, 7)
+    beliefs = BeliefSet.from_boards(boards, dedup=False)
+    weights = np.linspace(1, 2, len(boards))
+    check_probability, heat = threat_heatmap(beliefs.rows, chess.WHITE, weights)
+
+    probabilities = weights / weights.sum()
+    masks = [threats_by_attackers_mask(board, chess.WHITE) for board in boards]
+    assert check_probability == pytest.approx(sum(p for p, mask in zip(probabilities, masks) if mask))
+    expected = [sum(p for p, mask in zip(probabilities, masks) if mask & chess.BB_SQUARES[square])
+                for square in chess.SQUARES]
+    assert np.allclose(heat, expected)
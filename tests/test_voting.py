@@ -0,0 +1,60 @@
+import time
+
+import chess
+import chess.engine
+
+from voting import MATE_SHARE, AnytimeVote
+
+BOARD = chess.Board()
+QUIET = chess.Move.from_uci('e2e4')
+MATING = chess.Move.from_uci('d2d4')
+MOVE_ACTIONS = [QUIET, MATING]
+
+
+def line(move: chess.Move, score: chess.engine.Score) -> list:
+    return [{'multipv': 1, 'pv': [move], 'score': chess.engine.PovScore(score, chess.WHITE)}]
+
+
+def run_vote(results: list, batch_size: int = 1, decided=None, deadline=None) -> tuple:
+    searched = []
+
+    def analyse_batch(batch, depth):
+        start = len(searched)
+        searched.extend(batch)
+        return results[start:start + len(batch)]
+
+    vote = AnytimeVote(MOVE_ACTIONS)
+    leader = vote.run([BOARD] * len(results), analyse_batch, [8], batch_size, deadline=deadline, decided=decided)
+    return vote, leader, len(searched)
+
+
+def test_late_mates_are_not_skipped():
+    # The quiet lead after the first 21 boards (63) exceeds what 19 plain votes could overturn (57)
+    results = [line(QUIET, chess.engine.Cp(50))] * 21 + [line(MATING, chess.engine.Mate(1))] * 19
+    vote, leader, searched = run_vote(results)
+    assert searched == len(results)
+    assert leader == MATING
+
+
+def test_decided_callback_waits_for_mates():
+    results = [line(QUIET, chess.engine.Cp(50))] * 21 + [line(MATING, chess.engine.Mate(2))] * 19
+    vote, leader, searched = run_vote(results, decided=lambda vote, remaining: True)
+    assert searched == len(results)
+    assert leader == MATING
+
+
+def test_stops_early_when_mates_cannot_reach_share():
+    boards = 200
+    results = [line(QUIET, chess.engine.Cp(50))] * boards
+    vote, leader, searched = run_vote(results)
+    assert leader == QUIET
+    assert searched < boards
+    # Stopped only once the unsearched boards could no longer reach the mate share
+    assert boards - searched < boards * MATE_SHARE
+
+
+def test_spent_budget_still_runs_one_batch():
+    results = [line(QUIET, chess.engine.Cp(50))] * 10
+    vote, leader, searched = run_vote(results, batch_size=4, deadline=time.monotonic() - 1)
+    assert searched == 4
+    assert leader == QUIET
@@ -0,0 +1,89 @@
+import chess
+import numpy as np
+from typing import Optional, Tuple
+
+from belief import plane_index
+
+_ONE = np.uint64(1)
+
+# (file step, rank step) of the eight sliding directions; the first four run towards higher square indices
+_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1))
+_ORTHOGONAL = (True, True, False, False, True, True, False, False)
+
+
+def _ray(square: int, file_step: int, rank_step: int) -> int:
+    mask = 0
+    file, rank = chess.square_file(square) + file_step, chess.square_rank(square) + rank_step
+    while 0 <= file < 8 and 0 <= rank < 8:
+        mask |= chess.BB_SQUARES[chess.square(file, rank)]
+        file, rank = file + file_step, rank + rank_step
+    return mask
+
+
+# DIRECTION_RAYS[d, square]: squares beyond square in direction d, up to the board edge
+DIRECTION_RAYS = np.array([[_ray(square, *step) for square in chess.SQUARES] for step in _DIRECTIONS], dtype=np.uint64)
+KNIGHT_ATTACKS = np.array(chess.BB_KNIGHT_ATTACKS, dtype=np.uint64)
+KING_ATTACKS = np.array(chess.BB_KING_ATTACKS, dtype=np.uint64)
+PAWN_ATTACKS = np.array(chess.BB_PAWN_ATTACKS, dtype=np.uint64)  # [color, square]
+
+
+def _lowest_bit(masks: np.ndarray) -> np.ndarray:
+    return masks & (~masks + _ONE)
+
+
+def _highest_bit(masks: np.ndarray) -> np.ndarray:
+    smeared = masks.copy()
+    for shift in (1, 2, 4, 8, 16, 32):
+        smeared |= smeared >> np.uint64(shift)
+    return smeared ^ (smeared >> _ONE)
+
+
+def _square_of(bits: np.ndarray) -> np.ndarray:
+    """Index of the single set bit of each mask (exact, since powers of two convert to float exactly)."""
+    return (np.frexp(bits.astype(np.float64))[1] - 1).astype(np.intp)
+
+
+def check_threats(rows: np.ndarray, color: chess.Color) -> Tuple[np.ndarray, np.ndarray]:
+    """Which hypotheses have color's king attacked, and each one's threat mask.
+
+    The threat mask holds the attacking pieces plus, for sliding attackers, the squares between
+    them and the king, i.e. the squares a sense would have to see to confirm the check. Side to
+    move is ignored, as if color were to move on every board.
+    """
+    own, opponent = plane_index(chess.PAWN, color), plane_index(chess.PAWN, not color)
+    kings = rows[:, own + chess.KING - 1]
+    has_king = kings != 0
+    king_square = np.where(has_king, _square_of(np.where(has_king, kings, _ONE)), 0)
+
+    pawns, knights, bishops, rooks, queens, king = (rows[:, opponent + offset] for offset in range(6))
+    occupied = np.bitwise_or.reduce(rows[:, :12], axis=1)
+
+    threats = (KNIGHT_ATTACKS[king_square] & knights) | (KING_ATTACKS[king_square] & king) \
+        | (PAWN_ATTACKS[int(color)][king_square] & pawns)
+    for direction, orthogonal in enumerate(_ORTHOGONAL):
+        ray = DIRECTION_RAYS[direction][king_square]
+        blockers = ray & occupied
+        if direction < 4:
+            first = _lowest_bit(blockers)
+            between = ray & (first - _ONE)
+        else:
+            first = _highest_bit(blockers)
+            between = ray & ~((first << _ONE) - _ONE)
+        sliders = (rooks if orthogonal else bishops) | queens
+        attacked = (first & sliders) != 0
+        threats |= np.where(attacked, first | between, np.uint64(0))
+
+    threats = np.where(has_king, threats, np.uint64(0))
+    return threats != 0, threats
+
+
+def threat_heatmap(rows: np.ndarray, color: chess.Color,
+                   weights: Optional[np.ndarray] = None) -> Tuple[float, np.ndarray]:
+    """Probability that color's king is attacked, and (64,) probability that each square is a threat origin."""
+    if not len(rows):
+        return 0.0, np.zeros(64)
+    in_check, threats = check_threats(rows, color)
+    probabilities = np.full(len(rows), 1.0 / len(rows)) if weights is None else weights / weights.sum()
+    bits = np.unpackbits(np.ascontiguousarray(threats, dtype='<u8').view(np.uint8).reshape(-1, 8),
+                         axis=1, bitorder='little')
+    return float(probabilities[in_check].sum()), probabilities @ bits
@@ -0,0 +1,161 @@
+import collections
+import threading
+import time
+import chess
+from typing import Callable, List, Optional, Sequence
+
+MATE_HORIZON = 4   # only mates this short redirect the vote
+MATE_BONUS = 10    # mate moves outrank ordinary multipv votes
+VOTE_LINES = 3     # multipv lines that take part in the vote
+MATE_SHARE = 0.1   # share of evaluated boards that must show a short mate before mate moves win
+
+
+def tally_analysis(result, move_actions: List[chess.Move],
+                   mate_moves: collections.Counter, move_counter: collections.Counter) -> bool:
+    """Add one board's multipv analysis to the mate and vote tallies; returns whether a short mate was found."""
+    if not result:
+        return False
+
+    has_mate = False
+    top = result[0]
+    score = top.get('score')
+    if score is not None:
+        score = score.relative  # from the point of view of the side to move, i.e. us
+    if score is not None and score.is_mate() and 0 < score.mate() <= MATE_HORIZON:
+        has_mate = True
+        # Get the first move of the mating sequence
+        if top.get('pv'):
+            mate_move = top['pv'][0]
+            if mate_move in move_actions:
+                # Weight by the mate distance - mate in 1 gets weight 4, mate in 4 gets weight 1
+                weight = MATE_HORIZON + 1 - score.mate()
+                mate_moves[mate_move] += weight * MATE_BONUS
+
+    for pv in result:
+        if pv.get('pv'):
+            best_move = pv['pv'][0]
+            # Check if this move is legal in our current position
+            if best_move in move_actions:
+                # Weight by position in multipv - multipv 1 gets weight 3, multipv 3 gets weight 1
+                move_counter[best_move] += VOTE_LINES + 1 - pv.get('multipv', VOTE_LINES)
+    return has_mate
+
+
+class AnytimeVote:
+    """Running vote over hypotheses evaluated in priority order that can be stopped at any moment.
+
+    Each board keeps its own contribution so a deeper re-search replaces the shallower one instead of
+    counting twice. The vote stops by itself once the leader's margin exceeds what the boards still
+    to be (re-)searched could overturn.
+    """
+
+    def __init__(self, move_actions: List[chess.Move], max_weight_per_board: float = VOTE_LINES):
+        self.move_actions = move_actions
+        self.max_weight_per_board = max_weight_per_board
+        self.mate_moves = collections.Counter()
+        self.move_counter = collections.Counter()
+        self.boards_with_mate_potential = 0
+        self.depth_reached = None
+        self._contributions = {}
+        self._interrupted = threading.Event()
+
+    @property
+    def evaluated(self) -> int:
+        return len(self._contributions)
+
+    def interrupt(self):
+        """Ask a running vote to stop after the batch in flight; safe to call from another thread."""
+        self._interrupted.set()
+
+    def add(self, index: int, result):
+        """Record (or replace) the analysis of board index."""
+        previous = self._contributions.pop(index, None)
+        if previous is not None:
+            mate_moves, move_counter, has_mate = previous
+            self.mate_moves.subtract(mate_moves)
+            self.move_counter.subtract(move_counter)
+            self.boards_with_mate_potential -= has_mate
+        mate_moves, move_counter = collections.Counter(), collections.Counter()
+        has_mate = tally_analysis(result, self.move_actions, mate_moves, move_counter)
+        self.mate_moves.update(mate_moves)
+        self.move_counter.update(move_counter)
+        self.boards_with_mate_potential += has_mate
+        self._contributions[index] = (mate_moves, move_counter, has_mate)
+
+    def lead(self) -> float:
+        top = (+self.move_counter).most_common(2)
+        if not top:
+            return 0
+        return top[0][1] - (top[1][1] if len(top) > 1 else 0)
+
+    def mate_possible(self, remaining: int, replacing: bool = False) -> bool:
+        """Whether a mate move could still decide the vote once the remaining boards are (re-)searched.
+
+        Any short mate already found keeps every board in play, so each mate is checked; otherwise the
+        remaining boards must be too few to reach MATE_SHARE even if all of them show a mate.
+        """
+        if self.boards_with_mate_potential:
+            return True
+        total = self.evaluated + (0 if replacing else remaining)
+        return remaining >= max(1, total * MATE_SHARE)
+
+    def is_decided(self, remaining: int, replacing: bool = False) -> bool:
+        """Whether the remaining boards can no longer overturn the leader.
+
+        A re-searched board can take its old votes away as well as add new ones, so it counts double.
+        """
+        if remaining <= 0:
+            return True
+        if self.mate_possible(remaining, replacing):
+            return False
+        swing = self.max_weight_per_board * (2 if replacing else 1)
+        return self.lead() > remaining * swing
+
+    def mate_move(self) -> Optional[chess.Move]:
+        mate_moves = +self.mate_moves
+        if mate_moves and self.boards_with_mate_potential >= max(1, self.evaluated * MATE_SHARE):
+            return mate_moves.most_common(1)[0][0]
+        return None
+
+    def leader(self) -> Optional[chess.Move]:
+        """Current best answer: a well-supported mate move, else the vote leader."""
+        mate_move = self.mate_move()
+        if mate_move is not None:
+            return mate_move
+        move_counter = +self.move_counter
+        return move_counter.most_common(1)[0][0] if move_counter else None
+
+    def run(self, boards: Sequence[chess.Board], analyse_batch: Callable[[list, int], list], depths: Sequence[int],
+            batch_size: int, deadline: Optional[float] = None,
+            decided: Optional[Callable[['AnytimeVote', int], bool]] = None) -> Optional[chess.Move]:
+        """Evaluate boards in the given (priority) order at each depth in turn until stopped.
+
+        analyse_batch(batch, depth) returns one result per board. Stops on interrupt(), when
+        time.monotonic() passes deadline, when the leader is safe, or when the optional decided(vote,
+        remaining) callback says so; the first depth pass may be cut short by decided, later passes
+        only run while time is left. Neither early stop applies while a mate could still win. The
+        first batch runs even past the deadline, so a spent budget still yields a vote.
+        """
+        for pass_number, depth in enumerate(depths):
+            replacing = pass_number > 0
+            for start in range(0, len(boards), batch_size):
+                first_batch = not replacing and start == 0
+                if self._interrupted.is_set() or \
+                        (not first_batch and deadline is not None and time.monotonic() >= deadline):
+                    return self.leader()
+                batch = boards[start:start + batch_size]
+                for offset, result in enumerate(analyse_batch(batch, depth)):
+                    self.add(start + offset, result)
+                self.depth_reached = depth
+
+                remaining = len(boards) - start - len(batch)
+                if remaining == 0:
+                    break  # pass complete, move on to the next depth
+                if self.is_decided(remaining, replacing):
+                    return self.leader()
+                if decided is not None and not replacing and not self.mate_possible(remaining) and \
+                        decided(self, remaining):
+                    return self.leader()
+            if self.is_decided(len(boards), True):
+                break  # a further pass could not change the result
+        return self.leader()